@@ -0,0 +1,89 @@
+"""An in-memory checkpointer with bounded size.
+
+MemorySaver keeps every checkpoint of every thread for the life of the process.
+The tutor only ever resumes a thread from its latest checkpoint, and a thread
+that is gone is rebuilt from lesson_messages on its next turn
+(nodes.initialize_session). So this one keeps just the latest checkpoint per
+thread, for the most recently used `max_threads` threads.
+"""
+import logging
+from collections import OrderedDict, defaultdict
+from typing import Any
+from langgraph.checkpoint.memory import MemorySaver
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedMemorySaver(MemorySaver):
+    def __init__(self, max_threads: int):
+        super().__init__()
+        self.max_threads = max_threads
+        self._threads: OrderedDict[str, None] = OrderedDict()
+        # Per-thread keys into self.blobs and self.writes, so dropping a thread doesn't scan them
+        self._blob_keys: dict[str, set[tuple]] = defaultdict(set)
+        self._write_keys: dict[str, set[tuple]] = defaultdict(set)
+    
+    def _touch(self, thread_id: str):
+        self._threads[thread_id] = None
+        self._threads.move_to_end(thread_id)
+        while len(self._threads) > self.max_threads:
+            evicted, _ = self._threads.popitem(last=False)
+            self._drop_thread(evicted)
+            metrics.increment("checkpointer.evictions")
+    
+    def _drop_thread(self, thread_id: str):
+        # Reads also create (empty) writes entries for the checkpoints they load
+        for checkpoint_ns, checkpoints in self.storage.pop(thread_id, {}).items():
+            for checkpoint_id in checkpoints:
+                self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+        for key in self._blob_keys.pop(thread_id, ()):
+            self.blobs.pop(key, None)
+        for key in self._write_keys.pop(thread_id, ()):
+            self.writes.pop(key, None)
+    
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        if thread_id not in self.storage:
+            # Don't let the defaultdict lookup leave an empty entry per cold thread
+            return None
+        if thread_id in self._threads:
+            self._threads.move_to_end(thread_id)
+        return super().get_tuple(config)
+    
+    def put(self, config, checkpoint, metadata, new_versions):
+        result = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        
+        # Earlier checkpoints of the namespace, and the writes made from them, are already folded in
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        for checkpoint_id in [c for c in checkpoints if c != checkpoint["id"]]:
+            del checkpoints[checkpoint_id]
+            write_key = (thread_id, checkpoint_ns, checkpoint_id)
+            self.writes.pop(write_key, None)
+            self._write_keys[thread_id].discard(write_key)
+        
+        # Channel values the latest checkpoint no longer points to
+        current = {(thread_id, checkpoint_ns, k, v) for k, v in checkpoint["channel_versions"].items()}
+        blob_keys = self._blob_keys[thread_id]
+        blob_keys.update((thread_id, checkpoint_ns, k, v) for k, v in new_versions.items())
+        stale = {key for key in blob_keys if key[1] == checkpoint_ns and key not in current}
+        for key in stale:
+            self.blobs.pop(key, None)
+        blob_keys -= stale
+        
+        self._touch(thread_id)
+        return result
+    
+    def put_writes(self, config, writes, task_id: str, *args: Any, **kwargs: Any):
+        super().put_writes(config, writes, task_id, *args, **kwargs)
+        configurable = config["configurable"]
+        self._write_keys[configurable["thread_id"]].add(
+            (configurable["thread_id"], configurable.get("checkpoint_ns", ""), configurable["checkpoint_id"])
+        )
+    
+    @property
+    def thread_count(self) -> int:
+        # Not __len__: LangGraph tests the checkpointer's truthiness
+        return len(self._threads)
@@ -0,0 +1,57 @@
+"""Incremental lesson evaluation.
+
+Every few turns the evaluate node scores only the messages since the previous
+evaluation, with the lesson's running scores as context, and the model answers
+in the LessonEvaluation schema (structured output, so there is no JSON to fish
+out of free text). LessonService folds each such partial evaluation into the
+running one stored in Lesson.ai_evaluation (app.evaluation_merge.merge_evaluation).
+"""
+from typing import Literal
+from pydantic import BaseModel, Field, model_validator
+from app.evaluation_merge import SCORE_FIELDS
+
+# Skill codes scored by each evaluation field
+SKILL_SCORES = {
+    "VOCABULARY": "vocabulary_score",
+    "GRAMMAR": "grammar_score",
+    "SPEAKING": "fluency_score",
+    "LISTENING": "comprehension_score",
+}
+
+
+class LessonEvaluation(BaseModel):
+    """What the model returns for the messages since the previous evaluation."""
+    
+    # Strict structured output rejects minimum/maximum, so the range is in the
+    # description and enforced by the validator below
+    vocabulary_score: int = Field(description="0-100")
+    grammar_score: int = Field(description="0-100")
+    fluency_score: int = Field(description="0-100")
+    comprehension_score: int = Field(description="0-100")
+    topics_covered: list[str] = Field(description="Temas nuevos en estos mensajes")
+    skills_practiced: list[Literal["SPEAKING", "LISTENING", "VOCABULARY", "GRAMMAR"]]
+    errors_noted: list[str] = Field(description="Errores nuevos en estos mensajes")
+    recommendations: list[str]
+    ready_for_level_up: bool = Field(description="Según la lección completa")
+    summary: str = Field(description="Breve resumen de la lección completa")
+    
+    @model_validator(mode="after")
+    def clamp_scores(self):
+        for field in SCORE_FIELDS:
+            setattr(self, field, min(max(getattr(self, field), 0), 100))
+        return self
+
+
+def format_running_evaluation(evaluation: dict | None) -> str:
+    """The running evaluation as a few lines of prompt context."""
+    if not evaluation:
+        return "Ninguna (primera evaluación de la lección)"
+    return (
+        f"Vocabulario {evaluation.get('vocabulary_score')}, gramática {evaluation.get('grammar_score')}, "
+        f"fluidez {evaluation.get('fluency_score')}, comprensión {evaluation.get('comprehension_score')} "
+        f"({evaluation.get('messages_evaluated', 0)} mensajes evaluados)\n"
+        f"Temas: {', '.join(evaluation.get('topics_covered', [])) or '-'}\n"
+        f"Errores: {', '.join(evaluation.get('errors_noted', [])) or '-'}\n"
+        f"Resumen: {evaluation.get('summary') or '-'}"
+    )
+
@@ -1,15 +1,18 @@
 import logging
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
+from app.agent.checkpointer import BoundedMemorySaver
 from app.agent.state import TutorState
 from app.agent.nodes import (
     initialize_session,
     process_input,
     generate_response,
+    extract_vocabulary,
     evaluate_lesson,
-    route_after_response
+    route_after_response,
+    warm_prompt_cache
 )
 from app.config import get_settings
+from app.models.level import LEVEL_SEED_DATA
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
@@ -29,6 +32,7 @@ def create_tutor_graph() -> StateGraph:
     workflow.add_node("initialize", initialize_session)
     workflow.add_node("process_input", process_input)
     workflow.add_node("generate_response", generate_response)
+    workflow.add_node("extract_vocabulary", extract_vocabulary)
     workflow.add_node("evaluate", evaluate_lesson)
     
     # Set entry point
@@ -37,10 +41,11 @@ def create_tutor_graph() -> StateGraph:
     # Add edges
     workflow.add_edge("initialize", "process_input")
     workflow.add_edge("process_input", "generate_response")
+    workflow.add_edge("generate_response", "extract_vocabulary")
     
     # Conditional routing after response
     workflow.add_conditional_edges(
-        "generate_response",
+        "extract_vocabulary",
         route_after_response,
         {
             "evaluate": "evaluate",
@@ -54,11 +59,11 @@ def create_tutor_graph() -> StateGraph:
 
 
 def get_checkpointer():
-    """Get or create the memory checkpointer."""
+    """Get or create the memory checkpointer (bounded; lost threads are rebuilt from the database)."""
     global _checkpointer
     
     if _checkpointer is None:
-        _checkpointer = MemorySaver()
+        _checkpointer = BoundedMemorySaver(settings.checkpoint_max_threads)
     
     return _checkpointer
 
@@ -68,6 +73,7 @@ async def get_compiled_graph():
     global _graph
     
     if _graph is None:
+        warm_prompt_cache([level["code"] for level in LEVEL_SEED_DATA])
         workflow = create_tutor_graph()
         checkpointer = get_checkpointer()
         _graph = workflow.compile(checkpointer=checkpointer)
@@ -88,13 +94,19 @@ async def get_tutor_response(
     is_audio: bool = False,
     audio_file_id: str | None = None,
     is_new_student: bool = False,
-    words_learned: int = 0
-) -> tuple[str, dict | None]:
+    words_learned: int = 0,
+    due_words: list[str] | None = None,
+    lesson_evaluation: dict | None = None,
+    memories: list[str] | None = None
+) -> tuple[str, dict | None, dict]:
     """
     Get a response from the tutor agent.
     
     Returns:
-        tuple: (response_text, evaluation_dict or None)
+        tuple: (response_text, evaluation_dict or None, vocabulary_dict)
+        evaluation_dict scores only the messages since the previous evaluation;
+        merge it into lesson_evaluation (LessonService.update_lesson_evaluation).
+        vocabulary_dict has "taught", "seen" and "used" VocabularyWord ids.
     """
     graph = await get_compiled_graph()
     
@@ -117,6 +129,8 @@ async def get_tutor_response(
         "total_lessons": total_lessons,
         "streak_days": streak_days,
         "words_learned": words_learned,
+        "due_words": due_words or [],
+        "memories": memories or [],
         "user_input": user_input,
         "lesson_id": lesson_id,
         "is_audio": is_audio,
@@ -125,7 +139,11 @@ async def get_tutor_response(
         "session_started": False,
         "should_evaluate": False,
         "response": "",
-        "evaluation": None
+        "evaluation": None,
+        "lesson_evaluation": lesson_evaluation,
+        "words_taught": [],
+        "words_seen": [],
+        "words_used": []
     }
     
     try:
@@ -134,9 +152,16 @@ async def get_tutor_response(
         
         response = result.get("response", "Lo siento, hubo un error. Intenta de nuevo.")
         evaluation = result.get("evaluation")
+        vocabulary = {
+            "taught": result.get("words_taught", []),
+            "seen": result.get("words_seen", []),
+            "used": result.get("words_used", [])
+        }
         
-        return response, evaluation
-        
+        return response, evaluation, vocabulary
+    
     except Exception as e:
         logger.error(f"Error in tutor agent: {e}")
-        return "Lo siento, tuve un problema técnico. ¿Puedes intentar de nuevo?", None
+        return "Lo siento, tuve un problema técnico. ¿Puedes intentar de nuevo?", None, {
+            "taught": [], "seen": [], "used": []
+        }
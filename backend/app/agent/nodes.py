@@ -1,53 +1,138 @@
-import json
 import logging
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from langchain_openai import ChatOpenAI
+from functools import lru_cache
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage, RemoveMessage
 from app.config import get_settings
+from app.database import AsyncSessionLocal
+from app.metrics import metrics
 from app.agent.state import TutorState
-from app.agent.prompts import SYSTEM_PROMPT, EVALUATION_PROMPT
+from app.agent.prompts import STUDENT_CONTEXT_PROMPT, LESSON_SUMMARY_PROMPT, EVALUATION_PROMPT
+from app.agent.evaluation import LessonEvaluation, format_running_evaluation
+from app.agent.prompt_registry import build_system_prompt
+from app.agent.routing import invoke_routed
+from app.agent.response_cache import response_cache
+from app.services.vocabulary_service import get_vocabulary_matcher
+from app.services.lesson_service import LessonService
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
-llm = ChatOpenAI(
-    model=settings.openai_model,
-    api_key=settings.openai_api_key,
-    temperature=0.7
-)
+# Cap on messages sent to one evaluation (e.g. after the checkpoint was lost)
+EVALUATION_MAX_MESSAGES = 20
 
-evaluation_llm = ChatOpenAI(
-    model=settings.openai_model,
-    api_key=settings.openai_api_key,
-    temperature=0.3
-)
 
+@lru_cache(maxsize=None)
+def build_system_message(level: str) -> SystemMessage:
+    """The static system prompt for a level; identical across students so it is cached."""
+    return SystemMessage(content=build_system_prompt(level))
 
-def build_system_message(state: TutorState) -> SystemMessage:
-    """Build the system message with student context."""
-    prompt = SYSTEM_PROMPT.format(
+
+def warm_prompt_cache(levels: list[str]):
+    """Render every level's system prompt up front (and check their token budgets)."""
+    for level in levels:
+        build_system_message(level)
+
+
+def build_student_context(state: TutorState) -> SystemMessage:
+    """This turn's student context (streak, due words...), sent after the history."""
+    due_words = state.get("due_words") or []
+    prompt = STUDENT_CONTEXT_PROMPT.format(
         student_name=state["student_name"],
         current_level=state["current_level"],
         total_lessons=state["total_lessons"],
         streak_days=state["streak_days"],
-        words_learned=state.get("words_learned", 0)
+        words_learned=state.get("words_learned", 0),
+        due_words=", ".join(due_words) if due_words else "ninguna por ahora",
+        memories="".join(f"\n  • {memory}" for memory in state.get("memories") or []) or "ninguna"
     )
+    summary = (state.get("lesson_evaluation") or {}).get("summary")
+    if state.get("history_trimmed") and summary:
+        prompt += "\n" + LESSON_SUMMARY_PROMPT.format(summary=summary)
     return SystemMessage(content=prompt)
 
 
-async def initialize_session(state: TutorState) -> dict:
-    """Initialize or continue a session."""
-    logger.info(f"Initializing session for student {state['student_id']}")
+def build_messages(state: TutorState) -> list:
+    """Lay out the prompt so the longest possible prefix repeats between calls.
+    
+    Static level prompt, then the conversation so far (it only grows between the
+    chunked trims in initialize_session, so it repeats on the student's next
+    turn), then the volatile student context right before the newest message.
+    """
+    history = [m for m in state["messages"] if not isinstance(m, SystemMessage)]
+    return [
+        build_system_message(state["current_level"]),
+        *history[:-1],
+        build_student_context(state),
+        *history[-1:]
+    ]
+
+
+def rebuild_history(rows: list[tuple[str, str]]) -> list[BaseMessage]:
+    """Conversation messages from stored (role, content) lesson messages.
+    
+    A burst of student messages was one turn, joined with newlines as in
+    handlers.process_turn. Trailing student messages are this turn's, which
+    process_input adds, so they are left out.
+    """
+    while rows and rows[-1][0] == "user":
+        rows = rows[:-1]
+    messages: list[BaseMessage] = []
+    for role, content in rows:
+        message_class = HumanMessage if role == "user" else AIMessage
+        if messages and isinstance(messages[-1], message_class):
+            messages[-1] = message_class(content=f"{messages[-1].content}\n{content}")
+        else:
+            messages.append(message_class(content=content))
+    return messages
+
+
+async def rehydrate_session(state: TutorState) -> dict:
+    """Rebuild a thread the checkpointer no longer has (restart, eviction) from lesson_messages."""
+    window = settings.conversation_window_messages
+    limit = window * 2  # Stored rows; bursts merge into fewer messages
+    try:
+        async with AsyncSessionLocal() as db:
+            rows = await LessonService(db).get_recent_messages(state["lesson_id"], limit)
+    except Exception as e:
+        logger.error(f"Error rehydrating session for student {state['student_id']}: {e}")
+        return {"session_started": True}
     
-    updates = {
-        "session_started": True
+    history = rebuild_history(rows)
+    messages = history[-window:]
+    metrics.increment("agent.rehydrations")
+    logger.info(f"Rehydrated {len(messages)} messages of lesson {state['lesson_id']} for student {state['student_id']}")
+    return {
+        "session_started": True,
+        "messages": messages,
+        "turn_count": sum(1 for m in messages if isinstance(m, HumanMessage)),
+        # What the lesson's running evaluation already covers isn't evaluated again
+        "evaluated_messages": len(messages) if state.get("lesson_evaluation") else 0,
+        "history_trimmed": len(rows) == limit or len(history) > window
     }
+
+
+async def initialize_session(state: TutorState) -> dict:
+    """Continue a session: rebuild a lost thread, or trim the window of a long one."""
+    logger.info(f"Initializing session for student {state['student_id']}")
     
-    # Add system message if this is a new conversation
-    if not state.get("messages") or len(state["messages"]) == 0:
-        system_msg = build_system_message(state)
-        updates["messages"] = [system_msg]
+    # The system message is rebuilt on every turn in generate_response so the
+    # student context (due words, streak...) is always current
+    messages = state.get("messages") or []
+    if not messages and state.get("lesson_id"):
+        return await rehydrate_session(state)
     
-    return updates
+    # Trim in chunks, down to half the window, rather than a message or two per
+    # turn: a sliding window would change the cached prompt prefix on every call
+    window = settings.conversation_window_messages
+    if len(messages) <= window:
+        return {"session_started": True}
+    excess = len(messages) - window // 2
+    metrics.increment("agent.history_trims")
+    return {
+        "session_started": True,
+        "messages": [RemoveMessage(id=m.id) for m in messages[:excess]],
+        "evaluated_messages": max(state.get("evaluated_messages", 0) - excess, 0),
+        "history_trimmed": True
+    }
 
 
 async def process_input(state: TutorState) -> dict:
@@ -55,7 +140,8 @@ async def process_input(state: TutorState) -> dict:
     user_message = HumanMessage(content=state["user_input"])
     
     return {
-        "messages": [user_message]
+        "messages": [user_message],
+        "turn_count": state.get("turn_count", 0) + 1
     }
 
 
@@ -63,19 +149,26 @@ async def generate_response(state: TutorState) -> dict:
     """Generate tutor response using LLM."""
     logger.info(f"Generating response for student {state['student_id']}")
     
-    # Ensure system message is present
-    messages = list(state["messages"])
-    if not messages or not isinstance(messages[0], SystemMessage):
-        system_msg = build_system_message(state)
-        messages = [system_msg] + messages
+    # Determine if we should evaluate (every 5 turns); in batch mode closed lessons are scored nightly
+    turn_count = state.get("turn_count", 0)
+    should_evaluate = settings.evaluation_mode == "inline" and turn_count > 0 and turn_count % 5 == 0
+    
+    # Beginners' openers are near-identical; reuse an earlier reply without calling the LLM
+    cached = response_cache.get(state)
+    if cached is not None:
+        return {
+            "messages": [AIMessage(content=cached)],
+            "response": cached,
+            "should_evaluate": should_evaluate
+        }
+    
+    # Fresh student context on every turn, placed after the cacheable prefix
+    messages = build_messages(state)
     
     try:
-        response = await llm.ainvoke(messages)
+        response, _ = await invoke_routed("respond", state["current_level"], messages)
         ai_message = AIMessage(content=response.content)
-        
-        # Determine if we should evaluate (every 5 messages or explicit end)
-        message_count = len([m for m in messages if isinstance(m, HumanMessage)])
-        should_evaluate = message_count > 0 and message_count % 5 == 0
+        response_cache.put(state, response.content)
         
         return {
             "messages": [ai_message],
@@ -92,32 +185,56 @@ async def generate_response(state: TutorState) -> dict:
         }
 
 
+async def extract_vocabulary(state: TutorState) -> dict:
+    """Find vocabulary words in the student's input and the tutor's reply."""
+    matcher = get_vocabulary_matcher()
+    if matcher is None:
+        return {"words_taught": [], "words_seen": [], "words_used": []}
+    
+    return {
+        "words_taught": sorted(matcher.find_taught(state["response"])),
+        "words_seen": sorted(matcher.find(state["response"])),
+        "words_used": sorted(matcher.find(state["user_input"]))
+    }
+
+
 async def evaluate_lesson(state: TutorState) -> dict:
-    """Evaluate the lesson progress (runs periodically)."""
+    """Evaluate the messages since the previous evaluation (runs periodically)."""
     if not state.get("should_evaluate", False):
         return {}
     
     logger.info(f"Evaluating lesson for student {state['student_id']}")
     
-    # Build conversation summary for evaluation
-    messages = state.get("messages", [])
-    conversation_text = "\n".join([
+    # Only what the previous evaluation hasn't seen; its scores come from the lesson
+    messages = [m for m in state.get("messages", []) if isinstance(m, (HumanMessage, AIMessage))]
+    new_messages = messages[state.get("evaluated_messages", 0):][-EVALUATION_MAX_MESSAGES:]
+    if not new_messages:
+        return {}
+    conversation_text = "\n".join(
         f"{'Usuario' if isinstance(m, HumanMessage) else 'Tutor'}: {m.content}"
-        for m in messages
-        if isinstance(m, (HumanMessage, AIMessage))
-    ][-10:])  # Last 10 messages
+        for m in new_messages
+    )
     
     eval_prompt = EVALUATION_PROMPT.format(
-        conversation=conversation_text,
-        level=state["current_level"]
+        level=state["current_level"],
+        running_evaluation=format_running_evaluation(state.get("lesson_evaluation")),
+        conversation=conversation_text
     )
     
     try:
-        response = await evaluation_llm.ainvoke([HumanMessage(content=eval_prompt)])
-        evaluation = json.loads(response.content)
-        logger.info(f"Evaluation complete: {evaluation.get('summary', 'N/A')}")
-        # The evaluation will be saved by the service layer
-        return {"evaluation": evaluation}
+        _, evaluation = await invoke_routed(
+            "evaluate",
+            state["current_level"],
+            [HumanMessage(content=eval_prompt)],
+            schema=LessonEvaluation
+        )
+        metrics.observe("evaluate.messages_per_call", len(new_messages))
+        logger.info(f"Evaluation complete: {evaluation.summary}")
+        # Merged into the lesson's running evaluation by the service layer
+        return {
+            "evaluation": {**evaluation.model_dump(), "messages_evaluated": len(new_messages)},
+            "evaluated_messages": len(messages)
+        }
     except Exception as e:
         logger.error(f"Error evaluating lesson: {e}")
         return {}
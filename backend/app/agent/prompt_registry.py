@@ -0,0 +1,99 @@
+"""System prompts per level, assembled from the sections in prompts.py.
+
+Each Level.code lists the sections its students need and a token budget; a
+prompt over its budget fails at build time (startup warms every level), so a
+prompt edit cannot silently make every turn more expensive.
+"""
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from app.config import get_settings
+from app.agent import prompts
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEVEL = "PRE_A1"
+
+
+@dataclass(frozen=True)
+class LevelPrompt:
+    sections: tuple[str, ...]
+    token_budget: int
+
+
+_BEGINNER = (prompts.ROLE_SECTION, prompts.AUDIENCE_SECTION, prompts.VOCABULARY_PRINCIPLE_SECTION)
+_ADVANCED = (prompts.ROLE_SECTION, prompts.AUDIENCE_SECTION_ADVANCED)
+
+LEVEL_PROMPTS: dict[str, LevelPrompt] = {
+    "PRE_A1": LevelPrompt(
+        sections=(
+            *_BEGINNER, prompts.PRE_A1_METHOD_SECTION, prompts.WORD_CARD_SECTION,
+            prompts.RULES_SECTION, prompts.PRE_A1_RULES_SECTION, prompts.LEVEL_SECTION
+        ),
+        token_budget=1300
+    ),
+    "A1": LevelPrompt(
+        sections=(
+            *_BEGINNER, prompts.A1_METHOD_SECTION, prompts.WORD_CARD_SECTION,
+            prompts.RULES_SECTION, prompts.LEVEL_SECTION
+        ),
+        token_budget=800
+    ),
+    "A2": LevelPrompt(
+        sections=(*_BEGINNER, prompts.A2_METHOD_SECTION, prompts.RULES_SECTION, prompts.LEVEL_SECTION),
+        token_budget=750
+    ),
+    "B1": LevelPrompt(
+        sections=(*_ADVANCED, prompts.B1_METHOD_SECTION, prompts.RULES_SECTION, prompts.LEVEL_SECTION),
+        token_budget=500
+    ),
+    "B2": LevelPrompt(
+        sections=(*_ADVANCED, prompts.B2_METHOD_SECTION, prompts.RULES_SECTION, prompts.LEVEL_SECTION),
+        token_budget=450
+    ),
+    "C1": LevelPrompt(
+        sections=(*_ADVANCED, prompts.C1_METHOD_SECTION, prompts.RULES_SECTION, prompts.LEVEL_SECTION),
+        token_budget=450
+    ),
+}
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """The model's tiktoken encoding, or None if it can't be loaded (e.g. offline)."""
+    try:
+        import tiktoken
+        
+        try:
+            return tiktoken.encoding_for_model(settings.openai_model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Tokens for the configured model; ~4 characters per token without tiktoken."""
+    encoding = _encoding()
+    if encoding is None:
+        return -(-len(text) // 4)
+    return len(encoding.encode(text))
+
+
+@lru_cache(maxsize=None)
+def build_system_prompt(level: str) -> str:
+    """The system prompt for a level. Raises ValueError if it exceeds the level's budget."""
+    level_prompt = LEVEL_PROMPTS.get(level)
+    if level_prompt is None:
+        logger.warning(f"No prompt registered for level {level}; using {DEFAULT_LEVEL}")
+        level_prompt = LEVEL_PROMPTS[DEFAULT_LEVEL]
+    
+    prompt = "\n\n".join(level_prompt.sections).format(current_level=level)
+    tokens = count_tokens(prompt)
+    if tokens > level_prompt.token_budget:
+        raise ValueError(
+            f"System prompt for {level} is {tokens} tokens, over its budget of {level_prompt.token_budget}"
+        )
+    return prompt
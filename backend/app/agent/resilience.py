@@ -0,0 +1,218 @@
+"""Deadline, retries, hedging and circuit breaking around model calls.
+
+A call gets a deadline for the whole turn. Within it, transient failures
+(timeouts, connection errors, 429s, 5xx) are retried with jittered exponential
+backoff. For hedged nodes, an attempt that is still running after the model's
+recent p95 latency gets a duplicate request, and whichever answers first wins,
+so one slow request doesn't set the student's wait. Each model has a circuit
+breaker: after repeated failures it opens and calls go to the fallback model
+until a trial request succeeds.
+"""
+import asyncio
+import logging
+import time
+from typing import Callable
+import openai
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.runnables import Runnable
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, stop_before_delay, wait_random_exponential
+from app.config import get_settings
+from app.metrics import metrics
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+TRANSIENT_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+    TimeoutError,
+)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Closed until `failure_threshold` consecutive failures, then open for `reset_seconds`.
+    
+    After the cool-down one trial call is let through (half-open); its result
+    closes the breaker again or reopens it.
+    """
+    
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial_in_flight = False
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+    
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+    
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info(f"Circuit for {self.name} closed")
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+    
+    def release_trial(self):
+        """Free the half-open slot of a call that ended without a result (cancelled)."""
+        self._trial_in_flight = False
+    
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_in_flight or (self.opened_at is None and self.failures >= self.failure_threshold):
+            logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+            metrics.increment(f"llm.circuit_opened.{self.name}")
+            self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def breaker_for(model: str) -> CircuitBreaker:
+    breaker = _breakers.get(model)
+    if breaker is None:
+        breaker = _breakers[model] = CircuitBreaker(
+            model, settings.llm_breaker_failures, settings.llm_breaker_reset_seconds
+        )
+    return breaker
+
+
+def hedge_delay(node: str, model: str) -> float:
+    """Start a duplicate request once an attempt outlives the model's recent p95."""
+    p95 = metrics.percentile(f"llm.{node}.{model}.attempt_seconds", 95)
+    if p95 is None:
+        return settings.llm_hedge_default_seconds
+    return max(p95, settings.llm_hedge_min_seconds)
+
+
+async def _attempt(llm: Runnable, messages: list[BaseMessage], node: str, model: str) -> AIMessage | dict:
+    started = time.monotonic()
+    response = await llm.ainvoke(messages)
+    metrics.observe(f"llm.{node}.{model}.attempt_seconds", time.monotonic() - started)
+    return response
+
+
+async def _hedged(llm: Runnable, messages: list[BaseMessage], node: str, model: str, hedge: bool) -> AIMessage | dict:
+    tasks = [asyncio.ensure_future(_attempt(llm, messages, node, model))]
+    try:
+        if hedge:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay(node, model))
+            if not done:
+                metrics.increment(f"llm.{node}.hedged")
+                tasks.append(asyncio.ensure_future(_attempt(llm, messages, node, model)))
+        
+        pending = set(tasks)
+        error: BaseException | None = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not tasks[0]:
+                        metrics.increment(f"llm.{node}.hedge_wins")
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _with_retries(
+    llm: Runnable,
+    messages: list[BaseMessage],
+    node: str,
+    model: str,
+    deadline: float,
+    hedge: bool
+) -> AIMessage | dict:
+    async for attempt in AsyncRetrying(
+        stop=stop_after_attempt(settings.llm_max_attempts) | stop_before_delay(max(deadline - time.monotonic(), 0)),
+        wait=wait_random_exponential(multiplier=0.5, max=4),
+        retry=retry_if_exception_type(TRANSIENT_ERRORS),
+        reraise=True
+    ):
+        with attempt:
+            if attempt.retry_state.attempt_number > 1:
+                metrics.increment(f"llm.{node}.retries")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"{node} deadline passed")
+            return await asyncio.wait_for(_hedged(llm, messages, node, model, hedge), remaining)
+
+
+async def invoke_resilient(
+    llm_for: Callable[[str], Runnable],
+    model: str,
+    messages: list[BaseMessage],
+    node: str,
+    deadline: float,
+    hedge: bool = False
+) -> tuple[AIMessage | dict, str]:
+    """Call `model` (or the fallback model if its circuit is open or it keeps failing).
+    
+    `llm_for(model)` builds the client. Returns (reply, model that answered); the reply
+    is a dict for structured-output clients (see routing.get_structured_llm).
+    """
+    candidates = [model]
+    if settings.openai_fallback_model and settings.openai_fallback_model != model:
+        candidates.append(settings.openai_fallback_model)
+    
+    last_error: Exception = CircuitOpenError(model)
+    for i, candidate in enumerate(candidates):
+        if time.monotonic() >= deadline:
+            break
+        breaker = breaker_for(candidate)
+        trial = breaker.state == "half_open"
+        if not breaker.allow():
+            metrics.increment(f"llm.{node}.circuit_open")
+            last_error = CircuitOpenError(candidate)
+            continue
+        
+        # Leave the fallback model some time if this one keeps failing
+        attempt_deadline = deadline
+        if i < len(candidates) - 1:
+            attempt_deadline -= settings.llm_fallback_reserve_seconds
+        try:
+            response = await _with_retries(llm_for(candidate), messages, node, candidate, attempt_deadline, hedge)
+        except TRANSIENT_ERRORS as e:
+            breaker.record_failure()
+            logger.warning(f"LLM call to {candidate} for {node} failed: {type(e).__name__}: {e}")
+            last_error = e
+            continue
+        except Exception:
+            # The service answered (e.g. 400); not an availability problem
+            breaker.record_success()
+            raise
+        finally:
+            if trial:
+                # A cancelled trial records nothing; without this the breaker would never try again
+                breaker.release_trial()
+        
+        breaker.record_success()
+        if candidate != model:
+            metrics.increment(f"llm.{node}.fallbacks")
+        return response, candidate
+    
+    raise last_error
@@ -0,0 +1,181 @@
+"""Reuse tutor replies for the near-identical openers beginners send.
+
+Only the first turns of a conversation are cached, for the configured levels,
+when the student has no words due or recalled memories (the reply would mention
+them otherwise). The
+key covers everything that shapes the reply except the name: level, turn
+number, the student's lesson/streak/word counts, the previous tutor reply and
+the normalized input. Exact matches are a dict lookup on its hash; otherwise
+inputs with the same prefix are compared by character-trigram similarity. The
+student's name is stored as a placeholder and filled in on a hit.
+
+The cache is per process (bot workers keep their students through the update
+stream's partitioning), bounded in size with LRU eviction and a TTL.
+"""
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from app.config import get_settings
+from app.metrics import metrics
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+NAME_PLACEHOLDER = "{student_name}"
+
+
+@dataclass
+class CachedReply:
+    text: str
+    normalized_input: str
+    trigrams: frozenset[str]
+    prefix: str
+    expires_at: float
+
+
+def normalize(text: str) -> str:
+    """Lowercase, no accents, punctuation or emoji, single spaces."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def trigrams(text: str) -> frozenset[str]:
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def similarity(a: frozenset[str], b: frozenset[str]) -> float:
+    """Jaccard similarity of two trigram sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_entries: int = settings.response_cache_max_entries,
+        ttl_seconds: int = settings.response_cache_ttl_seconds,
+        threshold: float = settings.response_cache_similarity
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self._entries: OrderedDict[str, CachedReply] = OrderedDict()
+        # prefix -> exact keys sharing it, the candidates for a near-duplicate match
+        self._by_prefix: dict[str, set[str]] = {}
+    
+    def _prefix(self, state) -> str | None:
+        """Everything but the input and the name that shapes the reply, or None if not cacheable."""
+        level = state["current_level"]
+        messages = [m for m in state["messages"] if m.type in ("human", "ai")]
+        turn = sum(1 for m in messages if m.type == "human")
+        if (
+            not settings.response_cache_enabled
+            or level not in settings.response_cache_levels.split(",")
+            or turn > settings.response_cache_max_turn
+            or state.get("due_words")
+            or state.get("memories")
+            or len(state["student_name"]) < 3  # Too short to substitute safely
+        ):
+            return None
+        
+        # The previous reply pins the conversation so far (turn 2 after a cached turn 1)
+        previous = next((m.content for m in reversed(messages) if m.type == "ai"), "")
+        previous_hash = hashlib.sha1(normalize(previous).encode()).hexdigest()[:16]
+        profile = f"{state['total_lessons']}:{state['streak_days']}:{state.get('words_learned', 0)}"
+        return f"{level}:{turn}:{profile}:{previous_hash}"
+    
+    @staticmethod
+    def _key(prefix: str, normalized_input: str) -> str:
+        return hashlib.sha1(f"{prefix}:{normalized_input}".encode()).hexdigest()
+    
+    @staticmethod
+    def _name_pattern(name: str) -> re.Pattern:
+        return re.compile(rf"\b{re.escape(name)}\b")
+    
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry:
+            keys = self._by_prefix.get(entry.prefix)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._by_prefix[entry.prefix]
+    
+    def _nearest(self, prefix: str, normalized_input: str) -> str | None:
+        grams = trigrams(normalized_input)
+        now = time.monotonic()
+        best, best_score = None, self.threshold
+        for key in self._by_prefix.get(prefix, ()):
+            entry = self._entries[key]
+            if entry.expires_at <= now:
+                continue
+            score = similarity(grams, entry.trigrams)
+            if score >= best_score:
+                best, best_score = key, score
+        return best
+    
+    def get(self, state) -> str | None:
+        """A cached reply for this turn, personalized for the student, or None."""
+        prefix = self._prefix(state)
+        if prefix is None:
+            return None
+        normalized_input = normalize(state["user_input"])
+        if not normalized_input:
+            return None
+        
+        key = self._key(prefix, normalized_input)
+        match = "exact"
+        if key not in self._entries:
+            key, match = self._nearest(prefix, normalized_input), "similar"
+        entry = self._entries.get(key) if key else None
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self._remove(key)
+            entry = None
+        
+        if entry is None:
+            metrics.increment("response_cache.misses")
+            return None
+        
+        self._entries.move_to_end(key)
+        metrics.increment("response_cache.hits")
+        metrics.increment(f"response_cache.hits.{match}")
+        return entry.text.replace(NAME_PLACEHOLDER, state["student_name"])
+    
+    def put(self, state, reply: str):
+        """Remember the reply to this turn, if the turn is cacheable."""
+        prefix = self._prefix(state)
+        normalized_input = normalize(state["user_input"])
+        if prefix is None or not normalized_input:
+            return
+        key = self._key(prefix, normalized_input)
+        
+        self._remove(key)
+        self._entries[key] = CachedReply(
+            text=self._name_pattern(state["student_name"]).sub(NAME_PLACEHOLDER, reply),
+            normalized_input=normalized_input,
+            trigrams=trigrams(normalized_input),
+            prefix=prefix,
+            expires_at=time.monotonic() + self.ttl_seconds
+        )
+        self._by_prefix.setdefault(prefix, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def clear(self):
+        self._entries.clear()
+        self._by_prefix.clear()
+
+
+response_cache = ResponseCache()
+metrics.gauge("response_cache.entries", lambda: len(response_cache))
@@ -0,0 +1,223 @@
+"""Pick a model and output cap for each LLM call by node and student level.
+
+Beginners' short turns go to the small model; evaluations and upper levels to the
+default one. When a reply fails its node's validation (empty, cut off by
+max_tokens, structured output that doesn't parse) the call is retried once on the route's
+escalation model. Nodes that need structured data pass a pydantic `schema`; the
+reply is then constrained to it by the provider (strict JSON schema) and parsed
+by the client, and replies that still don't parse count as parse failures.
+Every call logs one `LLM route` line with the decision,
+tokens, estimated cost and latency, and feeds the same numbers to app.metrics,
+so the table below can be tuned from production data.
+"""
+import logging
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.runnables import Runnable
+from pydantic import BaseModel
+from langchain_openai import ChatOpenAI
+from app.config import get_settings
+from app.metrics import metrics
+from app.agent.resilience import invoke_resilient
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Route:
+    tier: str  # "small", "default" or "large"; see model_for_tier
+    max_tokens: int
+    temperature: float
+    escalation: "Route | None" = None
+
+
+_RESPOND_BEGINNER = Route("small", 350, 0.7, escalation=Route("default", 500, 0.7))
+_RESPOND_INTERMEDIATE = Route("default", 500, 0.7, escalation=Route("large", 600, 0.7))
+_RESPOND_ADVANCED = Route("default", 700, 0.7, escalation=Route("large", 800, 0.7))
+
+# node -> level code -> route; "*" is the node's default
+ROUTES: dict[str, dict[str, Route]] = {
+    "respond": {
+        "PRE_A1": _RESPOND_BEGINNER,
+        "A1": _RESPOND_BEGINNER,
+        "A2": _RESPOND_INTERMEDIATE,
+        "B1": _RESPOND_INTERMEDIATE,
+        "B2": _RESPOND_ADVANCED,
+        "C1": _RESPOND_ADVANCED,
+        "*": _RESPOND_INTERMEDIATE,
+    },
+    "evaluate": {
+        "*": Route("default", 500, 0.3, escalation=Route("large", 600, 0.3)),
+    },
+}
+
+# Interactive nodes whose slow attempts get a duplicate request
+HEDGED_NODES = {"respond"}
+
+# USD per million tokens: (input, cached input, output)
+MODEL_PRICES: dict[str, tuple[float, float, float]] = {
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+
+
+class ValidationError(ValueError):
+    """A model reply that the calling node can't use."""
+
+
+class TruncatedReply(ValidationError):
+    """Cut off by max_tokens; escalated, but still usable if no route does better."""
+
+
+def model_for_tier(tier: str) -> str:
+    return {
+        "small": settings.openai_model_small,
+        "large": settings.openai_model_large,
+    }.get(tier) or settings.openai_model
+
+
+def select_route(node: str, level: str) -> Route:
+    routes = ROUTES[node]
+    return routes.get(level) or routes["*"]
+
+
+@lru_cache(maxsize=None)
+def get_llm(model: str, temperature: float, max_tokens: int) -> ChatOpenAI:
+    return ChatOpenAI(
+        model=model,
+        api_key=settings.openai_api_key,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        max_retries=0  # Retries, timeouts and hedging are handled in app.agent.resilience
+    )
+
+
+@lru_cache(maxsize=None)
+def get_structured_llm(model: str, temperature: float, max_tokens: int, schema: type[BaseModel]) -> Runnable:
+    """A client whose replies are constrained to `schema`; returns {"raw", "parsed", "parsing_error"}."""
+    return get_llm(model, temperature, max_tokens).with_structured_output(
+        schema, method="json_schema", strict=True, include_raw=True
+    )
+
+
+def parse_structured(result: dict) -> BaseModel:
+    """The parsed object of a structured reply, or ValidationError (refusal, truncated or malformed JSON)."""
+    if result.get("parsing_error") is not None or result.get("parsed") is None:
+        refusal = result["raw"].additional_kwargs.get("refusal")
+        raise ValidationError(f"structured output not parsed: {refusal or result.get('parsing_error')}")
+    return result["parsed"]
+
+
+def estimate_cost(model: str, input_tokens: int, cached_tokens: int, output_tokens: int) -> float:
+    input_price, cached_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0, 0.0))
+    return (
+        (input_tokens - cached_tokens) * input_price
+        + cached_tokens * cached_price
+        + output_tokens * output_price
+    ) / 1_000_000
+
+
+def record_usage(response: AIMessage, node: str) -> tuple[int, int, int]:
+    """Count tokens, and how many input tokens the provider served from its prompt cache."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    input_tokens = usage.get("input_tokens", 0)
+    output_tokens = usage.get("output_tokens", 0)
+    cached_tokens = (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+    if input_tokens:
+        metrics.increment(f"llm.{node}.input_tokens", input_tokens)
+        metrics.increment(f"llm.{node}.cached_input_tokens", cached_tokens)
+        metrics.increment(f"llm.{node}.output_tokens", output_tokens)
+        metrics.observe(f"llm.{node}.cached_ratio", cached_tokens / input_tokens)
+        metrics.observe(f"llm.{node}.input_tokens_per_call", input_tokens)
+    return input_tokens, cached_tokens, output_tokens
+
+
+async def invoke_routed(
+    node: str,
+    level: str,
+    messages: list[BaseMessage],
+    validate: Callable[[AIMessage], Any] | None = None,
+    schema: type[BaseModel] | None = None
+) -> tuple[AIMessage, Any]:
+    """Call the model routed for (node, level), escalating once if the reply fails validation.
+    
+    `validate` gets the reply and returns the parsed value (or raises ValueError).
+    With `schema` the reply is structured output and the parsed value an instance of it.
+    Returns (reply, parsed value). The last ValueError is raised if no route
+    produced a valid reply.
+    """
+    route = select_route(node, level)
+    deadline = time.monotonic() + settings.llm_deadline_seconds
+    escalated = False
+    truncated: tuple[AIMessage, Any] | None = None
+    while True:
+        started = time.monotonic()
+        try:
+            result, model = await invoke_resilient(
+                lambda m: (
+                    get_structured_llm(m, route.temperature, route.max_tokens, schema) if schema
+                    else get_llm(m, route.temperature, route.max_tokens)
+                ),
+                model_for_tier(route.tier),
+                messages,
+                node,
+                deadline=deadline,
+                hedge=node in HEDGED_NODES
+            )
+        except Exception:
+            if truncated:
+                # The escalation failed outright; the cut-off reply beats none
+                return truncated
+            raise
+        latency = time.monotonic() - started
+        response = result["raw"] if schema else result
+        input_tokens, cached_tokens, output_tokens = record_usage(response, node)
+        cost = estimate_cost(model, input_tokens, cached_tokens, output_tokens)
+        
+        parsed = None
+        try:
+            if schema:
+                try:
+                    parsed = parse_structured(result)
+                except ValidationError:
+                    metrics.increment(f"llm.{node}.parse_failures")
+                    raise
+            elif not (response.content or "").strip():
+                raise ValidationError("empty reply")
+            else:
+                parsed = validate(response) if validate else None
+            if response.response_metadata.get("finish_reason") == "length":
+                raise TruncatedReply("reply truncated at max_tokens")
+            outcome, error = "ok", None
+        except ValueError as e:
+            outcome, error = "invalid", e
+        
+        logger.info(
+            f"LLM route node={node} level={level} model={model} max_tokens={route.max_tokens} "
+            f"escalated={escalated} outcome={outcome} latency={latency:.2f}s "
+            f"input={input_tokens} cached={cached_tokens} output={output_tokens} cost_usd={cost:.6f}"
+            + (f" error={error}" if error else "")
+        )
+        metrics.increment(f"llm.{node}.{model}.calls")
+        metrics.increment(f"llm.{node}.cost_usd", cost)
+        metrics.observe(f"llm.{node}.{model}.seconds", latency)
+        
+        if error is None:
+            return response, parsed
+        metrics.increment(f"llm.{node}.{model}.invalid")
+        if isinstance(error, TruncatedReply):
+            truncated = (response, parsed)
+        if route.escalation is None:
+            if truncated:
+                return truncated
+            raise error
+        metrics.increment(f"llm.{node}.escalations")
+        route = route.escalation
+        escalated = True
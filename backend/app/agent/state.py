@@ -18,6 +18,8 @@ class TutorState(TypedDict):
     total_lessons: int
     streak_days: int
     words_learned: int  # Vocabulary words learned
+    due_words: list[str]  # Words due for spaced-repetition review this turn
+    memories: list[str]  # Earlier lessons relevant to this turn (MemoryService.recall)
     
     # Session info
     lesson_id: int | None
@@ -32,4 +34,15 @@ class TutorState(TypedDict):
     # Response
     response: str
     should_evaluate: bool
-    evaluation: dict | None
+    evaluation: dict | None  # This evaluation's scores for the messages it covered
+    lesson_evaluation: dict | None  # The lesson's running evaluation before this turn
+    evaluated_messages: int  # Conversation messages already evaluated; kept across turns
+    
+    # Kept across turns; rebuilt by initialize_session when the thread was lost
+    turn_count: int  # Student turns in the thread
+    history_trimmed: bool  # Older messages dropped from the window; the lesson summary stands in
+    
+    # Vocabulary found in this exchange (VocabularyWord ids)
+    words_taught: list[int]
+    words_seen: list[int]
+    words_used: list[int]
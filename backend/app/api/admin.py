@@ -1,15 +1,20 @@
 """Admin API endpoints for statistics and user management."""
 import logging
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone, timedelta
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import select, func, and_, case
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from pydantic import BaseModel
 
+from app.config import get_settings
 from app.database import get_db
 from app.models import Student, Lesson, LessonMessage
+from app.services import AnalyticsService, BroadcastService, EvaluationBatchService
+from app.services.activity_service import activity_tracker, MAX_WINDOW_DAYS
+from app.metrics import metrics
 
+settings = get_settings()
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -83,6 +88,137 @@ class EngagementStats(BaseModel):
     retention_rate_7d: float
     retention_rate_30d: float
     churn_rate: float
+    sessions_count: int = 0
+    computed_at: datetime | None = None
+    dau: int = 0
+    wau: int = 0
+    mau: int = 0
+    stickiness: float = 0  # DAU / MAU, %
+    retention_day_1: float = 0
+    retention_day_7: float = 0
+
+
+class CohortRetention(BaseModel):
+    cohort_week: str
+    size: int
+    retention: list[float]  # % of the cohort active N weeks after signup
+
+
+class DailyRetention(BaseModel):
+    cohort_date: str
+    cohort_size: int
+    retention: list[float]  # % of the cohort active N days after signup
+
+
+class ActivityOverlap(BaseModel):
+    first_active: int
+    second_active: int
+    active_in_both: int
+
+
+class PromptCacheStats(BaseModel):
+    node: str
+    input_tokens: int
+    cached_input_tokens: int
+    cached_ratio: float  # Share of input tokens served from the provider's prompt cache, %
+    output_tokens: int
+
+
+class EvaluationStats(BaseModel):
+    calls: int
+    avg_input_tokens: float  # Per evaluation call
+    p95_input_tokens: float
+    avg_messages: float  # Conversation messages sent per evaluation
+    parse_failures: int
+    parse_failure_rate: float  # %
+
+
+class ResponseCacheStats(BaseModel):
+    hits: int
+    exact_hits: int
+    similar_hits: int
+    misses: int
+    hit_rate: float  # % of cacheable turns answered without the LLM
+    entries: int
+
+
+class BroadcastCreate(BaseModel):
+    name: str
+    template: str  # Placeholders: {name}, {streak}, {level}, {level_name}, {days_inactive}
+    days_inactive: int = 14
+    level: str | None = None
+
+
+class BroadcastStatus(BaseModel):
+    id: int
+    name: str
+    status: str
+    level: str | None
+    inactive_before: datetime
+    sent_count: int
+    failed_count: int
+    blocked_count: int
+    remaining: int | None = None
+    created_at: datetime
+    started_at: datetime | None
+    finished_at: datetime | None
+
+
+def _broadcast_status(broadcast, remaining: int | None = None) -> BroadcastStatus:
+    return BroadcastStatus(
+        id=broadcast.id,
+        name=broadcast.name,
+        status=broadcast.status,
+        level=broadcast.level_code,
+        inactive_before=broadcast.inactive_before,
+        sent_count=broadcast.sent_count,
+        failed_count=broadcast.failed_count,
+        blocked_count=broadcast.blocked_count,
+        remaining=remaining,
+        created_at=broadcast.created_at,
+        started_at=broadcast.started_at,
+        finished_at=broadcast.finished_at
+    )
+
+
+class EvaluationBatchCreate(BaseModel):
+    day: date  # Lessons that ended on this UTC day
+
+
+class EvaluationBatchStatus(BaseModel):
+    id: int
+    day: date
+    backend: str
+    status: str
+    lesson_count: int
+    applied_count: int
+    failed_count: int
+    input_tokens: int
+    output_tokens: int
+    cost_usd: float
+    cost_per_lesson_usd: float
+    error: str | None
+    created_at: datetime
+    finished_at: datetime | None
+
+
+def _evaluation_batch_status(batch) -> EvaluationBatchStatus:
+    return EvaluationBatchStatus(
+        id=batch.id,
+        day=batch.day,
+        backend=batch.backend,
+        status=batch.status,
+        lesson_count=batch.lesson_count,
+        applied_count=batch.applied_count,
+        failed_count=batch.failed_count,
+        input_tokens=batch.input_tokens,
+        output_tokens=batch.output_tokens,
+        cost_usd=round(batch.cost_usd, 4),
+        cost_per_lesson_usd=round(batch.cost_usd / batch.applied_count, 6) if batch.applied_count else 0,
+        error=batch.error,
+        created_at=batch.created_at,
+        finished_at=batch.finished_at
+    )
 
 
 # ============ API Endpoints ============
@@ -99,16 +235,21 @@ async def get_overview_stats(db: AsyncSession = Depends(get_db)):
         # Total users
         total_users = await db.scalar(select(func.count(Student.id))) or 0
         
-        # Active users (by last_activity)
-        active_today = await db.scalar(
-            select(func.count(Student.id)).where(Student.last_activity >= today_start)
-        ) or 0
-        active_week = await db.scalar(
-            select(func.count(Student.id)).where(Student.last_activity >= week_ago)
-        ) or 0
-        active_month = await db.scalar(
-            select(func.count(Student.id)).where(Student.last_activity >= month_ago)
-        ) or 0
+        # Active users from the daily activity bitmaps, falling back to last_activity
+        try:
+            windows = await activity_tracker.active_windows()
+            active_today, active_week, active_month = windows["dau"], windows["wau"], windows["mau"]
+        except Exception as e:
+            logger.warning(f"Activity bitmaps unavailable, using last_activity: {e}")
+            active_today = await db.scalar(
+                select(func.count(Student.id)).where(Student.last_activity >= today_start)
+            ) or 0
+            active_week = await db.scalar(
+                select(func.count(Student.id)).where(Student.last_activity >= week_ago)
+            ) or 0
+            active_month = await db.scalar(
+                select(func.count(Student.id)).where(Student.last_activity >= month_ago)
+            ) or 0
         
         # New users
         new_today = await db.scalar(
@@ -389,58 +530,39 @@ async def get_token_usage(
 
 @router.get("/engagement", response_model=EngagementStats)
 async def get_engagement_stats(db: AsyncSession = Depends(get_db)):
-    """Get engagement and retention statistics."""
+    """Get engagement and retention statistics from the latest materialized snapshot."""
     try:
-        now = datetime.now(timezone.utc)
-        week_ago = now - timedelta(days=7)
-        month_ago = now - timedelta(days=30)
-        two_weeks_ago = now - timedelta(days=14)
-        
-        # Users registered more than 7 days ago
-        users_7d_ago = await db.scalar(
-            select(func.count(Student.id))
-            .where(Student.registered_at <= week_ago)
-        ) or 1
-        
-        # Of those, how many were active in last 7 days
-        retained_7d = await db.scalar(
-            select(func.count(Student.id))
-            .where(and_(
-                Student.registered_at <= week_ago,
-                Student.last_activity >= week_ago
-            ))
-        ) or 0
-        
-        # Users registered more than 30 days ago
-        users_30d_ago = await db.scalar(
-            select(func.count(Student.id))
-            .where(Student.registered_at <= month_ago)
-        ) or 1
-        
-        # Of those, how many were active in last 30 days
-        retained_30d = await db.scalar(
-            select(func.count(Student.id))
-            .where(and_(
-                Student.registered_at <= month_ago,
-                Student.last_activity >= month_ago
-            ))
-        ) or 0
+        snapshot = await AnalyticsService(db).get_latest_snapshot()
         
-        # Churn: users inactive > 14 days
-        total_users = await db.scalar(select(func.count(Student.id))) or 1
-        churned = await db.scalar(
-            select(func.count(Student.id))
-            .where(Student.last_activity < two_weeks_ago)
-        ) or 0
+        if not snapshot:
+            return EngagementStats(
+                avg_session_duration_minutes=0, avg_messages_per_session=0,
+                avg_daily_usage_minutes=0, retention_rate_7d=0,
+                retention_rate_30d=0, churn_rate=0
+            )
         
-        return EngagementStats(
-            avg_session_duration_minutes=15.0,
-            avg_messages_per_session=5.0,
-            avg_daily_usage_minutes=10.0,
-            retention_rate_7d=round((retained_7d / users_7d_ago) * 100, 1),
-            retention_rate_30d=round((retained_30d / users_30d_ago) * 100, 1),
-            churn_rate=round((churned / total_users) * 100, 1)
+        stats = EngagementStats(
+            avg_session_duration_minutes=snapshot.avg_session_duration_minutes,
+            avg_messages_per_session=snapshot.avg_messages_per_session,
+            avg_daily_usage_minutes=snapshot.avg_daily_usage_minutes,
+            retention_rate_7d=snapshot.retention_rate_7d,
+            retention_rate_30d=snapshot.retention_rate_30d,
+            churn_rate=snapshot.churn_rate,
+            sessions_count=snapshot.sessions_count,
+            computed_at=snapshot.computed_at
         )
+        
+        # Live active-user windows and day-N retention from the activity bitmaps
+        try:
+            windows = await activity_tracker.active_windows()
+            stats.dau, stats.wau, stats.mau = windows["dau"], windows["wau"], windows["mau"]
+            stats.stickiness = round(stats.dau / stats.mau * 100, 1) if stats.mau else 0
+            stats.retention_day_1 = await activity_tracker.rolling_retention_rate(1)
+            stats.retention_day_7 = await activity_tracker.rolling_retention_rate(7)
+        except Exception as e:
+            logger.warning(f"Activity bitmaps unavailable: {e}")
+        
+        return stats
     except Exception as e:
         logger.error(f"Error in get_engagement_stats: {e}")
         return EngagementStats(
@@ -450,6 +572,193 @@ async def get_engagement_stats(db: AsyncSession = Depends(get_db)):
         )
 
 
+@router.get("/engagement/cohorts", response_model=list[CohortRetention])
+async def get_cohort_retention(db: AsyncSession = Depends(get_db)):
+    """Get weekly cohort retention curves from the latest materialized snapshot."""
+    try:
+        snapshot = await AnalyticsService(db).get_latest_snapshot()
+        if not snapshot or not snapshot.cohorts:
+            return []
+        
+        return [CohortRetention(**cohort) for cohort in snapshot.cohorts]
+    except Exception as e:
+        logger.error(f"Error in get_cohort_retention: {e}")
+        return []
+
+
+@router.get("/activity/retention", response_model=DailyRetention)
+async def get_daily_retention(
+    cohort_date: date = Query(...),
+    days: int = Query(30, ge=1, le=90)
+):
+    """Get the day-N retention curve for students who signed up on a given day."""
+    try:
+        curve = await activity_tracker.retention_curve(cohort_date, days)
+        _, cohort_size = await activity_tracker.retention(cohort_date, 0)
+        return DailyRetention(
+            cohort_date=cohort_date.isoformat(),
+            cohort_size=cohort_size,
+            retention=curve
+        )
+    except Exception as e:
+        logger.error(f"Error in get_daily_retention: {e}")
+        return DailyRetention(cohort_date=cohort_date.isoformat(), cohort_size=0, retention=[])
+
+
+@router.get("/activity/overlap", response_model=ActivityOverlap)
+async def get_activity_overlap(
+    first_start: date = Query(...),
+    first_end: date = Query(...),
+    second_start: date = Query(...),
+    second_end: date = Query(...)
+):
+    """Count students active in both of two date windows (e.g. last week vs this week)."""
+    if first_end < first_start or second_end < second_start:
+        raise HTTPException(status_code=400, detail="Window end must not be before its start")
+    if max((first_end - first_start).days, (second_end - second_start).days) >= MAX_WINDOW_DAYS:
+        raise HTTPException(status_code=400, detail=f"Windows can span at most {MAX_WINDOW_DAYS} days")
+    
+    try:
+        counts = await activity_tracker.overlap((first_start, first_end), (second_start, second_end))
+        return ActivityOverlap(
+            first_active=counts["first"],
+            second_active=counts["second"],
+            active_in_both=counts["both"]
+        )
+    except Exception as e:
+        logger.error(f"Error in get_activity_overlap: {e}")
+        return ActivityOverlap(first_active=0, second_active=0, active_in_both=0)
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """Counters and latency histograms summed over the API and bot processes."""
+    return await metrics.shared_snapshot()
+
+
+@router.get("/llm/prompt-cache", response_model=list[PromptCacheStats])
+async def get_prompt_cache_stats():
+    """Prompt-cache hit ratio per LLM call site, from provider usage metadata."""
+    counters = (await metrics.shared_snapshot())["counters"]
+    stats = []
+    for node in ("respond", "evaluate"):
+        input_tokens = int(counters.get(f"llm.{node}.input_tokens", 0))
+        cached_tokens = int(counters.get(f"llm.{node}.cached_input_tokens", 0))
+        stats.append(PromptCacheStats(
+            node=node,
+            input_tokens=input_tokens,
+            cached_input_tokens=cached_tokens,
+            cached_ratio=round(cached_tokens / input_tokens * 100, 1) if input_tokens else 0,
+            output_tokens=int(counters.get(f"llm.{node}.output_tokens", 0))
+        ))
+    return stats
+
+
+@router.get("/llm/evaluation", response_model=EvaluationStats)
+async def get_evaluation_stats():
+    """Input size and parse failures of lesson evaluations."""
+    snapshot = await metrics.shared_snapshot()
+    tokens = snapshot["histograms"].get("llm.evaluate.input_tokens_per_call", {})
+    messages = snapshot["histograms"].get("evaluate.messages_per_call", {})
+    calls = tokens.get("count", 0)
+    parse_failures = int(snapshot["counters"].get("llm.evaluate.parse_failures", 0))
+    return EvaluationStats(
+        calls=calls,
+        avg_input_tokens=round(tokens.get("avg", 0), 1),
+        p95_input_tokens=tokens.get("p95") or 0,
+        avg_messages=round(messages.get("avg", 0), 1),
+        parse_failures=parse_failures,
+        parse_failure_rate=round(parse_failures / calls * 100, 1) if calls else 0
+    )
+
+
+@router.get("/llm/response-cache", response_model=ResponseCacheStats)
+async def get_response_cache_stats():
+    """Hit rate of the beginner reply cache, and its entries across bot processes."""
+    snapshot = await metrics.shared_snapshot()
+    counters = snapshot["counters"]
+    hits = int(counters.get("response_cache.hits", 0))
+    misses = int(counters.get("response_cache.misses", 0))
+    return ResponseCacheStats(
+        hits=hits,
+        exact_hits=int(counters.get("response_cache.hits.exact", 0)),
+        similar_hits=int(counters.get("response_cache.hits.similar", 0)),
+        misses=misses,
+        hit_rate=round(hits / (hits + misses) * 100, 1) if hits + misses else 0,
+        entries=int(snapshot["gauges"].get("response_cache.entries", 0))
+    )
+
+
+@router.post("/broadcasts", response_model=BroadcastStatus)
+async def create_broadcast(body: BroadcastCreate, db: AsyncSession = Depends(get_db)):
+    """Queue a message to inactive students; the scheduler sends it in the background."""
+    if not 1 <= body.days_inactive <= 365:
+        raise HTTPException(status_code=400, detail="days_inactive must be between 1 and 365")
+    
+    service = BroadcastService(db)
+    try:
+        broadcast = await service.create_broadcast(body.name, body.template, body.days_inactive, body.level)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _broadcast_status(broadcast, await service.count_recipients(broadcast))
+
+
+@router.get("/broadcasts", response_model=list[BroadcastStatus])
+async def list_broadcasts(db: AsyncSession = Depends(get_db)):
+    """Recent broadcasts with their delivery counters."""
+    try:
+        broadcasts = await BroadcastService(db).list_broadcasts()
+        return [_broadcast_status(b) for b in broadcasts]
+    except Exception as e:
+        logger.error(f"Error in list_broadcasts: {e}")
+        return []
+
+
+@router.get("/broadcasts/{broadcast_id}", response_model=BroadcastStatus)
+async def get_broadcast(broadcast_id: int, db: AsyncSession = Depends(get_db)):
+    """Progress of one broadcast, including recipients still to be sent."""
+    service = BroadcastService(db)
+    broadcast = await service.get_broadcast(broadcast_id)
+    if not broadcast:
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    
+    remaining = await service.count_recipients(broadcast) if broadcast.status in ("pending", "running") else 0
+    return _broadcast_status(broadcast, remaining)
+
+
+@router.post("/broadcasts/{broadcast_id}/cancel", response_model=BroadcastStatus)
+async def cancel_broadcast(broadcast_id: int, db: AsyncSession = Depends(get_db)):
+    """Stop a broadcast after the batch in flight."""
+    broadcast = await BroadcastService(db).cancel_broadcast(broadcast_id)
+    if not broadcast:
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    return _broadcast_status(broadcast)
+
+
+@router.get("/evaluation-batches", response_model=list[EvaluationBatchStatus])
+async def list_evaluation_batches(db: AsyncSession = Depends(get_db)):
+    """Nightly lesson-evaluation batches, newest day first."""
+    batches = await EvaluationBatchService(db).list_batches()
+    return [_evaluation_batch_status(batch) for batch in batches]
+
+
+@router.post("/evaluation-batches", response_model=EvaluationBatchStatus, status_code=202)
+async def submit_evaluation_batch(body: EvaluationBatchCreate, db: AsyncSession = Depends(get_db)):
+    """Queue (or retry a failed) evaluation batch for a past day's lessons.
+    
+    The scheduler submits it on its next run (evaluation_batch_poll_minutes).
+    """
+    if settings.evaluation_mode != "batch":
+        raise HTTPException(status_code=400, detail="Evaluation batches only run with EVALUATION_MODE=batch")
+    if body.day >= datetime.now(timezone.utc).date():
+        raise HTTPException(status_code=400, detail="Only past days can be evaluated")
+    
+    batch = await EvaluationBatchService(db).enqueue_day(body.day)
+    if batch is None:
+        raise HTTPException(status_code=409, detail=f"{body.day} already has an evaluation batch")
+    return _evaluation_batch_status(batch)
+
+
 @router.get("/user/{user_id}")
 async def get_user_detail(user_id: int, db: AsyncSession = Depends(get_db)):
     """Get detailed info for a specific user."""
@@ -1,10 +1,12 @@
+import hashlib
 import logging
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
 from app.schemas import StudentResponse, StudentDashboard, SkillProgress
 from app.schemas.student import LevelResponse, SkillResponse
-from app.services import StudentService, LessonService
+from app.services import StudentService
+from app.models.skill import SKILL_SEED_DATA
 from app.api.auth import get_current_student_id
 
 logger = logging.getLogger(__name__)
@@ -28,125 +30,53 @@ async def get_current_student(
 
 @router.get("/me/dashboard", response_model=StudentDashboard)
 async def get_student_dashboard(
+    request: Request,
     student_id: int = Depends(get_current_student_id),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get complete dashboard data for current student."""
+    """Get complete dashboard data for current student.
+    
+    Served with an ETag; a matching If-None-Match gets an empty 304.
+    """
     logger.info(f"Loading dashboard for student_id: {student_id}")
     
     student_service = StudentService(db)
-    lesson_service = LessonService(db)
     
     try:
-        student = await student_service.get_student_by_id(student_id)
-        if not student:
+        row = await student_service.get_dashboard_row(student_id)
+        if not row:
             logger.error(f"Student not found: {student_id}")
             raise HTTPException(status_code=404, detail="Student not found")
         
         # Ensure student has skills initialized
-        if not student.skills:
+        if not row.skills:
             logger.info(f"Initializing skills for student {student_id}")
             try:
+                student = await student_service.get_student_by_id(student_id)
                 await student_service.ensure_student_skills(student)
                 await db.commit()
-                student = await student_service.get_student_by_id(student_id)
+                row = await student_service.get_dashboard_row(student_id)
             except Exception as e:
                 logger.warning(f"Could not initialize skills: {e}")
         
-        # Default level for fallback
-        default_level = LevelResponse(
-            id=1, code="PRE_A1", name="Pre A1 - Principiante",
-            description="Nivel inicial para principiantes absolutos", order=1
-        )
-        
-        # Get current level safely
-        if student.current_level:
-            current_level_response = LevelResponse(
-                id=student.current_level.id,
-                code=student.current_level.code,
-                name=student.current_level.name,
-                description=student.current_level.description or "",
-                order=student.current_level.order
-            )
-        else:
-            current_level_response = default_level
-        
-        # Build skills progress with defaults
-        skills_progress = []
-        default_skills = [
-            {"code": "SPEAKING", "name": "Speaking", "icon": "mic"},
-            {"code": "LISTENING", "name": "Listening", "icon": "headphones"},
-            {"code": "READING", "name": "Reading", "icon": "book-open"},
-            {"code": "WRITING", "name": "Writing", "icon": "pencil"},
-            {"code": "VOCABULARY", "name": "Vocabulary", "icon": "library"},
-            {"code": "GRAMMAR", "name": "Grammar", "icon": "brackets"},
-        ]
-        
-        if student.skills:
-            for student_skill in student.skills:
-                try:
-                    skill_level = LevelResponse(
-                        id=student_skill.level.id if student_skill.level else 1,
-                        code=student_skill.level.code if student_skill.level else "PRE_A1",
-                        name=student_skill.level.name if student_skill.level else "Pre A1",
-                        description=student_skill.level.description if student_skill.level else "",
-                        order=student_skill.level.order if student_skill.level else 1
-                    )
-                    skills_progress.append(SkillProgress(
-                        skill=SkillResponse(
-                            id=student_skill.skill.id if student_skill.skill else 1,
-                            code=student_skill.skill.code if student_skill.skill else "UNKNOWN",
-                            name=student_skill.skill.name if student_skill.skill else "Unknown",
-                            icon=student_skill.skill.icon if student_skill.skill else "help"
-                        ),
-                        level=skill_level,
-                        score=student_skill.score or 0,
-                        lessons_completed=student_skill.lessons_completed or 0,
-                        last_practiced=student_skill.last_practiced
-                    ))
-                except Exception as e:
-                    logger.warning(f"Error processing skill: {e}")
+        student = row.Student
+        skills_progress = [SkillProgress.model_validate(skill) for skill in row.skills]
         
         # If no skills loaded, use defaults with zero values
         if not skills_progress:
-            for i, skill_data in enumerate(default_skills):
+            current_level_response = LevelResponse.model_validate(student.current_level)
+            for i, skill_data in enumerate(SKILL_SEED_DATA):
                 skills_progress.append(SkillProgress(
-                    skill=SkillResponse(
-                        id=i + 1,
-                        code=skill_data["code"],
-                        name=skill_data["name"],
-                        icon=skill_data["icon"]
-                    ),
+                    skill=SkillResponse(id=i + 1, **{k: skill_data[k] for k in ("code", "name", "icon")}),
                     level=current_level_response,
                     score=0,
                     lessons_completed=0,
                     last_practiced=None
                 ))
         
-        # Get recent lessons count safely
-        try:
-            recent_lessons = await lesson_service.get_recent_lessons_count(student_id, days=7)
-        except Exception as e:
-            logger.warning(f"Error getting recent lessons: {e}")
-            recent_lessons = 0
-        
-        # Get next level safely
-        try:
-            next_level = await student_service.get_next_level(student.current_level) if student.current_level else None
-        except Exception as e:
-            logger.warning(f"Error getting next level: {e}")
-            next_level = None
-        
-        # Calculate level progress safely
-        try:
-            avg_score = sum(sp.score for sp in skills_progress) / len(skills_progress) if skills_progress else 0
-            lessons_at_level = await lesson_service.get_total_lessons_at_level(
-                student_id, student.current_level_id or 1
-            )
-        except Exception as e:
-            logger.warning(f"Error calculating progress: {e}")
-            avg_score = 0
-            lessons_at_level = 0
+        # Calculate level progress
+        avg_score = sum(sp.score for sp in skills_progress) / len(skills_progress) if skills_progress else 0
+        lessons_at_level = row.lessons_at_level or 0
         
         score_progress = min(100, (avg_score / 75) * 100) if avg_score > 0 else 0
         lesson_progress = min(100, (lessons_at_level / 10) * 100) if lessons_at_level > 0 else 0
@@ -159,15 +89,17 @@ async def get_student_dashboard(
             logger.warning(f"Error generating recommendations: {e}")
             recommendations = ["¡Bienvenido! Comienza a practicar con el bot de Telegram para ver tu progreso."]
         
-        return StudentDashboard(
+        dashboard = StudentDashboard(
             student=student,
             skills_progress=skills_progress,
-            recent_lessons_count=recent_lessons,
-            next_level=next_level,
+            recent_lessons_count=row.recent_lessons or 0,
+            next_level=row.next_level,
             level_progress_percent=level_progress,
             recommendations=recommendations
         )
         
+        return etag_response(request, dashboard.model_dump_json())
+    
     except HTTPException:
         raise
     except Exception as e:
@@ -175,6 +107,19 @@ async def get_student_dashboard(
         raise HTTPException(status_code=500, detail=f"Error loading dashboard: {str(e)}")
 
 
+def etag_response(request: Request, body: str) -> Response:
+    """Return the JSON body, or an empty 304 if the client already has this version."""
+    etag = f'"{hashlib.sha1(body.encode()).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    
+    if_none_match = request.headers.get("if-none-match", "")
+    client_etags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if etag in client_etags or "*" in client_etags:
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @router.get("/levels", response_model=list[LevelResponse])
 async def get_all_levels(
     db: AsyncSession = Depends(get_db)
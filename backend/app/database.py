@@ -1,3 +1,4 @@
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 from app.config import get_settings
@@ -8,8 +9,8 @@ engine = create_async_engine(
     settings.database_url,
     echo=settings.debug,
     pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow
 )
 
 AsyncSessionLocal = async_sessionmaker(
@@ -32,6 +33,120 @@ async def get_db():
             await session.close()
 
 
+SCHEMA_LOCK_ID = 7212845  # pg_advisory_xact_lock key held while the schema is set up
+
+# create_all only creates missing tables, so columns, constraints and indexes
+# added later to existing tables are applied here: (query that returns a row
+# once the upgrade is in place, statements that apply it). Checking first keeps
+# a normal start from taking ALTER TABLE locks on busy tables.
+SCHEMA_UPGRADES: list[tuple[str, list[str]]] = [
+    (
+        "SELECT 1 FROM information_schema.columns WHERE table_name = 'students' AND column_name = 'blocked_bot_at'",
+        ["ALTER TABLE students ADD COLUMN blocked_bot_at TIMESTAMP WITH TIME ZONE"]
+    ),
+    (
+        "SELECT 1 FROM information_schema.columns WHERE table_name = 'student_vocabulary' AND column_name = 'ease_factor'",
+        [
+            "ALTER TABLE student_vocabulary ADD COLUMN ease_factor DOUBLE PRECISION NOT NULL DEFAULT 2.5, "
+            "ADD COLUMN interval_days INTEGER NOT NULL DEFAULT 0",
+            # Rows without a schedule are due now
+            "UPDATE student_vocabulary SET next_review = now() WHERE next_review IS NULL",
+        ]
+    ),
+    (
+        "SELECT 1 FROM pg_constraint WHERE conname = 'uq_student_word'",
+        [
+            # Fold duplicate (student, word) rows into the oldest one before making the pair unique
+            """
+            UPDATE student_vocabulary sv
+            SET times_seen = d.times_seen, times_correct = d.times_correct, mastery_level = d.mastery_level,
+                last_practiced = d.last_practiced, next_review = d.next_review, is_learned = d.is_learned
+            FROM (
+                SELECT min(id) AS id, sum(times_seen) AS times_seen, sum(times_correct) AS times_correct,
+                    max(mastery_level) AS mastery_level, max(last_practiced) AS last_practiced,
+                    min(next_review) AS next_review, bool_or(is_learned) AS is_learned
+                FROM student_vocabulary
+                GROUP BY student_id, word_id
+                HAVING count(*) > 1
+            ) d
+            WHERE sv.id = d.id
+            """,
+            """
+            DELETE FROM student_vocabulary sv
+            USING student_vocabulary kept
+            WHERE kept.student_id = sv.student_id AND kept.word_id = sv.word_id AND kept.id < sv.id
+            """,
+            "ALTER TABLE student_vocabulary ADD CONSTRAINT uq_student_word UNIQUE (student_id, word_id)",
+        ]
+    ),
+    (
+        "SELECT 1 FROM pg_indexes WHERE indexname = 'ix_student_vocabulary_due'",
+        ["CREATE INDEX ix_student_vocabulary_due ON student_vocabulary (student_id, next_review)"]
+    ),
+    (
+        "SELECT 1 FROM pg_constraint WHERE conname = 'uq_vocabulary_word_category'",
+        [
+            # Duplicate (word, category) rows are merged into the oldest one
+            """
+            CREATE TEMPORARY TABLE duplicate_words ON COMMIT DROP AS
+            SELECT id, keep_id FROM (
+                SELECT id, min(id) OVER (PARTITION BY word, category) AS keep_id FROM vocabulary_words
+            ) words
+            WHERE id <> keep_id
+            """,
+            # A student keeps their oldest row among those that now point to the same word
+            """
+            DELETE FROM student_vocabulary WHERE id IN (
+                SELECT id FROM (
+                    SELECT sv.id, row_number() OVER (
+                        PARTITION BY sv.student_id, coalesce(d.keep_id, sv.word_id) ORDER BY sv.id
+                    ) AS n
+                    FROM student_vocabulary sv
+                    LEFT JOIN duplicate_words d ON d.id = sv.word_id
+                    WHERE sv.word_id IN (SELECT id FROM duplicate_words UNION SELECT keep_id FROM duplicate_words)
+                ) ranked
+                WHERE n > 1
+            )
+            """,
+            "UPDATE student_vocabulary sv SET word_id = d.keep_id FROM duplicate_words d WHERE sv.word_id = d.id",
+            "DELETE FROM vocabulary_words w USING duplicate_words d WHERE w.id = d.id",
+            "ALTER TABLE vocabulary_words ADD CONSTRAINT uq_vocabulary_word_category UNIQUE (word, category)",
+        ]
+    ),
+    (
+        "SELECT 1 FROM pg_indexes WHERE indexname = 'ix_lessons_open_student'",
+        ["CREATE INDEX ix_lessons_open_student ON lessons (student_id) WHERE ended_at IS NULL"]
+    ),
+    (
+        "SELECT 1 FROM pg_indexes WHERE indexname = 'ix_lesson_messages_lesson_created'",
+        [
+            "CREATE INDEX ix_lesson_messages_lesson_created ON lesson_messages (lesson_id, created_at)",
+            "CREATE INDEX IF NOT EXISTS ix_lesson_messages_created_at ON lesson_messages (created_at)",
+        ]
+    ),
+    (
+        "SELECT 1 FROM information_schema.columns WHERE table_name = 'students' AND column_name = 'words_learned'",
+        [
+            "ALTER TABLE students ADD COLUMN words_learned INTEGER NOT NULL DEFAULT 0",
+            # Counted after the duplicate cleanups above, which can remove learned rows
+            """
+            UPDATE students s SET words_learned = learned.count
+            FROM (
+                SELECT student_id, count(*) AS count FROM student_vocabulary WHERE is_learned GROUP BY student_id
+            ) learned
+            WHERE s.id = learned.student_id
+            """,
+        ]
+    ),
+]
+
+
 async def init_db():
     async with engine.begin() as conn:
+        # API and bot workers start together; one of them sets up the schema at a time
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": SCHEMA_LOCK_ID})
         await conn.run_sync(Base.metadata.create_all)
+        for applied, statements in SCHEMA_UPGRADES:
+            if (await conn.execute(text(applied))).first() is None:
+                for statement in statements:
+                    await conn.execute(text(statement))
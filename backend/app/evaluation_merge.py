@@ -0,0 +1,37 @@
+"""Folding partial lesson evaluations into a lesson's running one.
+
+Kept free of dependencies so both the agent (app.agent.evaluation, which
+defines the evaluation schema) and the services that store evaluations
+(LessonService, EvaluationBatchService) can import it.
+"""
+
+SCORE_FIELDS = ("vocabulary_score", "grammar_score", "fluency_score", "comprehension_score")
+MAX_LISTED = 10  # Topics, skills and errors kept in a lesson's running evaluation
+
+
+def _union(previous: list, new: list) -> list:
+    merged = list(dict.fromkeys([*previous, *new]))
+    return merged[-MAX_LISTED:]
+
+
+def merge_evaluation(previous: dict | None, new: dict) -> dict:
+    """Fold a partial evaluation of `new["messages_evaluated"]` messages into the running one."""
+    if not previous:
+        return {**new, "evaluations": 1}
+    
+    previous_count = previous.get("messages_evaluated", 0)
+    new_count = new.get("messages_evaluated", 0)
+    total = previous_count + new_count
+    merged = dict(new)
+    for field in SCORE_FIELDS:
+        old, latest = previous.get(field), new.get(field)
+        if old is not None and latest is not None and total:
+            merged[field] = round((old * previous_count + latest * new_count) / total)
+        elif latest is None:
+            merged[field] = old
+    merged["topics_covered"] = _union(previous.get("topics_covered", []), new.get("topics_covered", []))
+    merged["skills_practiced"] = _union(previous.get("skills_practiced", []), new.get("skills_practiced", []))
+    merged["errors_noted"] = _union(previous.get("errors_noted", []), new.get("errors_noted", []))
+    merged["messages_evaluated"] = total
+    merged["evaluations"] = previous.get("evaluations", 1) + 1
+    return merged
@@ -0,0 +1,84 @@
+"""Leader election across API workers with a Postgres advisory lock.
+
+Every worker tries to take the same session-level advisory lock on a connection
+it keeps open. The holder is the leader; if its process dies the connection
+closes, Postgres releases the lock and another worker takes over on its next try.
+"""
+import asyncio
+import logging
+import zlib
+from typing import Awaitable, Callable
+from sqlalchemy import text
+from app.config import get_settings
+from app.database import engine
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+Callback = Callable[[], Awaitable[None]]
+
+
+class LeaderElector:
+    def __init__(self, name: str, on_elected: Callback, on_demoted: Callback):
+        self.name = name
+        self.lock_key = zlib.crc32(name.encode())
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.is_leader = False
+        self._task: asyncio.Task | None = None
+    
+    async def _hold_leadership(self):
+        """Acquire the lock, run the leader roles and heartbeat until the connection fails."""
+        async with engine.connect() as conn:
+            # Autocommit so the held connection is never left idle in a transaction
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            try:
+                while not self.is_leader:
+                    result = await conn.execute(
+                        text("SELECT pg_try_advisory_lock(:key)"), {"key": self.lock_key}
+                    )
+                    if result.scalar():
+                        self.is_leader = True
+                    else:
+                        await asyncio.sleep(settings.leader_retry_seconds)
+                
+                logger.info(f"Elected leader for '{self.name}'")
+                await self.on_elected()
+                
+                while True:
+                    await asyncio.sleep(settings.leader_heartbeat_seconds)
+                    await asyncio.wait_for(
+                        conn.execute(text("SELECT 1")), settings.leader_heartbeat_seconds
+                    )
+            finally:
+                if self.is_leader:
+                    # Closing the connection releases the lock; never return it to the pool
+                    await conn.invalidate()
+    
+    async def _run(self):
+        while True:
+            try:
+                await self._hold_leadership()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Leader election for '{self.name}' failed: {e}")
+            finally:
+                if self.is_leader:
+                    self.is_leader = False
+                    logger.warning(f"Lost leadership for '{self.name}'")
+                    try:
+                        await self.on_demoted()
+                    except Exception as e:
+                        logger.error(f"Error stepping down as leader: {e}")
+            await asyncio.sleep(settings.leader_retry_seconds)
+    
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name=f"leader:{self.name}")
+    
+    async def stop(self):
+        """Step down (running on_demoted) and stop competing for the lock."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -6,7 +6,12 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.config import get_settings
 from app.database import init_db
 from app.api import api_router
-from app.telegram.bot import start_bot, stop_bot
+from app.telegram.bot import start_bot, stop_bot, register_webhook
+from app.telegram.webhook import router as telegram_webhook_router
+from app.scheduler import start_scheduler, stop_scheduler
+from app.redis_client import close_redis
+from app.leader import LeaderElector
+from app.metrics import metrics
 
 # Configure logging
 logging.basicConfig(
@@ -18,23 +23,80 @@ logger = logging.getLogger(__name__)
 settings = get_settings()
 
 
+def _bot_polls_in_api() -> bool:
+    return (
+        settings.telegram_run_in_api
+        and settings.telegram_mode != "webhook"
+        and not settings.telegram_update_stream
+    )
+
+
+def _check_webhook_topology():
+    """Refuse in-API webhook handling unless a single API process receives every update.
+    
+    Each process would otherwise run its own bot, with its own turn queue and
+    conversation state, and a student's updates would be spread across them.
+    """
+    processes = settings.api_workers * settings.api_replicas
+    if (
+        settings.telegram_mode == "webhook"
+        and settings.telegram_run_in_api
+        and not settings.telegram_update_stream
+        and processes > 1
+    ):
+        raise RuntimeError(
+            f"Webhook mode with the bot in the API needs a single API process (got {processes}); "
+            "set API_WORKERS=1 and API_REPLICAS=1, or TELEGRAM_UPDATE_STREAM=true to share "
+            "updates with bot workers"
+        )
+
+
+async def start_leader_roles():
+    """Work that must run in exactly one worker: the polling bot and background jobs."""
+    if _bot_polls_in_api():
+        await start_bot()
+    await start_scheduler()
+
+
+async def stop_leader_roles():
+    await stop_scheduler()
+    if _bot_polls_in_api():
+        await stop_bot()
+
+
+leader = LeaderElector("english-tutor-leader", start_leader_roles, stop_leader_roles)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan handler."""
     logger.info("Starting English Profesor Expert...")
+    _check_webhook_topology()
     
     # Initialize database
     await init_db()
     logger.info("Database initialized")
     
-    # Start Telegram bot
-    await start_bot()
+    metrics.start_flushing()
+    
+    if settings.telegram_mode == "webhook" and settings.telegram_update_stream:
+        # Webhook updates go to the update stream, consumed by bot workers
+        await register_webhook()
+    elif settings.telegram_mode == "webhook" and settings.telegram_run_in_api:
+        # With webhooks every worker processes the updates it receives
+        await start_bot()
+    
+    # The elected worker polls Telegram and runs background jobs
+    leader.start()
     
     yield
     
     # Shutdown
     logger.info("Shutting down...")
+    await leader.stop()
     await stop_bot()
+    await metrics.stop_flushing()
+    await close_redis()
 
 
 app = FastAPI(
@@ -56,11 +118,14 @@ app.add_middleware(
 # Include API routes
 app.include_router(api_router, prefix="/api")
 
+# Telegram webhook (used when TELEGRAM_MODE=webhook)
+app.include_router(telegram_webhook_router)
+
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy", "app": settings.app_name}
+    return {"status": "healthy", "app": settings.app_name, "leader": leader.is_leader}
 
 
 @app.get("/")
@@ -0,0 +1,185 @@
+"""Counters and histograms, exposed read-only through /api/admin/metrics.
+
+Every process records into its own registry (resilience reads its latency
+percentiles from it) and, every metrics_flush_seconds, adds what it recorded
+since the last flush to shared totals in Redis. The admin endpoints read those,
+so they cover the bot workers as well as the API process serving the request.
+Gauges are sampled at each flush and summed over the processes that reported
+one recently.
+"""
+import asyncio
+import logging
+import os
+import socket
+from collections import defaultdict, deque
+from typing import Callable
+from redis.asyncio import Redis
+from app.config import get_settings
+from app.redis_client import redis_client
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+HISTOGRAM_WINDOW = 1000  # Recent observations kept per histogram for percentiles
+KEY_PREFIX = "metrics"
+
+
+def _percentile(values: list[float], q: float) -> float | None:
+    """Percentile (0-100) of sorted values."""
+    return values[min(len(values) - 1, int(len(values) * q / 100))] if values else None
+
+
+def _summary(count: int, total: float, maximum: float | None, recent: list[float]) -> dict:
+    values = sorted(recent)
+    return {
+        "count": count,
+        "avg": round(total / count, 4) if count else 0.0,
+        "p50": _percentile(values, 50),
+        "p95": _percentile(values, 95),
+        "max": maximum
+    }
+
+
+class Metrics:
+    def __init__(self, redis: Redis = redis_client):
+        self.redis = redis
+        self.process_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._counters: dict[str, float] = defaultdict(float)
+        self._histograms: dict[str, dict] = {}
+        self._gauges: dict[str, Callable[[], float]] = {}
+        # Recorded since the last flush to Redis
+        self._unflushed_counters: dict[str, float] = defaultdict(float)
+        self._unflushed_histograms: dict[str, dict] = {}
+        self._flusher: asyncio.Task | None = None
+    
+    def increment(self, name: str, value: float = 1):
+        self._counters[name] += value
+        self._unflushed_counters[name] += value
+    
+    def observe(self, name: str, value: float):
+        for histograms in (self._histograms, self._unflushed_histograms):
+            histogram = histograms.get(name)
+            if histogram is None:
+                histogram = {"count": 0, "sum": 0.0, "max": value, "recent": deque(maxlen=HISTOGRAM_WINDOW)}
+                histograms[name] = histogram
+            histogram["count"] += 1
+            histogram["sum"] += value
+            histogram["max"] = max(histogram["max"], value)
+            histogram["recent"].append(value)
+    
+    def gauge(self, name: str, read: Callable[[], float]):
+        """Report read() under `name` at every flush (e.g. a cache's size)."""
+        self._gauges[name] = read
+    
+    def counter(self, name: str) -> float:
+        """This process's count."""
+        return self._counters.get(name, 0)
+    
+    def percentile(self, name: str, q: float) -> float | None:
+        """Percentile (0-100) over this process's recent observations of a histogram."""
+        histogram = self._histograms.get(name)
+        return _percentile(sorted(histogram["recent"]), q) if histogram else None
+    
+    def snapshot(self) -> dict:
+        """This process's metrics."""
+        return {
+            "counters": dict(self._counters),
+            "histograms": {
+                name: _summary(h["count"], h["sum"], h["max"], list(h["recent"]))
+                for name, h in self._histograms.items()
+            },
+            "gauges": {name: read() for name, read in self._gauges.items()}
+        }
+    
+    async def flush(self):
+        """Add what was recorded since the last flush to the shared totals."""
+        counters, self._unflushed_counters = self._unflushed_counters, defaultdict(float)
+        histograms, self._unflushed_histograms = self._unflushed_histograms, {}
+        gauges_key = f"{KEY_PREFIX}:gauges:{self.process_id}"
+        
+        pipe = self.redis.pipeline(transaction=False)
+        for name, value in counters.items():
+            pipe.hincrbyfloat(f"{KEY_PREFIX}:counters", name, value)
+        for name, h in histograms.items():
+            pipe.hincrbyfloat(f"{KEY_PREFIX}:histogram_counts", name, h["count"])
+            pipe.hincrbyfloat(f"{KEY_PREFIX}:histogram_sums", name, h["sum"])
+            pipe.zadd(f"{KEY_PREFIX}:histogram_max", {name: h["max"]}, gt=True)
+            pipe.lpush(f"{KEY_PREFIX}:recent:{name}", *h["recent"])
+            pipe.ltrim(f"{KEY_PREFIX}:recent:{name}", 0, HISTOGRAM_WINDOW - 1)
+        if self._gauges:
+            pipe.delete(gauges_key)
+            pipe.hset(gauges_key, mapping={name: read() for name, read in self._gauges.items()})
+            pipe.expire(gauges_key, int(settings.metrics_flush_seconds * 3) + 1)
+        try:
+            await pipe.execute()
+        except Exception as e:
+            # Keep the unflushed values for the next attempt
+            for name, value in counters.items():
+                self._unflushed_counters[name] += value
+            for name, h in histograms.items():
+                pending = self._unflushed_histograms.setdefault(
+                    name, {"count": 0, "sum": 0.0, "max": h["max"], "recent": deque(maxlen=HISTOGRAM_WINDOW)}
+                )
+                pending["count"] += h["count"]
+                pending["sum"] += h["sum"]
+                pending["max"] = max(pending["max"], h["max"])
+                pending["recent"].extendleft(reversed(h["recent"]))
+            logger.warning(f"Metrics flush failed: {e}")
+    
+    async def shared_snapshot(self) -> dict:
+        """Totals across every process, in the shape of snapshot()."""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hgetall(f"{KEY_PREFIX}:counters")
+        pipe.hgetall(f"{KEY_PREFIX}:histogram_counts")
+        pipe.hgetall(f"{KEY_PREFIX}:histogram_sums")
+        pipe.zrange(f"{KEY_PREFIX}:histogram_max", 0, -1, withscores=True)
+        counters, counts, sums, maxima = await pipe.execute()
+        maxima = {name.decode(): value for name, value in maxima}
+        
+        names = [name.decode() for name in counts]
+        pipe = self.redis.pipeline(transaction=False)
+        for name in names:
+            pipe.lrange(f"{KEY_PREFIX}:recent:{name}", 0, -1)
+        recents = await pipe.execute()
+        
+        gauges: dict[str, float] = defaultdict(float)
+        async for key in self.redis.scan_iter(match=f"{KEY_PREFIX}:gauges:*"):
+            for name, value in (await self.redis.hgetall(key)).items():
+                gauges[name.decode()] += float(value)
+        
+        return {
+            "counters": {name.decode(): float(value) for name, value in counters.items()},
+            "histograms": {
+                name: _summary(
+                    int(float(counts[name.encode()])),
+                    float(sums.get(name.encode(), 0)),
+                    maxima.get(name),
+                    [float(value) for value in recent]
+                )
+                for name, recent in zip(names, recents)
+            },
+            "gauges": dict(gauges)
+        }
+    
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(settings.metrics_flush_seconds)
+            await self.flush()
+    
+    def start_flushing(self):
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_periodically(), name="metrics-flush")
+    
+    async def stop_flushing(self):
+        if self._flusher is None:
+            return
+        self._flusher.cancel()
+        try:
+            await self._flusher
+        except asyncio.CancelledError:
+            pass
+        self._flusher = None
+        await self.flush()
+
+
+metrics = Metrics()
@@ -6,6 +6,10 @@ from app.models.lesson import Lesson
 from app.models.lesson_message import LessonMessage
 from app.models.assessment import Assessment
 from app.models.vocabulary import VocabularyWord, StudentVocabulary
+from app.models.engagement import EngagementSnapshot
+from app.models.broadcast import Broadcast
+from app.models.evaluation_batch import EvaluationBatch
+from app.models.lesson_memory import LessonMemory
 
 __all__ = [
     "Student",
@@ -16,5 +20,9 @@ __all__ = [
     "LessonMessage",
     "Assessment",
     "VocabularyWord",
-    "StudentVocabulary"
+    "StudentVocabulary",
+    "EngagementSnapshot",
+    "Broadcast",
+    "EvaluationBatch",
+    "LessonMemory"
 ]
@@ -0,0 +1,34 @@
+from datetime import datetime
+from sqlalchemy import String, Integer, DateTime, Text, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.database import Base
+
+
+class Broadcast(Base):
+    """A templated message sent to every student inactive since a cutoff.
+    
+    Recipients are streamed by ascending student id; `last_student_id` is the
+    checkpoint, so a restarted run continues after the last completed batch.
+    """
+    __tablename__ = "broadcasts"
+    
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(100), nullable=False)
+    template: Mapped[str] = mapped_column(Text, nullable=False)
+    
+    # Targeting, fixed at creation so a resumed run sees the same audience
+    inactive_before: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    level_code: Mapped[str | None] = mapped_column(String(10), nullable=True)
+    
+    status: Mapped[str] = mapped_column(String(20), default="pending", index=True)
+    # pending, running, completed, cancelled
+    last_student_id: Mapped[int] = mapped_column(Integer, default=0)
+    sent_count: Mapped[int] = mapped_column(Integer, default=0)
+    failed_count: Mapped[int] = mapped_column(Integer, default=0)
+    blocked_count: Mapped[int] = mapped_column(Integer, default=0)
+    
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    started_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
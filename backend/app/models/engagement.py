@@ -0,0 +1,26 @@
+from datetime import datetime
+from sqlalchemy import Integer, Float, DateTime, JSON, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.database import Base
+
+
+class EngagementSnapshot(Base):
+    """Materialized engagement metrics, refreshed periodically by the scheduler."""
+    __tablename__ = "engagement_snapshots"
+    
+    id: Mapped[int] = mapped_column(primary_key=True)
+    
+    sessions_count: Mapped[int] = mapped_column(Integer, default=0)
+    avg_session_duration_minutes: Mapped[float] = mapped_column(Float, default=0)
+    avg_messages_per_session: Mapped[float] = mapped_column(Float, default=0)
+    avg_daily_usage_minutes: Mapped[float] = mapped_column(Float, default=0)
+    retention_rate_7d: Mapped[float] = mapped_column(Float, default=0)
+    retention_rate_30d: Mapped[float] = mapped_column(Float, default=0)
+    churn_rate: Mapped[float] = mapped_column(Float, default=0)
+    
+    cohorts: Mapped[list | None] = mapped_column(JSON, nullable=True)
+    # Example: [{"cohort_week": "2026-08-03", "size": 40, "retention": [100.0, 42.5, 30.0]}]
+    
+    computed_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
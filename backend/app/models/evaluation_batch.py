@@ -0,0 +1,33 @@
+from datetime import date, datetime
+from sqlalchemy import String, Integer, Float, Date, DateTime, Text, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.database import Base
+
+
+class EvaluationBatch(Base):
+    """One night's batch job evaluating the lessons that ended on `day` (UTC).
+    
+    The row is written before the job is submitted, so the unique day keeps two
+    scheduler runs from submitting the same lessons twice.
+    """
+    __tablename__ = "evaluation_batches"
+    
+    id: Mapped[int] = mapped_column(primary_key=True)
+    day: Mapped[date] = mapped_column(Date, unique=True, nullable=False)
+    backend: Mapped[str] = mapped_column(String(20), nullable=False)
+    external_id: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    
+    status: Mapped[str] = mapped_column(String(20), default="submitting", index=True)
+    # queued (by an admin, for the scheduler), submitting, submitted, applied, failed
+    lesson_count: Mapped[int] = mapped_column(Integer, default=0)
+    applied_count: Mapped[int] = mapped_column(Integer, default=0)
+    failed_count: Mapped[int] = mapped_column(Integer, default=0)
+    input_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    output_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    cost_usd: Mapped[float] = mapped_column(Float, default=0.0)  # Estimated, at batch prices
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
@@ -1,11 +1,15 @@
 from datetime import datetime
-from sqlalchemy import String, Integer, ForeignKey, DateTime, Text, JSON, func
+from sqlalchemy import String, Integer, ForeignKey, DateTime, Text, JSON, Index, func, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.database import Base
 
 
 class Lesson(Base):
     __tablename__ = "lessons"
+    __table_args__ = (
+        # Open lessons per student: active-lesson lookup and the idle-lesson sweeper
+        Index("ix_lessons_open_student", "student_id", postgresql_where=text("ended_at IS NULL")),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True)
     student_id: Mapped[int] = mapped_column(ForeignKey("students.id", ondelete="CASCADE"), nullable=False)
@@ -0,0 +1,26 @@
+from datetime import datetime
+from sqlalchemy import String, ForeignKey, DateTime, Text, LargeBinary, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.database import Base
+
+
+class LessonMemory(Base):
+    """A finished lesson as the tutor recalls it: summary, topics and words practiced.
+    
+    `embedding` is the text's unit-length embedding as float16 bytes; the
+    student's memories are stacked into one matrix for cosine retrieval
+    (app/services/memory_service.py).
+    """
+    __tablename__ = "lesson_memories"
+    
+    id: Mapped[int] = mapped_column(primary_key=True)
+    student_id: Mapped[int] = mapped_column(ForeignKey("students.id", ondelete="CASCADE"), nullable=False, index=True)
+    lesson_id: Mapped[int] = mapped_column(ForeignKey("lessons.id", ondelete="CASCADE"), nullable=False, unique=True)
+    
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+    embedding: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    embedding_model: Mapped[str] = mapped_column(String(50), nullable=False)
+    
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
@@ -1,11 +1,14 @@
 from datetime import datetime
-from sqlalchemy import String, ForeignKey, DateTime, Text, func
+from sqlalchemy import String, ForeignKey, DateTime, Text, Index, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.database import Base
 
 
 class LessonMessage(Base):
     __tablename__ = "lesson_messages"
+    __table_args__ = (
+        Index("ix_lesson_messages_lesson_created", "lesson_id", "created_at"),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True)
     lesson_id: Mapped[int] = mapped_column(ForeignKey("lessons.id", ondelete="CASCADE"), nullable=False)
@@ -15,7 +18,7 @@ class LessonMessage(Base):
     audio_file_id: Mapped[str | None] = mapped_column(String(200), nullable=True)
     
     created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), server_default=func.now()
+        DateTime(timezone=True), server_default=func.now(), index=True
     )
     
     # Relationships
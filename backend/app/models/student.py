@@ -20,6 +20,10 @@ class Student(Base):
     total_minutes: Mapped[int] = mapped_column(default=0)
     streak_days: Mapped[int] = mapped_column(default=0)
     last_streak_date: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # StudentVocabulary rows with is_learned, kept by VocabularyService.record_reviews
+    words_learned: Mapped[int] = mapped_column(default=0)
+    # Set when a send fails because the student blocked the bot; broadcasts skip them
+    blocked_bot_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     
     registered_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now()
@@ -1,5 +1,5 @@
 from datetime import datetime, timezone
-from sqlalchemy import String, Text, Integer, ForeignKey, Boolean, DateTime
+from sqlalchemy import String, Text, Integer, Float, ForeignKey, Boolean, DateTime, Index, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.database import Base
 
@@ -7,6 +7,9 @@ from app.database import Base
 class VocabularyWord(Base):
     """Essential vocabulary words for learning English."""
     __tablename__ = "vocabulary_words"
+    __table_args__ = (
+        UniqueConstraint("word", "category", name="uq_vocabulary_word_category"),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True)
     word: Mapped[str] = mapped_column(String(100), nullable=False, index=True)
@@ -24,6 +27,11 @@ class VocabularyWord(Base):
 class StudentVocabulary(Base):
     """Track which words each student has learned."""
     __tablename__ = "student_vocabulary"
+    __table_args__ = (
+        UniqueConstraint("student_id", "word_id", name="uq_student_word"),
+        # Due-word lookup: WHERE student_id = ? AND next_review <= now ORDER BY next_review
+        Index("ix_student_vocabulary_due", "student_id", "next_review"),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True)
     student_id: Mapped[int] = mapped_column(ForeignKey("students.id"), nullable=False)
@@ -33,6 +41,8 @@ class StudentVocabulary(Base):
     times_seen: Mapped[int] = mapped_column(Integer, default=0)
     times_correct: Mapped[int] = mapped_column(Integer, default=0)
     mastery_level: Mapped[int] = mapped_column(Integer, default=0)  # 0-5 (0=new, 5=mastered)
+    ease_factor: Mapped[float] = mapped_column(Float, default=2.5)  # SM-2 easiness
+    interval_days: Mapped[int] = mapped_column(Integer, default=0)
     last_practiced: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
     next_review: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
     is_learned: Mapped[bool] = mapped_column(Boolean, default=False)
@@ -0,0 +1,15 @@
+from redis.asyncio import Redis
+from app.config import get_settings
+
+settings = get_settings()
+
+# Shared connection pool; connections are opened lazily on first use
+redis_client = Redis.from_url(
+    settings.redis_url,
+    socket_connect_timeout=2,
+    socket_timeout=2
+)
+
+
+async def close_redis():
+    await redis_client.aclose()
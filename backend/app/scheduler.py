@@ -0,0 +1,138 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+from app.config import get_settings
+from app.database import AsyncSessionLocal
+from app.services.analytics_service import AnalyticsService
+from app.services.lesson_service import LessonService
+from app.services.evaluation_batch_service import EvaluationBatchService, due_day
+from app.services.memory_service import MemoryService
+from app.telegram.broadcast import run_pending_broadcasts
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+Job = Callable[[], Awaitable[None]]
+
+
+class Scheduler:
+    """Run coroutine jobs at fixed intervals on the current event loop."""
+    
+    def __init__(self):
+        self._jobs: list[tuple[str, float, Job]] = []
+        self._tasks: list[asyncio.Task] = []
+    
+    def add_job(self, name: str, interval_seconds: float, job: Job):
+        """Register a job. Jobs run once on start and then every interval."""
+        self._jobs.append((name, interval_seconds, job))
+    
+    async def _run_forever(self, name: str, interval_seconds: float, job: Job):
+        while True:
+            try:
+                await job()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Scheduled job '{name}' failed: {e}", exc_info=True)
+            await asyncio.sleep(interval_seconds)
+    
+    def start(self):
+        for name, interval_seconds, job in self._jobs:
+            task = asyncio.create_task(self._run_forever(name, interval_seconds, job), name=f"job:{name}")
+            self._tasks.append(task)
+        logger.info(f"Scheduler started with {len(self._tasks)} jobs")
+    
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Scheduler stopped")
+
+
+async def refresh_engagement_job():
+    """Materialize engagement metrics for the admin panel."""
+    async with AsyncSessionLocal() as db:
+        await AnalyticsService(db).refresh_engagement_snapshot()
+
+
+async def close_idle_lessons_job():
+    """End lessons that have been idle longer than the configured gap."""
+    async with AsyncSessionLocal() as db:
+        await LessonService(db).close_idle_lessons(settings.lesson_idle_minutes)
+
+
+async def send_broadcasts_job():
+    """Send queued broadcasts, resuming any that a restart interrupted."""
+    await run_pending_broadcasts()
+
+
+async def evaluation_batches_job():
+    """Apply finished evaluation batches, submit days queued by admins and yesterday's once it's due."""
+    async with AsyncSessionLocal() as db:
+        service = EvaluationBatchService(db)
+        await service.apply_finished_batches()
+        await service.submit_queued()
+        await service.submit_day(due_day(datetime.now(timezone.utc)))
+
+
+async def index_lesson_memories_job():
+    """Embed the summaries of recently ended lessons for long-term recall."""
+    async with AsyncSessionLocal() as db:
+        await MemoryService(db).index_pending_lessons()
+
+
+_scheduler: Scheduler | None = None
+
+
+def create_scheduler() -> Scheduler:
+    """Create the scheduler with all periodic jobs registered."""
+    global _scheduler
+    
+    if _scheduler is not None:
+        return _scheduler
+    
+    _scheduler = Scheduler()
+    _scheduler.add_job(
+        "refresh_engagement",
+        settings.engagement_refresh_minutes * 60,
+        refresh_engagement_job
+    )
+    _scheduler.add_job(
+        "close_idle_lessons",
+        settings.lesson_sweep_minutes * 60,
+        close_idle_lessons_job
+    )
+    _scheduler.add_job(
+        "send_broadcasts",
+        settings.broadcast_poll_seconds,
+        send_broadcasts_job
+    )
+    if settings.memory_enabled:
+        _scheduler.add_job(
+            "index_lesson_memories",
+            settings.memory_index_minutes * 60,
+            index_lesson_memories_job
+        )
+    if settings.evaluation_mode == "batch":
+        _scheduler.add_job(
+            "evaluation_batches",
+            settings.evaluation_batch_poll_minutes * 60,
+            evaluation_batches_job
+        )
+    return _scheduler
+
+
+async def start_scheduler():
+    """Start running periodic jobs."""
+    create_scheduler().start()
+
+
+async def stop_scheduler():
+    """Cancel all periodic jobs."""
+    global _scheduler
+    
+    if _scheduler:
+        await _scheduler.stop()
+        _scheduler = None
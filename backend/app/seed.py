@@ -1,12 +1,19 @@
 """
 Script to seed the database with initial data.
 Run with: python -m app.seed
+
+Other commands:
+    python -m app.seed activity [--days N]   Rebuild activity bitmaps from lesson history
+    python -m app.seed vocabulary <file>     Load a CSV/JSONL word list (idempotent)
 """
+import argparse
 import asyncio
 import logging
 from app.database import AsyncSessionLocal, init_db
 from app.models.level import Level, LEVEL_SEED_DATA
 from app.models.skill import Skill, SKILL_SEED_DATA
+from app.services.activity_service import activity_tracker
+from app.services.vocabulary_importer import import_vocabulary, CHUNK_SIZE
 from sqlalchemy import select
 
 logging.basicConfig(level=logging.INFO)
@@ -53,5 +60,42 @@ async def main():
     logger.info("Seeding complete!")
 
 
+async def backfill_activity(days: int):
+    async with AsyncSessionLocal() as db:
+        logger.info(f"Backfilling activity bitmaps for the last {days} days...")
+        await activity_tracker.backfill(db, days=days)
+    
+    logger.info("Backfill complete!")
+
+
+async def load_vocabulary(path: str, chunk_size: int):
+    await init_db()
+    
+    logger.info(f"Importing vocabulary from {path}...")
+    await import_vocabulary(path, chunk_size=chunk_size)
+    
+    logger.info("Import complete!")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m app.seed")
+    commands = parser.add_subparsers(dest="command")
+    
+    activity = commands.add_parser("activity", help="Rebuild activity bitmaps from lesson history")
+    activity.add_argument("--days", type=int, default=90)
+    
+    vocabulary = commands.add_parser("vocabulary", help="Load a CSV/JSONL word list")
+    vocabulary.add_argument("path", help="File with word, translation, category[, phonetic, difficulty, ...]")
+    vocabulary.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = parse_args()
+    if args.command == "activity":
+        asyncio.run(backfill_activity(args.days))
+    elif args.command == "vocabulary":
+        asyncio.run(load_vocabulary(args.path, args.chunk_size))
+    else:
+        asyncio.run(main())
@@ -1,5 +1,11 @@
 from app.services.student_service import StudentService
 from app.services.lesson_service import LessonService
 from app.services.speech_service import SpeechService
+from app.services.analytics_service import AnalyticsService
+from app.services.vocabulary_service import VocabularyService
+from app.services.drill_service import DrillService
+from app.services.broadcast_service import BroadcastService
+from app.services.evaluation_batch_service import EvaluationBatchService
+from app.services.memory_service import MemoryService
 
-__all__ = ["StudentService", "LessonService", "SpeechService"]
+__all__ = ["StudentService", "LessonService", "SpeechService", "AnalyticsService", "VocabularyService", "DrillService", "BroadcastService", "EvaluationBatchService", "MemoryService"]
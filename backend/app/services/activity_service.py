@@ -0,0 +1,162 @@
+import logging
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from redis.asyncio import Redis
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import get_settings
+from app.models import Student, Lesson, LessonMessage
+from app.redis_client import redis_client
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "activity"
+MAX_WINDOW_DAYS = 90  # Longest window overlap() ORs together
+
+
+def _today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+class ActivityTracker:
+    """Daily activity bitmaps in Redis, one bit per student id.
+    
+    `activity:active:<day>` has a bit set for every student who interacted that day,
+    `activity:signup:<day>` for every student who registered that day. Window counts,
+    retention and cohort overlap are answered with BITOP/BITCOUNT.
+    """
+    
+    def __init__(self, redis: Redis = redis_client):
+        self.redis = redis
+    
+    @staticmethod
+    def _key(kind: str, day: date) -> str:
+        return f"{KEY_PREFIX}:{kind}:{day.isoformat()}"
+    
+    @staticmethod
+    def _days(start: date, end: date) -> list[date]:
+        """Inclusive list of days between start and end."""
+        return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    
+    async def _set_bits(self, kind: str, student_ids: list[int], day: date):
+        key = self._key(kind, day)
+        pipe = self.redis.pipeline(transaction=False)
+        for student_id in student_ids:
+            pipe.setbit(key, student_id, 1)
+        pipe.expire(key, timedelta(days=settings.activity_retention_days))
+        await pipe.execute()
+    
+    async def mark_active(self, student_id: int, day: date | None = None):
+        """Record that the student was active on the given day (default: today)."""
+        await self._set_bits("active", [student_id], day or _today())
+    
+    async def mark_signup(self, student_id: int, day: date | None = None):
+        """Record the student's registration day (default: today)."""
+        await self._set_bits("signup", [student_id], day or _today())
+    
+    async def _count(self, op: str, keys: list[str]) -> int:
+        """BITCOUNT of the combination of keys (OR/AND) without keeping the result."""
+        if not keys:
+            return 0
+        if len(keys) == 1:
+            return await self.redis.bitcount(keys[0])
+        
+        tmp_key = f"{KEY_PREFIX}:tmp:{uuid.uuid4().hex}"
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.bitop(op, tmp_key, *keys)
+        pipe.bitcount(tmp_key)
+        pipe.delete(tmp_key)
+        _, count, _ = await pipe.execute()
+        return count
+    
+    async def count_active(self, start: date, end: date) -> int:
+        """Distinct students active between start and end (inclusive)."""
+        return await self._count("OR", [self._key("active", d) for d in self._days(start, end)])
+    
+    async def count_signups(self, start: date, end: date) -> int:
+        """Students registered between start and end (inclusive)."""
+        return await self._count("OR", [self._key("signup", d) for d in self._days(start, end)])
+    
+    async def active_windows(self) -> dict[str, int]:
+        """DAU, WAU and MAU ending today."""
+        today = _today()
+        return {
+            "dau": await self.count_active(today, today),
+            "wau": await self.count_active(today - timedelta(days=6), today),
+            "mau": await self.count_active(today - timedelta(days=29), today),
+        }
+    
+    async def retention(self, cohort_day: date, days_after: int) -> tuple[int, int]:
+        """Students of the signup cohort active exactly N days later. Returns (retained, cohort_size)."""
+        signup_key = self._key("signup", cohort_day)
+        active_key = self._key("active", cohort_day + timedelta(days=days_after))
+        cohort_size = await self.redis.bitcount(signup_key)
+        if not cohort_size:
+            return 0, 0
+        retained = await self._count("AND", [signup_key, active_key])
+        return retained, cohort_size
+    
+    async def rolling_retention_rate(self, days_after: int, cohorts: int = 7) -> float:
+        """Day-N retention (%) pooled over the most recent complete signup cohorts."""
+        last_cohort = _today() - timedelta(days=days_after)
+        retained_total = 0
+        size_total = 0
+        for i in range(cohorts):
+            retained, size = await self.retention(last_cohort - timedelta(days=i), days_after)
+            retained_total += retained
+            size_total += size
+        return round(retained_total / size_total * 100, 1) if size_total else 0.0
+    
+    async def retention_curve(self, cohort_day: date, days: int) -> list[float]:
+        """Day-0..N retention (%) for a single signup cohort."""
+        curve = []
+        last_day = min(days, (_today() - cohort_day).days)
+        for days_after in range(last_day + 1):
+            retained, size = await self.retention(cohort_day, days_after)
+            curve.append(round(retained / size * 100, 1) if size else 0.0)
+        return curve
+    
+    async def overlap(self, first: tuple[date, date], second: tuple[date, date]) -> dict[str, int]:
+        """Students active in both windows, plus each window's total."""
+        first_key = f"{KEY_PREFIX}:tmp:{uuid.uuid4().hex}"
+        second_key = f"{KEY_PREFIX}:tmp:{uuid.uuid4().hex}"
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.bitop("OR", first_key, *[self._key("active", d) for d in self._days(*first)])
+        pipe.bitop("OR", second_key, *[self._key("active", d) for d in self._days(*second)])
+        pipe.bitcount(first_key)
+        pipe.bitcount(second_key)
+        pipe.bitop("AND", first_key, first_key, second_key)
+        pipe.bitcount(first_key)
+        pipe.delete(first_key, second_key)
+        results = await pipe.execute()
+        return {"first": results[2], "second": results[3], "both": results[5]}
+    
+    async def backfill(self, db: AsyncSession, days: int = 90) -> int:
+        """Rebuild bitmaps for the last N days from students and lesson_messages."""
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        
+        signups = await db.execute(
+            select(Student.id, func.date(Student.registered_at))
+            .where(Student.registered_at >= since)
+        )
+        active = await db.execute(
+            select(Lesson.student_id, func.date(LessonMessage.created_at))
+            .join(Lesson, Lesson.id == LessonMessage.lesson_id)
+            .where(LessonMessage.created_at >= since, LessonMessage.role == "user")
+            .distinct()
+        )
+        
+        by_day: dict[tuple[str, date], list[int]] = {}
+        for kind, rows in (("signup", signups.all()), ("active", active.all())):
+            for student_id, day in rows:
+                by_day.setdefault((kind, day), []).append(student_id)
+        
+        for (kind, day), student_ids in by_day.items():
+            await self._set_bits(kind, student_ids, day)
+        
+        logger.info(f"Backfilled {len(by_day)} activity bitmaps for the last {days} days")
+        return len(by_day)
+
+
+activity_tracker = ActivityTracker()
@@ -0,0 +1,220 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, func, delete, case, cast, and_, Integer
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import get_settings
+from app.models import Student, Lesson, LessonMessage, EngagementSnapshot
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_RETENTION_DAYS = 7
+
+
+class AnalyticsService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def get_latest_snapshot(self) -> EngagementSnapshot | None:
+        """Get the most recent materialized engagement snapshot."""
+        result = await self.db.execute(
+            select(EngagementSnapshot)
+            .order_by(EngagementSnapshot.id.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+    
+    async def refresh_engagement_snapshot(self) -> EngagementSnapshot:
+        """Recompute engagement metrics from lesson_messages and store a new snapshot."""
+        now = datetime.now(timezone.utc)
+        
+        session_stats = await self._compute_session_stats(
+            since=now - timedelta(days=settings.engagement_window_days)
+        )
+        retention_stats = await self._compute_retention_stats(now)
+        cohorts = await self._compute_cohort_retention(
+            since=now - timedelta(weeks=settings.engagement_cohort_weeks)
+        )
+        
+        snapshot = EngagementSnapshot(
+            **session_stats,
+            **retention_stats,
+            cohorts=cohorts,
+            computed_at=now
+        )
+        self.db.add(snapshot)
+        
+        # Keep a short history only; the endpoints read the latest row
+        await self.db.execute(
+            delete(EngagementSnapshot)
+            .where(EngagementSnapshot.computed_at < now - timedelta(days=SNAPSHOT_RETENTION_DAYS))
+        )
+        await self.db.commit()
+        
+        logger.info(
+            f"Engagement snapshot refreshed: {snapshot.sessions_count} sessions, "
+            f"{len(cohorts)} cohorts"
+        )
+        return snapshot
+    
+    async def _compute_session_stats(self, since: datetime) -> dict:
+        """Split each student's message stream into gap-based sessions."""
+        gap = timedelta(minutes=settings.engagement_session_gap_minutes)
+        
+        previous_at = func.lag(LessonMessage.created_at).over(
+            partition_by=Lesson.student_id,
+            order_by=LessonMessage.created_at
+        )
+        messages = (
+            select(
+                Lesson.student_id.label("student_id"),
+                LessonMessage.created_at.label("created_at"),
+                case((LessonMessage.role == "user", 1), else_=0).label("is_user"),
+                case(
+                    (previous_at.is_(None), 1),
+                    (LessonMessage.created_at - previous_at > gap, 1),
+                    else_=0
+                ).label("starts_session")
+            )
+            .join(Lesson, Lesson.id == LessonMessage.lesson_id)
+            .where(LessonMessage.created_at >= since)
+            .subquery("messages")
+        )
+        
+        numbered = (
+            select(
+                messages.c.student_id,
+                messages.c.created_at,
+                messages.c.is_user,
+                func.sum(messages.c.starts_session).over(
+                    partition_by=messages.c.student_id,
+                    order_by=messages.c.created_at
+                ).label("session_no")
+            )
+            .subquery("numbered")
+        )
+        
+        sessions = (
+            select(
+                numbered.c.student_id,
+                func.date(func.min(numbered.c.created_at)).label("day"),
+                (
+                    func.extract("epoch", func.max(numbered.c.created_at) - func.min(numbered.c.created_at)) / 60
+                ).label("duration_minutes"),
+                func.sum(numbered.c.is_user).label("user_messages")
+            )
+            .group_by(numbered.c.student_id, numbered.c.session_no)
+            .subquery("sessions")
+        )
+        
+        row = (await self.db.execute(
+            select(
+                func.count(),
+                func.avg(sessions.c.duration_minutes),
+                func.avg(sessions.c.user_messages)
+            ).select_from(sessions)
+        )).one()
+        
+        daily_usage = (
+            select(func.sum(sessions.c.duration_minutes).label("minutes"))
+            .group_by(sessions.c.student_id, sessions.c.day)
+            .subquery("daily_usage")
+        )
+        avg_daily = await self.db.scalar(select(func.avg(daily_usage.c.minutes)))
+        
+        return {
+            "sessions_count": row[0] or 0,
+            "avg_session_duration_minutes": round(float(row[1] or 0), 1),
+            "avg_messages_per_session": round(float(row[2] or 0), 1),
+            "avg_daily_usage_minutes": round(float(avg_daily or 0), 1),
+        }
+    
+    async def _compute_retention_stats(self, now: datetime) -> dict:
+        """Compute 7/30-day retention and churn in a single pass over students."""
+        week_ago = now - timedelta(days=7)
+        month_ago = now - timedelta(days=30)
+        two_weeks_ago = now - timedelta(days=14)
+        
+        row = (await self.db.execute(
+            select(
+                func.count(Student.id),
+                func.count(Student.id).filter(Student.registered_at <= week_ago),
+                func.count(Student.id).filter(and_(
+                    Student.registered_at <= week_ago,
+                    Student.last_activity >= week_ago
+                )),
+                func.count(Student.id).filter(Student.registered_at <= month_ago),
+                func.count(Student.id).filter(and_(
+                    Student.registered_at <= month_ago,
+                    Student.last_activity >= month_ago
+                )),
+                func.count(Student.id).filter(Student.last_activity < two_weeks_ago)
+            )
+        )).one()
+        total_users, users_7d_ago, retained_7d, users_30d_ago, retained_30d, churned = row
+        
+        return {
+            "retention_rate_7d": round((retained_7d / (users_7d_ago or 1)) * 100, 1),
+            "retention_rate_30d": round((retained_30d / (users_30d_ago or 1)) * 100, 1),
+            "churn_rate": round((churned / (total_users or 1)) * 100, 1),
+        }
+    
+    async def _compute_cohort_retention(self, since: datetime) -> list[dict]:
+        """Weekly signup cohorts and the share of each cohort active N weeks later."""
+        cohort = (
+            select(
+                Student.id.label("student_id"),
+                func.date_trunc("week", Student.registered_at).label("cohort_week")
+            )
+            .where(Student.registered_at >= since)
+            .subquery("cohort")
+        )
+        activity = (
+            select(
+                Lesson.student_id.label("student_id"),
+                func.date_trunc("week", LessonMessage.created_at).label("week")
+            )
+            .join(Lesson, Lesson.id == LessonMessage.lesson_id)
+            .where(
+                LessonMessage.created_at >= since,
+                LessonMessage.role == "user"
+            )
+            .distinct()
+            .subquery("activity")
+        )
+        
+        sizes_result = await self.db.execute(
+            select(cohort.c.cohort_week, func.count())
+            .group_by(cohort.c.cohort_week)
+            .order_by(cohort.c.cohort_week)
+        )
+        sizes = {week: size for week, size in sizes_result.all()}
+        
+        week_offset = cast(
+            func.extract("epoch", activity.c.week - cohort.c.cohort_week) / 604800, Integer
+        )
+        active_result = await self.db.execute(
+            select(cohort.c.cohort_week, week_offset, func.count(func.distinct(activity.c.student_id)))
+            .join(activity, and_(
+                activity.c.student_id == cohort.c.student_id,
+                activity.c.week >= cohort.c.cohort_week
+            ))
+            .group_by(cohort.c.cohort_week, week_offset)
+        )
+        active: dict = {}
+        for week, offset, count in active_result.all():
+            active.setdefault(week, {})[offset] = count
+        
+        cohorts = []
+        for week, size in sizes.items():
+            weeks_elapsed = max(0, (datetime.now(timezone.utc) - week).days // 7)
+            counts = active.get(week, {})
+            cohorts.append({
+                "cohort_week": week.date().isoformat(),
+                "size": size,
+                "retention": [
+                    round(counts.get(offset, 0) / size * 100, 1)
+                    for offset in range(weeks_elapsed + 1)
+                ]
+            })
+        return cohorts
@@ -0,0 +1,46 @@
+import hashlib
+import logging
+from datetime import timedelta
+from redis.asyncio import Redis
+from app.config import get_settings
+from app.redis_client import redis_client
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "tts:file_id"
+
+
+class AudioCache:
+    """Telegram file_ids of voice clips we already generated, keyed by text and voice.
+    
+    Once a clip has been uploaded, Telegram lets us resend it by file_id, so a
+    pronunciation is synthesized at most once for every student.
+    """
+    
+    def __init__(self, redis: Redis = redis_client):
+        self.redis = redis
+    
+    @staticmethod
+    def _key(text: str) -> str:
+        digest = hashlib.sha1(f"{settings.elevenlabs_voice_id}:{text.strip().lower()}".encode()).hexdigest()
+        return f"{KEY_PREFIX}:{digest}"
+    
+    async def get(self, text: str) -> str | None:
+        try:
+            file_id = await self.redis.get(self._key(text))
+        except Exception as e:
+            logger.warning(f"Audio cache lookup failed: {e}")
+            return None
+        return file_id.decode() if file_id else None
+    
+    async def set(self, text: str, file_id: str):
+        try:
+            await self.redis.set(
+                self._key(text), file_id, ex=timedelta(days=settings.audio_cache_days)
+            )
+        except Exception as e:
+            logger.warning(f"Audio cache store failed: {e}")
+
+
+audio_cache = AudioCache()
@@ -0,0 +1,141 @@
+"""Where batch jobs of chat-completion requests run.
+
+A job is a JSONL file in the OpenAI Batch API format: one
+{"custom_id", "method", "url", "body"} request per line. Its results come back
+as {"custom_id", "response": {"status_code", "body"}, "error"} lines. The
+"openai" backend uploads the file to the Batch API, which runs it within 24
+hours at half the synchronous price and outside the interactive rate limits.
+The "local" backend runs the requests itself; pass `complete` to stand in for
+the model (tests), otherwise it calls the configured OpenAI endpoint.
+"""
+import asyncio
+import io
+import json
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+from openai import AsyncOpenAI
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchResult:
+    state: str  # "running", "completed" or "failed"
+    lines: list[dict] = field(default_factory=list)  # Result lines, once completed
+    error: str | None = None
+
+
+class BatchBackend(ABC):
+    name: str
+    
+    @abstractmethod
+    async def submit(self, jsonl: bytes, description: str) -> str:
+        """Start a job; returns its id."""
+    
+    @abstractmethod
+    async def poll(self, job_id: str) -> BatchResult:
+        """The job's state, with its result lines once it has finished."""
+
+
+def _jsonl_lines(text: str) -> list[dict]:
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+class OpenAIBatchBackend(BatchBackend):
+    name = "openai"
+    
+    def __init__(self):
+        self.client = AsyncOpenAI(api_key=settings.openai_api_key)
+    
+    async def submit(self, jsonl: bytes, description: str) -> str:
+        upload = await self.client.files.create(file=("evaluations.jsonl", io.BytesIO(jsonl)), purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=upload.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+            metadata={"description": description}
+        )
+        return batch.id
+    
+    async def poll(self, job_id: str) -> BatchResult:
+        batch = await self.client.batches.retrieve(job_id)
+        if batch.status in ("validating", "in_progress", "finalizing", "cancelling"):
+            return BatchResult("running")
+        
+        # Expired jobs still return what they finished
+        lines = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                content = await self.client.files.content(file_id)
+                lines.extend(_jsonl_lines(content.text))
+        if batch.status == "completed" or (batch.status == "expired" and lines):
+            return BatchResult("completed", lines)
+        
+        errors = "; ".join(e.message or e.code or "" for e in (batch.errors.data if batch.errors else []) or [])
+        return BatchResult("failed", error=f"{batch.status}: {errors}" if errors else batch.status)
+
+
+CompleteFn = Callable[[dict], Awaitable[dict]]
+
+
+class LocalBatchBackend(BatchBackend):
+    """Runs a job's requests in-process as soon as it is submitted.
+    
+    Results live in memory, so a job submitted before a restart is reported
+    as failed.
+    """
+    name = "local"
+    
+    def __init__(self, complete: CompleteFn | None = None, concurrency: int = 4):
+        self.complete = complete or self._complete_with_openai
+        self.concurrency = concurrency
+        self._results: dict[str, list[dict]] = {}
+        self._client: AsyncOpenAI | None = None
+    
+    async def _complete_with_openai(self, body: dict) -> dict:
+        if self._client is None:
+            self._client = AsyncOpenAI(api_key=settings.openai_api_key)
+        completion = await self._client.chat.completions.create(**body)
+        return completion.model_dump()
+    
+    async def _run(self, request: dict, semaphore: asyncio.Semaphore) -> dict:
+        async with semaphore:
+            try:
+                body = await self.complete(request["body"])
+                return {"custom_id": request["custom_id"], "response": {"status_code": 200, "body": body}, "error": None}
+            except Exception as e:
+                return {"custom_id": request["custom_id"], "response": None, "error": {"message": str(e)}}
+    
+    async def submit(self, jsonl: bytes, description: str) -> str:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        requests = _jsonl_lines(jsonl.decode())
+        job_id = f"local-{uuid.uuid4().hex[:12]}"
+        self._results[job_id] = list(await asyncio.gather(*(self._run(r, semaphore) for r in requests)))
+        logger.info(f"Local batch {job_id} ({description}) ran {len(requests)} requests")
+        return job_id
+    
+    async def poll(self, job_id: str) -> BatchResult:
+        lines = self._results.pop(job_id, None)
+        if lines is None:
+            return BatchResult("failed", error="unknown job (lost on restart?)")
+        return BatchResult("completed", lines)
+
+
+_backends: dict[str, BatchBackend] = {}
+
+
+def get_batch_backend(name: str | None = None) -> BatchBackend:
+    """The named backend (default: settings.evaluation_batch_backend), one per process."""
+    name = name or settings.evaluation_batch_backend
+    backend = _backends.get(name)
+    if backend is None:
+        backends = {"openai": OpenAIBatchBackend, "local": LocalBatchBackend}
+        if name not in backends:
+            raise ValueError(f"Unknown batch backend: {name}")
+        backend = _backends[name] = backends[name]()
+    return backend
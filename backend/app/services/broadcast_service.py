@@ -0,0 +1,169 @@
+import logging
+import string
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, update, func, Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import Broadcast, Student, Level
+
+logger = logging.getLogger(__name__)
+
+# Placeholders a broadcast template may use, e.g. "Hi {name}! Your {streak}-day streak..."
+TEMPLATE_FIELDS = {"name", "streak", "level", "level_name", "days_inactive"}
+
+RUNNABLE_STATUSES = ("pending", "running")
+
+
+def template_fields(template: str) -> set[str]:
+    """Placeholder names used in a template. Raises ValueError on malformed braces."""
+    return {field for _, field, _, _ in string.Formatter().parse(template) if field is not None}
+
+
+def render_template(template: str, recipient: Row, now: datetime) -> str:
+    days_inactive = (now - recipient.last_activity).days if recipient.last_activity else 0
+    return template.format(
+        name=recipient.first_name,
+        streak=recipient.streak_days,
+        level=recipient.level_code,
+        level_name=recipient.level_name,
+        days_inactive=days_inactive
+    )
+
+
+class BroadcastService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def create_broadcast(
+        self,
+        name: str,
+        template: str,
+        days_inactive: int = 14,
+        level_code: str | None = None
+    ) -> Broadcast:
+        """Queue a broadcast to students inactive for at least `days_inactive` days."""
+        unknown = template_fields(template) - TEMPLATE_FIELDS
+        if unknown:
+            raise ValueError(f"Unknown template fields: {', '.join(sorted(unknown))}")
+        
+        broadcast = Broadcast(
+            name=name,
+            template=template,
+            inactive_before=datetime.now(timezone.utc) - timedelta(days=days_inactive),
+            level_code=level_code
+        )
+        self.db.add(broadcast)
+        await self.db.commit()
+        await self.db.refresh(broadcast)
+        
+        logger.info(f"Broadcast {broadcast.id} '{name}' queued for students inactive {days_inactive}+ days")
+        return broadcast
+    
+    async def get_broadcast(self, broadcast_id: int) -> Broadcast | None:
+        return await self.db.get(Broadcast, broadcast_id)
+    
+    async def list_broadcasts(self, limit: int = 50) -> list[Broadcast]:
+        result = await self.db.execute(
+            select(Broadcast).order_by(Broadcast.id.desc()).limit(limit)
+        )
+        return list(result.scalars().all())
+    
+    async def get_runnable_ids(self) -> list[int]:
+        """Broadcasts that are queued or were interrupted mid-run, oldest first."""
+        result = await self.db.execute(
+            select(Broadcast.id)
+            .where(Broadcast.status.in_(RUNNABLE_STATUSES))
+            .order_by(Broadcast.id)
+        )
+        return list(result.scalars().all())
+    
+    async def cancel_broadcast(self, broadcast_id: int) -> Broadcast | None:
+        """Stop a broadcast; the runner notices at its next checkpoint."""
+        broadcast = await self.get_broadcast(broadcast_id)
+        if broadcast and broadcast.status in RUNNABLE_STATUSES:
+            broadcast.status = "cancelled"
+            broadcast.finished_at = datetime.now(timezone.utc)
+            await self.db.commit()
+        return broadcast
+    
+    async def count_recipients(self, broadcast: Broadcast) -> int:
+        """Recipients not yet reached (all of them before the run starts)."""
+        result = await self.db.execute(
+            self._recipients_query(broadcast, broadcast.last_student_id)
+            .with_only_columns(func.count(Student.id))
+            .order_by(None)
+        )
+        return result.scalar_one()
+    
+    def _recipients_query(self, broadcast: Broadcast, after_id: int):
+        query = (
+            select(
+                Student.id,
+                Student.telegram_id,
+                Student.first_name,
+                Student.streak_days,
+                Student.last_activity,
+                Level.code.label("level_code"),
+                Level.name.label("level_name")
+            )
+            .join(Level, Level.id == Student.current_level_id)
+            .where(
+                Student.id > after_id,
+                Student.last_activity < broadcast.inactive_before,
+                Student.blocked_bot_at.is_(None)
+            )
+            .order_by(Student.id)
+        )
+        if broadcast.level_code:
+            query = query.where(Level.code == broadcast.level_code)
+        return query
+    
+    async def get_next_recipients(self, broadcast: Broadcast, after_id: int, limit: int) -> list[Row]:
+        """Next page of recipients after a student id (keyset pagination, no OFFSET)."""
+        result = await self.db.execute(self._recipients_query(broadcast, after_id).limit(limit))
+        return list(result.all())
+    
+    async def mark_running(self, broadcast: Broadcast):
+        if broadcast.status == "pending":
+            broadcast.status = "running"
+            broadcast.started_at = datetime.now(timezone.utc)
+            await self.db.commit()
+    
+    async def save_checkpoint(
+        self,
+        broadcast: Broadcast,
+        last_student_id: int,
+        sent: int,
+        failed: int,
+        blocked_ids: list[int]
+    ) -> str:
+        """Record a finished batch atomically; returns the broadcast's current status."""
+        now = datetime.now(timezone.utc)
+        if blocked_ids:
+            await self.db.execute(
+                update(Student)
+                .where(Student.id.in_(blocked_ids))
+                # Keep last_activity: its onupdate would make them look active
+                .values(blocked_bot_at=now, last_activity=Student.last_activity)
+            )
+        result = await self.db.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast.id)
+            .values(
+                last_student_id=last_student_id,
+                sent_count=Broadcast.sent_count + sent,
+                failed_count=Broadcast.failed_count + failed,
+                blocked_count=Broadcast.blocked_count + len(blocked_ids)
+            )
+            .returning(Broadcast.status)
+        )
+        status = result.scalar_one()
+        await self.db.commit()
+        return status
+    
+    async def mark_completed(self, broadcast: Broadcast):
+        await self.db.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast.id, Broadcast.status == "running")
+            .values(status="completed", finished_at=datetime.now(timezone.utc))
+        )
+        await self.db.commit()
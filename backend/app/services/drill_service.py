@@ -0,0 +1,165 @@
+"""Vocabulary drills built straight from the database and graded locally (no LLM)."""
+import logging
+import random
+from dataclasses import dataclass, field, asdict
+from sqlalchemy import select, func, exists
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import VocabularyWord, StudentVocabulary
+from app.services.vocabulary_matcher import normalize
+from app.services.vocabulary_service import VocabularyService
+
+logger = logging.getLogger(__name__)
+
+DRILL_SIZE = 8
+CHOICE_OPTIONS = 4
+TYPING_EVERY = 3  # Every third exercise asks the student to type the word
+
+# SM-2 quality for each outcome
+QUALITY_EXACT = 5
+QUALITY_CORRECT = 4
+QUALITY_TYPO = 3
+QUALITY_WRONG = 1
+
+
+@dataclass
+class Exercise:
+    word_id: int
+    kind: str  # "choice" (pick the translation) or "typing" (write the English word)
+    word: str
+    translation: str
+    phonetic: str | None = None
+    options: list[str] = field(default_factory=list)
+    is_new: bool = False
+
+
+def _edit_distance(a: str, b: str) -> int:
+    """Levenshtein distance (two-row dynamic programming)."""
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        previous = current
+    return previous[-1]
+
+
+def grade_typing(expected: str, answer: str) -> int:
+    """SM-2 quality for a typed answer; one typo is accepted for longer words."""
+    expected, answer = normalize(expected), normalize(answer)
+    if answer == expected:
+        return QUALITY_EXACT
+    if len(expected) > 3 and _edit_distance(expected, answer) <= 1:
+        return QUALITY_TYPO
+    return QUALITY_WRONG
+
+
+def grade_choice(exercise: dict, option_index: int) -> int:
+    """SM-2 quality for a multiple-choice answer."""
+    options = exercise["options"]
+    if 0 <= option_index < len(options) and options[option_index] == exercise["translation"]:
+        return QUALITY_CORRECT
+    return QUALITY_WRONG
+
+
+class DrillService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def _new_words(self, student_id: int, limit: int) -> list:
+        """Easiest words the student has not met yet."""
+        known = exists().where(
+            StudentVocabulary.student_id == student_id,
+            StudentVocabulary.word_id == VocabularyWord.id
+        )
+        result = await self.db.execute(
+            select(
+                VocabularyWord.id.label("word_id"),
+                VocabularyWord.word,
+                VocabularyWord.translation,
+                VocabularyWord.phonetic
+            )
+            .where(~known)
+            .order_by(VocabularyWord.difficulty, VocabularyWord.id)
+            .limit(limit)
+        )
+        return list(result.all())
+    
+    async def _distractors(self, word_ids: list[int]) -> dict[int, list[str]]:
+        """A few other translations from the same category as each word, in one query."""
+        target = (
+            select(VocabularyWord.id, VocabularyWord.category, VocabularyWord.translation)
+            .where(VocabularyWord.id.in_(word_ids))
+            .subquery()
+        )
+        candidates = (
+            select(
+                target.c.id.label("word_id"),
+                VocabularyWord.translation,
+                func.row_number().over(
+                    partition_by=target.c.id,
+                    order_by=func.random()
+                ).label("rank")
+            )
+            .join(VocabularyWord, VocabularyWord.category == target.c.category)
+            .where(VocabularyWord.translation != target.c.translation)
+            .subquery()
+        )
+        result = await self.db.execute(
+            select(candidates.c.word_id, candidates.c.translation)
+            .where(candidates.c.rank <= CHOICE_OPTIONS * 2)
+        )
+        
+        distractors: dict[int, list[str]] = {}
+        for word_id, translation in result.all():
+            options = distractors.setdefault(word_id, [])
+            if translation not in options:
+                options.append(translation)
+        return distractors
+    
+    async def build_drill(self, student_id: int, size: int = DRILL_SIZE) -> list[dict]:
+        """Due words first, topped up with new ones; mixes choice and typing exercises."""
+        due = await VocabularyService(self.db).get_due_words(student_id, limit=size)
+        new = await self._new_words(student_id, size - len(due)) if len(due) < size else []
+        words = [(word, False) for word in due] + [(word, True) for word in new]
+        if not words:
+            return []
+        
+        distractors = await self._distractors([word.word_id for word, _ in words])
+        
+        exercises = []
+        for position, (word, is_new) in enumerate(words, start=1):
+            wrong = distractors.get(word.word_id, [])[:CHOICE_OPTIONS - 1]
+            # New words are always introduced as multiple choice; typing needs a prior exposure
+            if (not is_new and position % TYPING_EVERY == 0) or not wrong:
+                kind, options = "typing", []
+            else:
+                kind, options = "choice", wrong + [word.translation]
+                random.shuffle(options)
+            exercises.append(asdict(Exercise(
+                word_id=word.word_id,
+                kind=kind,
+                word=word.word,
+                translation=word.translation,
+                phonetic=word.phonetic,
+                options=options,
+                is_new=is_new
+            )))
+        
+        random.shuffle(exercises)
+        logger.info(f"Built drill for student {student_id}: {len(due)} due, {len(new)} new")
+        return exercises
+    
+    async def save_results(self, student_id: int, exercises: list[dict], outcomes: dict[int, int]):
+        """Persist a whole drill at once: first exposures for new words, then SM-2 reviews."""
+        if not outcomes:
+            return
+        
+        vocabulary_service = VocabularyService(self.db)
+        new_ids = [e["word_id"] for e in exercises if e["is_new"] and e["word_id"] in outcomes]
+        if new_ids:
+            await vocabulary_service.record_exposures(student_id, taught=new_ids, seen=[], used=[])
+        await vocabulary_service.record_reviews(student_id, outcomes)
@@ -0,0 +1,340 @@
+import json
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+from sqlalchemy import select, update, bindparam, cast, Float, Integer, JSON
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from langchain_core.utils.function_calling import convert_to_openai_function
+from pydantic import ValidationError
+from app.config import get_settings
+from app.models import EvaluationBatch, Lesson, LessonMessage, Level, Skill, StudentSkill
+from app.agent.evaluation import LessonEvaluation, SKILL_SCORES, format_running_evaluation
+from app.evaluation_merge import merge_evaluation
+from app.agent.prompts import EVALUATION_PROMPT
+from app.agent.routing import MODEL_PRICES, estimate_cost, model_for_tier, select_route
+from app.services.batch_backends import BatchBackend, get_batch_backend
+from app.metrics import metrics
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+BATCH_PRICE_FACTOR = 0.5  # Batch API price relative to synchronous calls
+SKILL_WEIGHT = 0.3  # Same blend as StudentService.update_skill_scores
+LESSON_CHUNK = 500  # Lessons whose messages are loaded per query
+
+
+def _response_format() -> dict:
+    function = convert_to_openai_function(LessonEvaluation, strict=True)
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": function["name"], "schema": function["parameters"], "strict": True}
+    }
+
+
+def build_request(lesson_id: int, level: str, messages: list[tuple[str, str]]) -> dict:
+    """One Batch API line evaluating a whole lesson; messages are (role, content)."""
+    route = select_route("evaluate", level)
+    conversation = "\n".join(
+        f"{'Usuario' if role == 'user' else 'Tutor'}: {content}" for role, content in messages
+    )
+    prompt = EVALUATION_PROMPT.format(
+        level=level,
+        running_evaluation=format_running_evaluation(None),
+        conversation=conversation
+    )
+    return {
+        "custom_id": f"lesson-{lesson_id}",
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": model_for_tier(route.tier),
+            "temperature": route.temperature,
+            "max_tokens": route.max_tokens,
+            "messages": [{"role": "user", "content": prompt}],
+            "response_format": _response_format()
+        }
+    }
+
+
+def parse_result(line: dict) -> tuple[int, LessonEvaluation | None, dict]:
+    """(lesson id, evaluation or None if the request failed or didn't parse, usage) of a result line."""
+    lesson_id = int(line["custom_id"].removeprefix("lesson-"))
+    response = line.get("response") or {}
+    body = response.get("body") or {}
+    usage = body.get("usage") or {}
+    if line.get("error") or response.get("status_code") != 200:
+        logger.warning(f"Batch evaluation of lesson {lesson_id} failed: {line.get('error') or body.get('error')}")
+        return lesson_id, None, usage
+    try:
+        content = body["choices"][0]["message"]["content"]
+        return lesson_id, LessonEvaluation.model_validate_json(content or ""), usage
+    except (KeyError, IndexError, ValidationError) as e:
+        metrics.increment("evaluation_batch.parse_failures")
+        logger.warning(f"Batch evaluation of lesson {lesson_id} didn't parse: {e}")
+        return lesson_id, None, usage
+
+
+def _price_model(model: str) -> str:
+    """Price-table name for a dated model id (e.g. gpt-4.1-mini-2025-04-14)."""
+    return next((name for name in sorted(MODEL_PRICES, key=len, reverse=True) if model.startswith(name)), model)
+
+
+def due_day(now: datetime) -> date:
+    """The day whose lessons are submitted at `now`: yesterday, once past evaluation_batch_hour (UTC)."""
+    return (now - timedelta(hours=settings.evaluation_batch_hour)).date() - timedelta(days=1)
+
+
+class EvaluationBatchService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def get_batch(self, day: date) -> EvaluationBatch | None:
+        result = await self.db.execute(select(EvaluationBatch).where(EvaluationBatch.day == day))
+        return result.scalar_one_or_none()
+    
+    async def list_batches(self, limit: int = 30) -> list[EvaluationBatch]:
+        result = await self.db.execute(
+            select(EvaluationBatch).order_by(EvaluationBatch.day.desc()).limit(limit)
+        )
+        return list(result.scalars().all())
+    
+    async def get_unevaluated_lessons(self, day: date) -> list[tuple[int, str]]:
+        """(lesson id, level code) of lessons that ended on `day` (UTC) without an evaluation."""
+        start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+        result = await self.db.execute(
+            select(Lesson.id, Level.code)
+            .join(Level, Level.id == Lesson.level_id)
+            .where(
+                Lesson.ended_at >= start,
+                Lesson.ended_at < start + timedelta(days=1),
+                Lesson.ai_evaluation.is_(None),
+                Lesson.messages_count >= 2
+            )
+            .order_by(Lesson.id)
+            .limit(settings.evaluation_batch_max_lessons)
+        )
+        return [tuple(row) for row in result.all()]
+    
+    async def build_jsonl(self, lessons: list[tuple[int, str]]) -> bytes:
+        """The batch input: one request per lesson with its last evaluation_batch_max_messages messages."""
+        lines = []
+        for i in range(0, len(lessons), LESSON_CHUNK):
+            chunk = dict(lessons[i:i + LESSON_CHUNK])
+            result = await self.db.execute(
+                select(LessonMessage.lesson_id, LessonMessage.role, LessonMessage.content)
+                .where(LessonMessage.lesson_id.in_(chunk))
+                .order_by(LessonMessage.lesson_id, LessonMessage.created_at)
+            )
+            messages: dict[int, list[tuple[str, str]]] = {}
+            for lesson_id, role, content in result.all():
+                messages.setdefault(lesson_id, []).append((role, content))
+            for lesson_id, level in chunk.items():
+                history = messages.get(lesson_id, [])[-settings.evaluation_batch_max_messages:]
+                lines.append(json.dumps(build_request(lesson_id, level, history), ensure_ascii=False))
+        return ("\n".join(lines) + "\n").encode()
+    
+    def _reset(self, batch: EvaluationBatch, backend: str, status: str):
+        batch.backend, batch.status, batch.external_id, batch.error = backend, status, None, None
+        batch.lesson_count = batch.applied_count = batch.failed_count = 0
+        batch.input_tokens = batch.output_tokens = 0
+        batch.cost_usd, batch.finished_at = 0.0, None
+    
+    async def enqueue_day(self, day: date) -> EvaluationBatch | None:
+        """Queue `day` for the scheduler to submit (again, if its batch failed).
+        
+        Returns None if the day already has a batch that didn't fail. Submitting
+        is left to the scheduler's job, which runs in the leader: with the local
+        backend the job's results only exist in the process that submitted it.
+        """
+        batch = await self.get_batch(day)
+        if batch is not None and batch.status != "failed":
+            return None
+        if batch is None:
+            batch = EvaluationBatch(day=day)
+            self.db.add(batch)
+        self._reset(batch, settings.evaluation_batch_backend, "queued")
+        try:
+            await self.db.commit()
+        except IntegrityError:
+            # The scheduler claimed the day first
+            await self.db.rollback()
+            return None
+        return batch
+    
+    async def submit_queued(self, backend: BatchBackend | None = None) -> int:
+        """Submit the days queued through the admin API. Returns how many."""
+        result = await self.db.execute(
+            select(EvaluationBatch.day).where(EvaluationBatch.status == "queued").order_by(EvaluationBatch.day)
+        )
+        days = list(result.scalars().all())
+        for day in days:
+            await self.submit_day(day, backend)
+        return len(days)
+    
+    async def submit_day(self, day: date, backend: BatchBackend | None = None) -> EvaluationBatch | None:
+        """Submit the lessons that ended on `day`, if it has no batch yet or one is queued.
+        
+        Returns None if the day already has a batch that isn't queued.
+        """
+        backend = backend or get_batch_backend()
+        batch = await self.get_batch(day)
+        if batch is not None and batch.status != "queued":
+            return None
+        if batch is None:
+            batch = EvaluationBatch(day=day)
+            self.db.add(batch)
+        self._reset(batch, backend.name, "submitting")
+        try:
+            await self.db.commit()
+        except IntegrityError:
+            # Another scheduler run claimed the day first
+            await self.db.rollback()
+            return None
+        
+        lessons = await self.get_unevaluated_lessons(day)
+        batch.lesson_count = len(lessons)
+        if not lessons:
+            batch.status, batch.finished_at = "applied", datetime.now(timezone.utc)
+            await self.db.commit()
+            return batch
+        if len(lessons) == settings.evaluation_batch_max_lessons:
+            logger.warning(f"Evaluation batch for {day} capped at {len(lessons)} lessons")
+        
+        try:
+            batch.external_id = await backend.submit(await self.build_jsonl(lessons), f"lesson evaluations {day}")
+            batch.status = "submitted"
+            logger.info(f"Evaluation batch for {day}: {len(lessons)} lessons submitted as {batch.external_id}")
+        except Exception as e:
+            logger.error(f"Error submitting evaluation batch for {day}: {e}")
+            batch.status, batch.error = "failed", str(e)
+        await self.db.commit()
+        return batch
+    
+    async def apply_finished_batches(self, backend: BatchBackend | None = None) -> int:
+        """Write back the results of every finished batch. Returns the number of batches applied.
+        
+        Batches are polled on the backend they were submitted to (`backend` if it's that one).
+        """
+        result = await self.db.execute(select(EvaluationBatch).where(EvaluationBatch.status == "submitted"))
+        applied = 0
+        for batch in result.scalars().all():
+            source = backend if backend and backend.name == batch.backend else get_batch_backend(batch.backend)
+            try:
+                outcome = await source.poll(batch.external_id)
+            except Exception as e:
+                logger.error(f"Error polling evaluation batch {batch.id}: {e}")
+                continue
+            if outcome.state == "running":
+                continue
+            if outcome.state == "failed":
+                logger.error(f"Evaluation batch {batch.id} for {batch.day} failed: {outcome.error}")
+                batch.status, batch.error = "failed", outcome.error
+            else:
+                await self.apply_results(batch, outcome.lines)
+                applied += 1
+            batch.finished_at = datetime.now(timezone.utc)
+            await self.db.commit()
+        return applied
+    
+    async def apply_results(self, batch: EvaluationBatch, lines: list[dict]):
+        """Bulk-update lessons and skill scores from a batch's result lines (commits with the caller)."""
+        evaluations: dict[int, LessonEvaluation] = {}
+        for line in lines:
+            lesson_id, evaluation, usage = parse_result(line)
+            model = (line.get("response") or {}).get("body", {}).get("model", "")
+            input_tokens = usage.get("prompt_tokens", 0)
+            cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0) or 0
+            output_tokens = usage.get("completion_tokens", 0)
+            batch.input_tokens += input_tokens
+            batch.output_tokens += output_tokens
+            batch.cost_usd += estimate_cost(
+                _price_model(model), input_tokens, cached_tokens, output_tokens
+            ) * BATCH_PRICE_FACTOR
+            if evaluation is not None:
+                evaluations[lesson_id] = evaluation
+        batch.failed_count = batch.lesson_count - len(evaluations)
+        
+        if evaluations:
+            await self._update_lessons(evaluations)
+            await self._update_skills(evaluations)
+        batch.applied_count = len(evaluations)
+        batch.status = "applied"
+        metrics.increment("evaluation_batch.lessons", len(evaluations))
+        metrics.increment("evaluation_batch.cost_usd", batch.cost_usd)
+        logger.info(
+            f"Evaluation batch {batch.id} for {batch.day} applied: {len(evaluations)} lessons, "
+            f"{batch.failed_count} failed, cost_usd={batch.cost_usd:.4f}"
+        )
+    
+    async def _update_lessons(self, evaluations: dict[int, LessonEvaluation]):
+        result = await self.db.execute(
+            select(Lesson.id, Lesson.messages_count, Lesson.ai_evaluation).where(Lesson.id.in_(evaluations))
+        )
+        rows = []
+        for lesson_id, messages_count, previous in result.all():
+            evaluation = merge_evaluation(
+                previous,
+                {**evaluations[lesson_id].model_dump(), "messages_evaluated": messages_count}
+            )
+            rows.append({
+                "lesson_id": lesson_id,
+                "evaluation": evaluation,
+                "summary": evaluation.get("summary"),
+                "skills": evaluation.get("skills_practiced", []),
+                "topic": ", ".join(evaluation.get("topics_covered", [])[:3])[:200]
+            })
+        
+        lessons = Lesson.__table__
+        await self.db.execute(
+            update(lessons)
+            .where(lessons.c.id == bindparam("lesson_id"))
+            .values(
+                ai_evaluation=bindparam("evaluation", type_=JSON),
+                summary=bindparam("summary"),
+                skills_practiced=bindparam("skills", type_=JSON),
+                topic=bindparam("topic")
+            ),
+            rows
+        )
+    
+    async def _update_skills(self, evaluations: dict[int, LessonEvaluation]):
+        """Blend each lesson's scores into the student's skills, in lesson order.
+        
+        n lessons fold into one update per skill: score * 0.7^n plus each lesson's
+        score weighted 0.3 * 0.7^(lessons after it).
+        """
+        result = await self.db.execute(
+            select(Lesson.id, Lesson.student_id).where(Lesson.id.in_(evaluations)).order_by(Lesson.id)
+        )
+        skill_ids = dict((await self.db.execute(
+            select(Skill.code, Skill.id).where(Skill.code.in_(SKILL_SCORES))
+        )).all())
+        
+        # (student, skill) -> (factor on the current score, points added)
+        blends: dict[tuple[int, int], tuple[float, float]] = {}
+        for lesson_id, student_id in result.all():
+            evaluation = evaluations[lesson_id]
+            for code, field in SKILL_SCORES.items():
+                if code not in skill_ids:
+                    continue
+                factor, gain = blends.get((student_id, skill_ids[code]), (1.0, 0.0))
+                blends[(student_id, skill_ids[code])] = (
+                    factor * (1 - SKILL_WEIGHT),
+                    gain * (1 - SKILL_WEIGHT) + getattr(evaluation, field) * SKILL_WEIGHT
+                )
+        if not blends:
+            return
+        
+        skills = StudentSkill.__table__
+        await self.db.execute(
+            update(skills)
+            .where(skills.c.student_id == bindparam("b_student_id"), skills.c.skill_id == bindparam("b_skill_id"))
+            .values(score=cast(
+                skills.c.score * bindparam("b_factor", type_=Float) + bindparam("b_gain", type_=Float), Integer
+            )),
+            [
+                {"b_student_id": student_id, "b_skill_id": skill_id, "b_factor": factor, "b_gain": gain}
+                for (student_id, skill_id), (factor, gain) in blends.items()
+            ]
+        )
+
@@ -1,8 +1,9 @@
 import logging
-from datetime import datetime, timezone
-from sqlalchemy import select, func
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, update, func, exists, cast, Integer
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
+from app.evaluation_merge import merge_evaluation
 from app.models import Lesson, LessonMessage, Student
 
 logger = logging.getLogger(__name__)
@@ -14,19 +15,15 @@ class LessonService:
     
     async def get_or_create_active_lesson(self, student: Student) -> Lesson:
         """Get active lesson or create a new one."""
-        # Check for active lesson (started today, not ended)
-        today_start = datetime.now(timezone.utc).replace(
-            hour=0, minute=0, second=0, microsecond=0
-        )
-        
+        # Check for an open lesson; idle ones are closed by close_idle_lessons
         result = await self.db.execute(
             select(Lesson)
             .where(
                 Lesson.student_id == student.id,
-                Lesson.ended_at.is_(None),
-                Lesson.started_at >= today_start
+                Lesson.ended_at.is_(None)
             )
             .order_by(Lesson.started_at.desc())
+            .limit(1)
         )
         lesson = result.scalar_one_or_none()
         
@@ -74,11 +71,12 @@ class LessonService:
         lesson: Lesson,
         evaluation: dict
     ):
-        """Update lesson with AI evaluation."""
-        lesson.ai_evaluation = evaluation
-        lesson.summary = evaluation.get("summary")
-        lesson.skills_practiced = evaluation.get("skills_practiced", [])
-        lesson.topic = ", ".join(evaluation.get("topics_covered", [])[:3])
+        """Merge an evaluation of the latest messages into the lesson's running evaluation."""
+        merged = merge_evaluation(lesson.ai_evaluation, evaluation)
+        lesson.ai_evaluation = merged
+        lesson.summary = merged.get("summary")
+        lesson.skills_practiced = merged.get("skills_practiced", [])
+        lesson.topic = ", ".join(merged.get("topics_covered", [])[:3])
         
         await self.db.commit()
     
@@ -93,6 +91,80 @@ class LessonService:
         
         await self.db.commit()
     
+    async def close_idle_lessons(self, idle_minutes: int) -> int:
+        """End every open lesson whose last message is older than the idle gap.
+        
+        Runs as two set-based statements: one UPDATE closes the lessons (ended_at =
+        last message, duration = first to last message) and feeds, through a CTE, a
+        second UPDATE that adds the closed lessons and minutes to each student.
+        Returns the number of lessons closed.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(minutes=idle_minutes)
+        
+        bounds = (
+            select(
+                LessonMessage.lesson_id.label("lesson_id"),
+                func.min(LessonMessage.created_at).label("first_at"),
+                func.max(LessonMessage.created_at).label("last_at")
+            )
+            .join(Lesson, Lesson.id == LessonMessage.lesson_id)
+            .where(Lesson.ended_at.is_(None))
+            .group_by(LessonMessage.lesson_id)
+            .having(func.max(LessonMessage.created_at) < cutoff)
+            .subquery("bounds")
+        )
+        duration = func.greatest(
+            1,
+            cast(func.ceil(func.extract("epoch", bounds.c.last_at - bounds.c.first_at) / 60), Integer)
+        )
+        closed = (
+            update(Lesson)
+            # Rechecked on the locked row, so a lesson an overlapping sweep just closed isn't counted twice
+            .where(Lesson.id == bounds.c.lesson_id, Lesson.ended_at.is_(None))
+            .values(ended_at=bounds.c.last_at, duration_minutes=duration)
+            .returning(Lesson.student_id, Lesson.duration_minutes)
+            .cte("closed")
+        )
+        totals = (
+            select(
+                closed.c.student_id,
+                func.count().label("lessons"),
+                func.sum(closed.c.duration_minutes).label("minutes")
+            )
+            .group_by(closed.c.student_id)
+            .subquery("totals")
+        )
+        result = await self.db.execute(
+            update(Student)
+            .where(Student.id == totals.c.student_id)
+            .values(
+                total_lessons=Student.total_lessons + totals.c.lessons,
+                total_minutes=Student.total_minutes + totals.c.minutes,
+                # Not student activity: keep onupdate=now() from touching it
+                last_activity=Student.last_activity
+            )
+            .returning(totals.c.lessons)
+            .add_cte(closed)
+        )
+        closed_count = sum(lessons for (lessons,) in result.all())
+        
+        # Lessons that never got a message are closed without counting towards progress
+        await self.db.execute(
+            update(Lesson)
+            .where(
+                Lesson.ended_at.is_(None),
+                Lesson.started_at < cutoff,
+                ~exists().where(LessonMessage.lesson_id == Lesson.id)
+            )
+            .values(ended_at=Lesson.started_at, duration_minutes=0)
+        )
+        
+        await self.db.commit()
+        
+        if closed_count:
+            logger.info(f"Closed {closed_count} idle lessons")
+        return closed_count
+    
     async def get_student_lessons(
         self,
         student_id: int,
@@ -118,6 +190,19 @@ class LessonService:
         )
         return result.scalar_one_or_none()
     
+    async def get_recent_messages(self, lesson_id: int, limit: int) -> list[tuple[str, str]]:
+        """The lesson's last `limit` messages as (role, content), oldest first.
+        
+        A single backward range scan of ix_lesson_messages_lesson_created.
+        """
+        result = await self.db.execute(
+            select(LessonMessage.role, LessonMessage.content)
+            .where(LessonMessage.lesson_id == lesson_id)
+            .order_by(LessonMessage.created_at.desc())
+            .limit(limit)
+        )
+        return [tuple(row) for row in reversed(result.all())]
+    
     async def get_recent_lessons_count(
         self,
         student_id: int,
@@ -0,0 +1,227 @@
+"""Long-term memory: what a student did in earlier lessons, recalled by relevance.
+
+Every ended lesson with a summary (from the inline or the nightly evaluation)
+gets one LessonMemory: date, summary, topics and the words practiced, embedded
+with a small embedding model. On each turn the student's message is embedded
+and the closest few memories (cosine similarity above a floor) go into the
+student context, so the tutor can pick up earlier lessons without replaying
+their transcripts.
+
+A student's memories are one float16 matrix of unit vectors, so retrieval is a
+single matrix-vector product. Matrices are kept in a per-process LRU with a TTL,
+as new memories are written by the scheduler, possibly in another process.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import numpy as np
+from openai import AsyncOpenAI
+from sqlalchemy import select, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import get_settings
+from app.models import Lesson, LessonMemory, StudentVocabulary, VocabularyWord
+from app.metrics import metrics
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+MAX_WORDS = 15  # Words practiced listed per memory
+
+
+@lru_cache(maxsize=1)
+def _client() -> AsyncOpenAI:
+    return AsyncOpenAI(api_key=settings.openai_api_key)
+
+
+def encode(vector: np.ndarray) -> bytes:
+    """Unit-length float16 bytes of an embedding."""
+    vector = np.asarray(vector, dtype=np.float32)
+    return (vector / (np.linalg.norm(vector) or 1.0)).astype(np.float16).tobytes()
+
+
+def decode(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=np.float16)
+
+
+def memory_text(lesson_date: datetime, summary: str, topic: str | None, words: list[str]) -> str:
+    text = f"{lesson_date:%d/%m/%Y}: {summary}"
+    if topic:
+        text += f" Temas: {topic}."
+    if words:
+        text += f" Palabras: {', '.join(words[:MAX_WORDS])}."
+    return text
+
+
+@dataclass
+class StudentMemories:
+    texts: list[str]
+    matrix: np.ndarray  # (memories, dimensions) float16, unit rows
+    expires_at: float
+
+
+def top_k(memories: StudentMemories, query: np.ndarray, k: int, min_similarity: float) -> list[str]:
+    """The k memories most similar to the query embedding, best first, above min_similarity."""
+    if not memories.texts:
+        return []
+    query = np.asarray(query, dtype=np.float32)
+    scores = memories.matrix.astype(np.float32) @ (query / (np.linalg.norm(query) or 1.0))
+    best = np.argsort(scores)[::-1][:k]
+    return [memories.texts[i] for i in best if scores[i] >= min_similarity]
+
+
+class MemoryIndex:
+    """Per-process LRU of students' memory matrices."""
+    
+    def __init__(
+        self,
+        max_students: int = settings.memory_cache_students,
+        ttl_seconds: int = settings.memory_cache_ttl_seconds
+    ):
+        self.max_students = max_students
+        self.ttl_seconds = ttl_seconds
+        self._students: OrderedDict[int, StudentMemories] = OrderedDict()
+    
+    def get(self, student_id: int) -> StudentMemories | None:
+        memories = self._students.get(student_id)
+        if memories is None or memories.expires_at <= time.monotonic():
+            self._students.pop(student_id, None)
+            return None
+        self._students.move_to_end(student_id)
+        return memories
+    
+    def put(self, student_id: int, texts: list[str], embeddings: list[bytes]) -> StudentMemories:
+        dimensions = settings.memory_embedding_dimensions
+        matrix = (
+            np.stack([decode(e) for e in embeddings]) if embeddings
+            else np.empty((0, dimensions), dtype=np.float16)
+        )
+        memories = StudentMemories(texts, matrix, time.monotonic() + self.ttl_seconds)
+        self._students[student_id] = memories
+        self._students.move_to_end(student_id)
+        while len(self._students) > self.max_students:
+            self._students.popitem(last=False)
+        return memories
+    
+    def invalidate(self, student_id: int):
+        self._students.pop(student_id, None)
+    
+    def __len__(self) -> int:
+        return len(self._students)
+
+
+memory_index = MemoryIndex()
+
+
+class MemoryService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def _embed(self, texts: list[str]) -> list[np.ndarray]:
+        response = await _client().embeddings.create(
+            model=settings.memory_embedding_model,
+            input=texts,
+            dimensions=settings.memory_embedding_dimensions
+        )
+        metrics.increment("memory.embedding_tokens", response.usage.total_tokens)
+        return [np.asarray(item.embedding, dtype=np.float32) for item in response.data]
+    
+    async def get_memories(self, student_id: int) -> StudentMemories:
+        """The student's most recent memories, from the cache or the database."""
+        memories = memory_index.get(student_id)
+        if memories is not None:
+            return memories
+        
+        result = await self.db.execute(
+            select(LessonMemory.text, LessonMemory.embedding)
+            .where(
+                LessonMemory.student_id == student_id,
+                LessonMemory.embedding_model == settings.memory_embedding_model
+            )
+            .order_by(LessonMemory.id.desc())
+            .limit(settings.memory_max_per_student)
+        )
+        rows = result.all()
+        return memory_index.put(student_id, [row.text for row in rows], [row.embedding for row in rows])
+    
+    async def recall(self, student_id: int, query: str) -> list[str]:
+        """Memories relevant to what the student just said; [] if none, or if recall is slow or fails."""
+        if not settings.memory_enabled or not query.strip():
+            return []
+        try:
+            memories = await self.get_memories(student_id)
+            if not memories.texts:
+                return []
+            started = time.monotonic()
+            [embedding] = await asyncio.wait_for(self._embed([query]), settings.memory_recall_timeout_seconds)
+            metrics.observe("memory.recall_seconds", time.monotonic() - started)
+        except Exception as e:
+            metrics.increment("memory.recall_errors")
+            logger.warning(f"Memory recall failed for student {student_id}: {type(e).__name__}: {e}")
+            return []
+        
+        recalled = top_k(memories, embedding, settings.memory_top_k, settings.memory_min_similarity)
+        metrics.increment("memory.recalls")
+        metrics.increment("memory.recalled", len(recalled))
+        return recalled
+    
+    async def index_pending_lessons(self, limit: int = 100) -> int:
+        """Create memories for recently ended lessons that have a summary. Returns how many."""
+        since = datetime.now(timezone.utc) - timedelta(days=settings.memory_index_lookback_days)
+        result = await self.db.execute(
+            select(Lesson.id, Lesson.student_id, Lesson.started_at, Lesson.ended_at, Lesson.summary, Lesson.topic)
+            .outerjoin(LessonMemory, LessonMemory.lesson_id == Lesson.id)
+            .where(
+                Lesson.ended_at >= since,
+                Lesson.summary.is_not(None),
+                LessonMemory.id.is_(None)
+            )
+            .order_by(Lesson.id)
+            .limit(limit)
+        )
+        lessons = result.all()
+        if not lessons:
+            return 0
+        
+        # Words the student practiced during each lesson
+        windows = select(Lesson.id, Lesson.student_id, Lesson.started_at, Lesson.ended_at).where(
+            Lesson.id.in_([lesson.id for lesson in lessons])
+        ).subquery()
+        result = await self.db.execute(
+            select(windows.c.id, VocabularyWord.word)
+            .join(StudentVocabulary, and_(
+                StudentVocabulary.student_id == windows.c.student_id,
+                StudentVocabulary.last_practiced >= windows.c.started_at,
+                StudentVocabulary.last_practiced <= windows.c.ended_at
+            ))
+            .join(VocabularyWord, VocabularyWord.id == StudentVocabulary.word_id)
+            .order_by(windows.c.id, StudentVocabulary.last_practiced)
+        )
+        words: dict[int, list[str]] = {}
+        for lesson_id, word in result.all():
+            words.setdefault(lesson_id, []).append(word)
+        
+        texts = [
+            memory_text(lesson.ended_at, lesson.summary, lesson.topic, words.get(lesson.id, []))
+            for lesson in lessons
+        ]
+        embeddings = await self._embed(texts)
+        self.db.add_all([
+            LessonMemory(
+                student_id=lesson.student_id,
+                lesson_id=lesson.id,
+                text=text,
+                embedding=encode(embedding),
+                embedding_model=settings.memory_embedding_model
+            )
+            for lesson, text, embedding in zip(lessons, texts, embeddings)
+        ])
+        await self.db.commit()
+        
+        for lesson in lessons:
+            memory_index.invalidate(lesson.student_id)
+        logger.info(f"Indexed {len(lessons)} lesson memories")
+        return len(lessons)
@@ -1,15 +1,23 @@
 import logging
 from datetime import datetime, timedelta, timezone
-from sqlalchemy import select
+from sqlalchemy import select, func, literal_column
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.engine import Row
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
-from app.models import Student, Level, Skill, StudentSkill
+from sqlalchemy.orm import selectinload, contains_eager, aliased
+from app.models import Student, Level, Skill, StudentSkill, Lesson
 from app.models.level import LEVEL_SEED_DATA
 from app.models.skill import SKILL_SEED_DATA
+from app.services.activity_service import activity_tracker
 
 logger = logging.getLogger(__name__)
 
 
+def _key(name: str):
+    """Inline a JSON object key so Postgres does not need to infer a bind type."""
+    return literal_column(f"'{name}'")
+
+
 class StudentService:
     def __init__(self, db: AsyncSession):
         self.db = db
@@ -50,7 +58,9 @@ class StudentService:
             # Update last activity and streak
             await self._update_streak(student)
             student.last_activity = datetime.now(timezone.utc)
+            student.blocked_bot_at = None  # Writing to us means the bot is unblocked
             await self.db.commit()
+            await self._record_activity(student.id)
             
             if updated:
                 logger.info(f"Updated student info: {student.full_name} (telegram_id: {telegram_id})")
@@ -89,10 +99,21 @@ class StudentService:
             .where(Student.id == student.id)
         )
         student = result.scalar_one()
+        await self._record_activity(student.id, is_new=True)
         
         logger.info(f"Created new student: {student.full_name} (telegram_id: {telegram_id})")
         return student, True
     
+    async def _record_activity(self, student_id: int, is_new: bool = False):
+        """Set the student's bit in today's activity bitmaps."""
+        try:
+            await activity_tracker.mark_active(student_id)
+            if is_new:
+                await activity_tracker.mark_signup(student_id)
+        except Exception as e:
+            # Activity tracking must never block a conversation turn
+            logger.warning(f"Could not record activity for student {student_id}: {e}")
+    
     async def _get_or_create_initial_level(self) -> Level:
         """Get or create the PRE_A1 level."""
         result = await self.db.execute(
@@ -201,6 +222,73 @@ class StudentService:
         )
         return result.scalar_one_or_none()
     
+    async def get_dashboard_row(self, student_id: int, recent_days: int = 7) -> Row | None:
+        """Load everything the dashboard needs in a single query.
+        
+        Returns a row with: Student (current_level loaded), next_level, skills
+        (JSON list shaped like SkillProgress), recent_lessons, lessons_at_level.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(days=recent_days)
+        next_level = aliased(Level, name="next_level")
+        skill_level = aliased(Level, name="skill_level")
+        
+        skills = (
+            select(func.coalesce(
+                func.json_agg(aggregate_order_by(
+                    func.json_build_object(
+                        _key("skill"), func.json_build_object(
+                            _key("id"), Skill.id, _key("code"), Skill.code,
+                            _key("name"), Skill.name, _key("icon"), Skill.icon
+                        ),
+                        _key("level"), func.json_build_object(
+                            _key("id"), skill_level.id, _key("code"), skill_level.code,
+                            _key("name"), skill_level.name, _key("description"), skill_level.description,
+                            _key("order"), skill_level.order
+                        ),
+                        _key("score"), StudentSkill.score,
+                        _key("lessons_completed"), StudentSkill.lessons_completed,
+                        _key("last_practiced"), StudentSkill.last_practiced
+                    ),
+                    Skill.id
+                )),
+                func.json_build_array()
+            ))
+            .select_from(StudentSkill)
+            .join(Skill, Skill.id == StudentSkill.skill_id)
+            .join(skill_level, skill_level.id == StudentSkill.level_id)
+            .where(StudentSkill.student_id == Student.id)
+            .scalar_subquery()
+        )
+        recent_lessons = (
+            select(func.count(Lesson.id))
+            .where(Lesson.student_id == Student.id, Lesson.started_at >= cutoff)
+            .scalar_subquery()
+        )
+        lessons_at_level = (
+            select(func.count(Lesson.id))
+            .where(
+                Lesson.student_id == Student.id,
+                Lesson.level_id == Student.current_level_id,
+                Lesson.ended_at.isnot(None)
+            )
+            .scalar_subquery()
+        )
+        
+        result = await self.db.execute(
+            select(
+                Student,
+                next_level,
+                skills.label("skills"),
+                recent_lessons.label("recent_lessons"),
+                lessons_at_level.label("lessons_at_level")
+            )
+            .join(Student.current_level)
+            .outerjoin(next_level, next_level.order == Level.order + 1)
+            .options(contains_eager(Student.current_level))
+            .where(Student.id == student_id)
+        )
+        return result.one_or_none()
+    
     async def ensure_student_skills(self, student: Student):
         """Ensure a student has skills initialized. Call this if skills are missing."""
         if student.skills:
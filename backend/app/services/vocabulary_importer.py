@@ -0,0 +1,151 @@
+"""Bulk loader for vocabulary word lists (CSV or JSONL).
+
+Rows are streamed from the file, validated in chunks and COPY'd into a temporary
+staging table, then merged into vocabulary_words with a single
+INSERT .. ON CONFLICT (word, category). Rows whose content did not change are
+left untouched, so reloading the same file is a no-op. Categories must be one
+of the VOCABULARY_CATEGORIES codes (any case).
+"""
+import csv
+import json
+import logging
+from pathlib import Path
+from typing import Iterator
+from sqlalchemy import (
+    Table, Column, MetaData, String, Text, Integer, select, tuple_, literal_column
+)
+from sqlalchemy.dialects.postgresql import insert
+from app.database import engine
+from app.models import VocabularyWord
+from app.models.vocabulary import VOCABULARY_CATEGORIES
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 5000
+
+FIELDS = (
+    "word", "translation", "phonetic", "category",
+    "difficulty", "example_sentence", "example_translation"
+)
+MAX_LENGTHS = {"word": 100, "translation": 100, "phonetic": 100, "category": 50}
+CATEGORY_CODES = {category["code"] for category in VOCABULARY_CATEGORIES}
+
+staging_table = Table(
+    "vocabulary_staging",
+    MetaData(),
+    Column("line_no", Integer, nullable=False),
+    Column("word", String(100), nullable=False),
+    Column("translation", String(100), nullable=False),
+    Column("phonetic", String(100)),
+    Column("category", String(50), nullable=False),
+    Column("difficulty", Integer, nullable=False),
+    Column("example_sentence", Text),
+    Column("example_translation", Text),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+
+
+def iter_records(path: Path) -> Iterator[tuple[int, dict]]:
+    """Yield (line_no, raw record) from a .csv (with header) or .jsonl file."""
+    with path.open(encoding="utf-8", newline="") as f:
+        if path.suffix.lower() == ".csv":
+            for line_no, record in enumerate(csv.DictReader(f), start=2):
+                yield line_no, record
+        elif path.suffix.lower() in (".jsonl", ".ndjson"):
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_no, json.loads(line)
+                except json.JSONDecodeError:
+                    yield line_no, {}
+        else:
+            raise ValueError(f"Unsupported file type: {path.suffix} (use .csv or .jsonl)")
+
+
+def validate_record(line_no: int, record: dict) -> tuple | None:
+    """Normalize a raw record into a staging row, or None if it is invalid."""
+    if not isinstance(record, dict):
+        return None
+    
+    values = {field: (str(record.get(field) or "").strip() or None) for field in FIELDS}
+    if not values["word"] or not values["translation"] or not values["category"]:
+        return None
+    values["category"] = values["category"].upper()
+    if values["category"] not in CATEGORY_CODES:
+        return None
+    
+    for field, max_length in MAX_LENGTHS.items():
+        if values[field] and len(values[field]) > max_length:
+            return None
+    
+    try:
+        difficulty = int(values["difficulty"] or 1)
+    except ValueError:
+        return None
+    if not 1 <= difficulty <= 5:
+        return None
+    values["difficulty"] = difficulty
+    
+    return (line_no, *(values[field] for field in FIELDS))
+
+
+def _merge_statement():
+    """INSERT .. SELECT from staging (last occurrence wins) with an idempotent upsert."""
+    latest = (
+        select(*(staging_table.c[field] for field in FIELDS))
+        .distinct(staging_table.c.word, staging_table.c.category)
+        .order_by(staging_table.c.word, staging_table.c.category, staging_table.c.line_no.desc())
+    )
+    stmt = insert(VocabularyWord).from_select(list(FIELDS), latest)
+    updated = ("translation", "phonetic", "difficulty", "example_sentence", "example_translation")
+    return stmt.on_conflict_do_update(
+        index_elements=[VocabularyWord.word, VocabularyWord.category],
+        set_={field: stmt.excluded[field] for field in updated},
+        # Skip rows that would not change so reloads don't rewrite the table
+        where=tuple_(*(VocabularyWord.__table__.c[field] for field in updated))
+        .is_distinct_from(tuple_(*(stmt.excluded[field] for field in updated)))
+    ).returning(literal_column("xmax = 0").label("inserted"))
+
+
+async def import_vocabulary(path: str | Path, chunk_size: int = CHUNK_SIZE) -> dict:
+    """Load a word list into vocabulary_words. Returns counts of what happened."""
+    path = Path(path)
+    stats = {"read": 0, "invalid": 0, "inserted": 0, "updated": 0}
+    
+    async with engine.begin() as conn:
+        await conn.run_sync(staging_table.create)
+        raw_connection = await conn.get_raw_connection()
+        asyncpg_connection = raw_connection.driver_connection
+        
+        chunk: list[tuple] = []
+        for line_no, record in iter_records(path):
+            stats["read"] += 1
+            row = validate_record(line_no, record)
+            if row is None:
+                stats["invalid"] += 1
+                logger.warning(f"{path.name}:{line_no}: skipped invalid row")
+                continue
+            
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                await asyncpg_connection.copy_records_to_table(
+                    staging_table.name, records=chunk, columns=["line_no", *FIELDS]
+                )
+                chunk = []
+        
+        if chunk:
+            await asyncpg_connection.copy_records_to_table(
+                staging_table.name, records=chunk, columns=["line_no", *FIELDS]
+            )
+        
+        result = await conn.execute(_merge_statement())
+        for (inserted,) in result.all():
+            stats["inserted" if inserted else "updated"] += 1
+    
+    logger.info(
+        f"Vocabulary import from {path.name}: {stats['read']} read, {stats['invalid']} invalid, "
+        f"{stats['inserted']} inserted, {stats['updated']} updated"
+    )
+    return stats
@@ -0,0 +1,90 @@
+"""Multi-pattern matcher for finding vocabulary words in chat messages.
+
+The whole vocabulary table is compiled into a single Aho-Corasick automaton, so
+matching a message is linear in its length regardless of how many words exist.
+"""
+import re
+import unicodedata
+from collections import deque
+
+# Tutor word cards: "🆕 Nueva palabra: **HELLO** /jelóu/"
+NEW_WORD_PATTERN = re.compile(r"Nueva palabra:\s*\*{0,2}([^*/\n]+?)\*{0,2}\s*(?:/|\n|$)", re.IGNORECASE)
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents and collapse whitespace so matching is forgiving."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.split())
+
+
+class VocabularyMatcher:
+    """Aho-Corasick automaton over vocabulary words (single words and phrases)."""
+    
+    def __init__(self, words: list[tuple[int, str]]):
+        # Trie as parallel lists: goto transitions, failure links and outputs
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list[tuple[int, int]]] = [[]]  # (word_id, pattern length)
+        self._ids_by_word: dict[str, list[int]] = {}
+        
+        for word_id, word in words:
+            pattern = normalize(word)
+            if pattern:
+                self._add(pattern, word_id)
+                self._ids_by_word.setdefault(pattern, []).append(word_id)
+        self._build_failure_links()
+    
+    def __len__(self) -> int:
+        return len(self._ids_by_word)
+    
+    def _add(self, pattern: str, word_id: int):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        self._out[state].append((word_id, len(pattern)))
+    
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                if self._fail[next_state] == next_state:
+                    self._fail[next_state] = 0
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+    
+    def find(self, text: str) -> set[int]:
+        """Word ids of every vocabulary entry that appears as a whole word/phrase."""
+        text = normalize(text)
+        found: set[int] = set()
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for word_id, length in self._out[state]:
+                start = end - length + 1
+                before_ok = start == 0 or not text[start - 1].isalnum()
+                after_ok = end + 1 == len(text) or not text[end + 1].isalnum()
+                if before_ok and after_ok:
+                    found.add(word_id)
+        return found
+    
+    def find_taught(self, tutor_text: str) -> set[int]:
+        """Word ids introduced with the tutor's "Nueva palabra" card format."""
+        found: set[int] = set()
+        for match in NEW_WORD_PATTERN.finditer(tutor_text):
+            found.update(self._ids_by_word.get(normalize(match.group(1)), []))
+        return found
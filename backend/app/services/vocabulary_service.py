@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, update, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import get_settings
+from app.models import Student, VocabularyWord, StudentVocabulary
+from app.services.vocabulary_matcher import VocabularyMatcher
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Process-wide matcher over the whole vocabulary table, rebuilt when the table changes
+_matcher: VocabularyMatcher | None = None
+_matcher_signature: tuple | None = None
+_matcher_checked_at: float = 0.0
+_matcher_lock = asyncio.Lock()
+
+
+def get_vocabulary_matcher() -> VocabularyMatcher | None:
+    """The current vocabulary matcher, or None if the table has not been loaded yet."""
+    return _matcher
+
+MIN_EASE_FACTOR = 1.3
+LEARNED_MASTERY = 3  # Three successful reviews in a row (next interval >= ~2 weeks)
+
+
+def sm2_review(
+    quality: int,
+    repetitions: int,
+    ease_factor: float,
+    interval_days: int
+) -> tuple[int, float, int]:
+    """Apply one SM-2 review.
+    
+    quality: 0-5 (>= 3 means the word was recalled correctly).
+    Returns (repetitions, ease_factor, interval_days).
+    """
+    quality = max(0, min(5, quality))
+    
+    if quality >= 3:
+        if repetitions == 0:
+            interval_days = 1
+        elif repetitions == 1:
+            interval_days = 6
+        else:
+            interval_days = round(interval_days * ease_factor)
+        repetitions += 1
+    else:
+        repetitions = 0
+        interval_days = 1
+    
+    ease_factor += 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+    return repetitions, max(MIN_EASE_FACTOR, ease_factor), interval_days
+
+
+def format_due_words(words: list[Row]) -> list[str]:
+    """Render due words for the tutor prompt, e.g. 'hello /jelóu/ (hola)'."""
+    formatted = []
+    for word in words:
+        phonetic = f" {word.phonetic}" if word.phonetic else ""
+        formatted.append(f"{word.word}{phonetic} ({word.translation})")
+    return formatted
+
+
+class VocabularyService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def refresh_matcher(self, force: bool = False):
+        """Rebuild the vocabulary matcher if the vocabulary table changed.
+        
+        The table signature (row count, max id) is checked at most once per
+        vocabulary_matcher_check_seconds; the automaton is only rebuilt when it differs.
+        """
+        global _matcher, _matcher_signature, _matcher_checked_at
+        
+        if not force and time.monotonic() - _matcher_checked_at < settings.vocabulary_matcher_check_seconds:
+            return
+        
+        async with _matcher_lock:
+            if not force and time.monotonic() - _matcher_checked_at < settings.vocabulary_matcher_check_seconds:
+                return
+            
+            result = await self.db.execute(
+                select(func.count(VocabularyWord.id), func.max(VocabularyWord.id))
+            )
+            signature = tuple(result.one())
+            _matcher_checked_at = time.monotonic()
+            
+            if signature == _matcher_signature and _matcher is not None:
+                return
+            
+            result = await self.db.execute(select(VocabularyWord.id, VocabularyWord.word))
+            words = [(word_id, word) for word_id, word in result.all()]
+            # Building is CPU-bound (about a second for 40k words); keep the loop free
+            _matcher = await asyncio.to_thread(VocabularyMatcher, words)
+            _matcher_signature = signature
+            logger.info(f"Vocabulary matcher rebuilt with {len(_matcher)} entries")
+    
+    async def record_exposures(
+        self,
+        student_id: int,
+        taught: list[int],
+        seen: list[int],
+        used: list[int]
+    ):
+        """Batch-record which vocabulary words appeared in an exchange.
+        
+        taught: introduced by the tutor with a word card (creates the row)
+        used: written or said by the student (creates the row, counts as correct)
+        seen: mentioned by the tutor (only updates words the student already has)
+        """
+        now = datetime.now(timezone.utc)
+        used_set = set(used)
+        upsert_ids = set(taught) | used_set
+        
+        if upsert_ids:
+            rows = [
+                {
+                    "student_id": student_id,
+                    "word_id": word_id,
+                    "times_seen": 1,
+                    "times_correct": 1 if word_id in used_set else 0,
+                    "mastery_level": 0,
+                    "ease_factor": 2.5,
+                    "interval_days": 0,
+                    "last_practiced": now,
+                    # First review tomorrow, as SM-2 would schedule after a first exposure
+                    "next_review": now + timedelta(days=1),
+                    "is_learned": False
+                }
+                for word_id in sorted(upsert_ids)
+            ]
+            stmt = insert(StudentVocabulary).values(rows)
+            await self.db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[StudentVocabulary.student_id, StudentVocabulary.word_id],
+                    set_={
+                        "times_seen": StudentVocabulary.times_seen + stmt.excluded.times_seen,
+                        "times_correct": StudentVocabulary.times_correct + stmt.excluded.times_correct,
+                        "last_practiced": stmt.excluded.last_practiced
+                    }
+                )
+            )
+        
+        seen_only = set(seen) - upsert_ids
+        if seen_only:
+            await self.db.execute(
+                update(StudentVocabulary)
+                .where(
+                    StudentVocabulary.student_id == student_id,
+                    StudentVocabulary.word_id.in_(seen_only)
+                )
+                .values(times_seen=StudentVocabulary.times_seen + 1)
+            )
+        
+        if upsert_ids or seen_only:
+            await self.db.commit()
+    
+    async def get_due_words(self, student_id: int, limit: int = 5) -> list[Row]:
+        """Top-K words due for review, most overdue first (one index range scan)."""
+        result = await self.db.execute(
+            select(
+                StudentVocabulary.word_id,
+                VocabularyWord.word,
+                VocabularyWord.translation,
+                VocabularyWord.phonetic,
+                StudentVocabulary.mastery_level
+            )
+            .join(VocabularyWord, VocabularyWord.id == StudentVocabulary.word_id)
+            .where(
+                StudentVocabulary.student_id == student_id,
+                StudentVocabulary.next_review <= datetime.now(timezone.utc)
+            )
+            .order_by(StudentVocabulary.next_review)
+            .limit(limit)
+        )
+        return list(result.all())
+    
+    async def record_reviews(self, student_id: int, outcomes: dict[int, int]):
+        """Apply a batch of review outcomes ({word_id: quality 0-5}) with SM-2.
+        
+        Words the student has never seen are ignored; they enter the schedule
+        through the vocabulary extractor.
+        """
+        if not outcomes:
+            return
+        
+        result = await self.db.execute(
+            select(
+                StudentVocabulary.id,
+                StudentVocabulary.word_id,
+                StudentVocabulary.mastery_level,
+                StudentVocabulary.ease_factor,
+                StudentVocabulary.interval_days,
+                StudentVocabulary.times_seen,
+                StudentVocabulary.times_correct,
+                StudentVocabulary.is_learned
+            )
+            .where(
+                StudentVocabulary.student_id == student_id,
+                StudentVocabulary.word_id.in_(outcomes.keys())
+            )
+        )
+        
+        now = datetime.now(timezone.utc)
+        updates = []
+        learned_changed = False
+        for row in result.all():
+            quality = outcomes[row.word_id]
+            # mastery_level doubles as the SM-2 repetition count; capping it at 5
+            # is harmless because only 0, 1 and >= 2 change the schedule
+            repetitions, ease_factor, interval_days = sm2_review(
+                quality,
+                row.mastery_level or 0,
+                row.ease_factor or 2.5,
+                row.interval_days or 0
+            )
+            mastery_level = min(5, repetitions)
+            updates.append({
+                "id": row.id,
+                "mastery_level": mastery_level,
+                "ease_factor": ease_factor,
+                "interval_days": interval_days,
+                "times_seen": (row.times_seen or 0) + 1,
+                "times_correct": (row.times_correct or 0) + (1 if quality >= 3 else 0),
+                "last_practiced": now,
+                "next_review": now + timedelta(days=interval_days),
+                "is_learned": mastery_level >= LEARNED_MASTERY
+            })
+            learned_changed |= bool(row.is_learned) != (mastery_level >= LEARNED_MASTERY)
+        
+        if updates:
+            # Bulk UPDATE by primary key (executemany)
+            await self.db.execute(update(StudentVocabulary), updates)
+            if learned_changed:
+                # Recounted rather than incremented, so concurrent reviews can't make it drift
+                await self.db.execute(
+                    update(Student)
+                    .where(Student.id == student_id)
+                    .values(words_learned=(
+                        select(func.count(StudentVocabulary.id))
+                        .where(
+                            StudentVocabulary.student_id == student_id,
+                            StudentVocabulary.is_learned.is_(True)
+                        )
+                        .scalar_subquery()
+                    ))
+                )
+            await self.db.commit()
+            logger.info(f"Recorded {len(updates)} vocabulary reviews for student {student_id}")
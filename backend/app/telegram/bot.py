@@ -1,7 +1,9 @@
 import logging
-from telegram.ext import Application, ApplicationBuilder
+from telegram import Bot, Update
+from telegram.ext import Application, ApplicationBuilder, ExtBot
 from app.config import get_settings
-from app.telegram.handlers import setup_handlers
+from app.telegram.handlers import setup_handlers, turn_queue
+from app.telegram.rate_limiter import PriorityRateLimiter
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
@@ -9,6 +11,16 @@ logger = logging.getLogger(__name__)
 _application: Application | None = None
 
 
+def _create_rate_limiter() -> PriorityRateLimiter:
+    return PriorityRateLimiter(
+        global_rate=settings.telegram_global_rate,
+        chat_rate=settings.telegram_chat_rate,
+        chat_burst=settings.telegram_chat_burst,
+        max_retries=settings.telegram_send_max_retries,
+        interactive_reserve=settings.telegram_interactive_reserve
+    )
+
+
 def create_bot() -> Application:
     """Create and configure the Telegram bot application."""
     global _application
@@ -21,6 +33,10 @@ def create_bot() -> Application:
     _application = (
         ApplicationBuilder()
         .token(settings.telegram_bot_token)
+        .base_url(f"{settings.telegram_api_url}/bot")
+        .base_file_url(f"{settings.telegram_api_url}/file/bot")
+        .concurrent_updates(settings.telegram_concurrent_updates)
+        .rate_limiter(_create_rate_limiter())
         .build()
     )
     
@@ -31,14 +47,68 @@ def create_bot() -> Application:
     return _application
 
 
-async def start_bot():
-    """Start the bot polling."""
+def create_standalone_bot() -> Bot:
+    """A Bot client outside the application, for code that only talks to the API."""
+    return Bot(
+        settings.telegram_bot_token,
+        base_url=f"{settings.telegram_api_url}/bot",
+        base_file_url=f"{settings.telegram_api_url}/file/bot"
+    )
+
+
+def create_rate_limited_bot() -> ExtBot:
+    """A rate-limited Bot client for processes that send without running the application."""
+    return ExtBot(
+        settings.telegram_bot_token,
+        base_url=f"{settings.telegram_api_url}/bot",
+        base_file_url=f"{settings.telegram_api_url}/file/bot",
+        rate_limiter=_create_rate_limiter()
+    )
+
+
+def get_application() -> Application | None:
+    """The running bot application, if any."""
+    return _application
+
+
+def webhook_url() -> str:
+    return f"{settings.api_url}/telegram/webhook/{settings.telegram_webhook_secret}"
+
+
+async def register_webhook(bot: Bot | None = None):
+    """Point Telegram at our webhook route. Idempotent, so every worker can call it."""
+    if not settings.telegram_webhook_secret:
+        raise ValueError("TELEGRAM_WEBHOOK_SECRET is required in webhook mode")
+    
+    if bot is None:
+        async with create_standalone_bot() as standalone_bot:
+            return await register_webhook(standalone_bot)
+    
+    await bot.set_webhook(
+        url=webhook_url(),
+        secret_token=settings.telegram_webhook_secret,
+        allowed_updates=Update.ALL_TYPES,
+        drop_pending_updates=False
+    )
+
+
+async def start_bot(receive_updates: bool = True):
+    """Start the bot, receiving updates by polling or through the webhook route.
+    
+    With receive_updates=False the application only processes updates it is
+    handed (e.g. from the update stream).
+    """
     app = create_bot()
     
-    logger.info("Starting Telegram bot...")
+    logger.info(f"Starting Telegram bot ({settings.telegram_mode if receive_updates else 'stream'})...")
     await app.initialize()
     await app.start()
-    await app.updater.start_polling(drop_pending_updates=True)
+    
+    if receive_updates and settings.telegram_mode == "webhook":
+        await register_webhook(app.bot)
+    elif receive_updates:
+        # Updates queued while we were down are delivered; replays are deduplicated
+        await app.updater.start_polling(drop_pending_updates=False)
     logger.info("Telegram bot started successfully")
 
 
@@ -48,7 +118,9 @@ async def stop_bot():
     
     if _application:
         logger.info("Stopping Telegram bot...")
-        await _application.updater.stop()
+        if _application.updater.running:
+            await _application.updater.stop()
+        await turn_queue.close()
         await _application.stop()
         await _application.shutdown()
         _application = None
@@ -0,0 +1,108 @@
+"""Send queued broadcasts to their students.
+
+Recipients are read in pages of `broadcast_batch_size` by ascending student id,
+so memory stays flat however large the audience is. Each page is sent through the
+bot's rate limiter at background priority and then checkpointed together with
+its counters; an interrupted run resumes after the last checkpoint, resending at
+most one page. Broadcasts run in the API leader, usually not a bot process, but
+the limiter's global budget is shared through Redis: they take tokens only while
+the interactive reserve is left for the bot workers' replies.
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from telegram import Bot
+from telegram.error import Forbidden, TelegramError
+from app.config import get_settings
+from app.database import AsyncSessionLocal
+from app.metrics import metrics
+from app.services.broadcast_service import BroadcastService, render_template
+from app.telegram.bot import create_rate_limited_bot, get_application
+from app.telegram.rate_limiter import PRIORITY_BACKGROUND
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def _sending_bot():
+    """The running application's bot when this process has one, else a rate-limited client.
+    
+    Either way sends draw on the same Redis-backed global budget as the bot workers.
+    """
+    application = get_application()
+    if application is not None and application.running:
+        yield application.bot
+        return
+    async with create_rate_limited_bot() as bot:
+        yield bot
+
+
+async def _send(bot: Bot, telegram_id: int, text: str) -> str:
+    """Returns "sent", "blocked" or "failed"."""
+    try:
+        await bot.send_message(
+            chat_id=telegram_id,
+            text=text,
+            rate_limit_args={"priority": PRIORITY_BACKGROUND}
+        )
+        return "sent"
+    except Forbidden:
+        # Blocked the bot or deleted the account
+        return "blocked"
+    except TelegramError as e:
+        logger.warning(f"Broadcast message to {telegram_id} failed: {e}")
+        return "failed"
+
+
+async def run_broadcast(broadcast_id: int, bot: Bot):
+    """Send one broadcast from its checkpoint until done or cancelled."""
+    async with AsyncSessionLocal() as db:
+        service = BroadcastService(db)
+        broadcast = await service.get_broadcast(broadcast_id)
+        if broadcast is None or broadcast.status not in ("pending", "running"):
+            return
+        
+        resumed = broadcast.status == "running"
+        await service.mark_running(broadcast)
+        cursor = broadcast.last_student_id
+        logger.info(f"{'Resuming' if resumed else 'Starting'} broadcast {broadcast_id} after student {cursor}")
+        
+        while True:
+            recipients = await service.get_next_recipients(broadcast, cursor, settings.broadcast_batch_size)
+            if not recipients:
+                await service.mark_completed(broadcast)
+                logger.info(f"Broadcast {broadcast_id} completed")
+                return
+            
+            now = datetime.now(timezone.utc)
+            results = await asyncio.gather(*(
+                _send(bot, recipient.telegram_id, render_template(broadcast.template, recipient, now))
+                for recipient in recipients
+            ))
+            
+            blocked_ids = [r.id for r, result in zip(recipients, results) if result == "blocked"]
+            sent = results.count("sent")
+            failed = results.count("failed")
+            metrics.increment("broadcast.sent", sent)
+            metrics.increment("broadcast.failed", failed)
+            metrics.increment("broadcast.blocked", len(blocked_ids))
+            
+            cursor = recipients[-1].id
+            status = await service.save_checkpoint(broadcast, cursor, sent, failed, blocked_ids)
+            if status == "cancelled":
+                logger.info(f"Broadcast {broadcast_id} cancelled after student {cursor}")
+                return
+
+
+async def run_pending_broadcasts():
+    """Run queued and interrupted broadcasts one after another, oldest first."""
+    async with AsyncSessionLocal() as db:
+        broadcast_ids = await BroadcastService(db).get_runnable_ids()
+    if not broadcast_ids:
+        return
+    
+    async with _sending_bot() as bot:
+        for broadcast_id in broadcast_ids:
+            await run_broadcast(broadcast_id, bot)
@@ -0,0 +1,75 @@
+import logging
+from collections import OrderedDict
+from redis.asyncio import Redis
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+from app.config import get_settings
+from app.metrics import metrics
+from app.redis_client import redis_client
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "tg:seen"
+LOCAL_CAPACITY = 10000
+
+
+class UpdateDeduplicator:
+    """Remembers which Telegram updates were already handled.
+    
+    Keys are claimed with Redis SET NX EX so every instance shares them; if Redis
+    is unreachable a bounded in-process LRU is used instead.
+    """
+    
+    def __init__(self, redis: Redis = redis_client, capacity: int = LOCAL_CAPACITY):
+        self.redis = redis
+        self.capacity = capacity
+        self._local: OrderedDict[str, None] = OrderedDict()
+    
+    @staticmethod
+    def keys_for(update: Update) -> list[str]:
+        keys = [f"{KEY_PREFIX}:update:{update.update_id}"]
+        # Message ids are only unique per chat; the same message can come back
+        # under a new update_id after offsets are reset
+        if update.message:
+            keys.append(f"{KEY_PREFIX}:message:{update.message.chat_id}:{update.message.message_id}")
+        return keys
+    
+    def _claim_local(self, keys: list[str]) -> bool:
+        duplicate = any(key in self._local for key in keys)
+        for key in keys:
+            self._local[key] = None
+            self._local.move_to_end(key)
+        while len(self._local) > self.capacity:
+            self._local.popitem(last=False)
+        return not duplicate
+    
+    async def claim(self, update: Update) -> bool:
+        """Mark the update as handled. Returns False if it was handled before."""
+        keys = self.keys_for(update)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for key in keys:
+                pipe.set(key, 1, nx=True, ex=settings.update_dedupe_ttl_seconds)
+            claimed = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Dedupe store unavailable, using local cache: {e}")
+            return self._claim_local(keys)
+        
+        # Also consult the local cache, which covers updates seen while Redis was down
+        claimed_locally = self._claim_local(keys)
+        return all(claimed) and claimed_locally
+
+
+deduplicator = UpdateDeduplicator()
+
+
+async def drop_duplicate_updates(update: object, context: ContextTypes.DEFAULT_TYPE):
+    """Runs before every other handler; stops updates that were already processed."""
+    if not isinstance(update, Update):
+        return
+    
+    if not await deduplicator.claim(update):
+        metrics.increment("telegram.duplicate_updates")
+        logger.info(f"Skipping duplicate update {update.update_id}")
+        raise ApplicationHandlerStop
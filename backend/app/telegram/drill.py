@@ -0,0 +1,255 @@
+"""/drill: quick vocabulary quizzes answered with inline buttons or typed words.
+
+Exercises are built and graded locally; the only external call is synthesizing a
+pronunciation clip the first time a word is requested (then reused by file_id).
+The drill lives in Redis, keyed by telegram_id, so whichever bot worker gets the
+next answer can grade it; its results are saved in one batch at the end.
+"""
+import io
+import json
+import logging
+import time
+from datetime import timedelta
+from redis.asyncio import Redis
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+from telegram.helpers import escape_markdown
+from app.config import get_settings
+from app.database import AsyncSessionLocal
+from app.redis_client import redis_client
+from app.services import StudentService, SpeechService
+from app.services.audio_cache import audio_cache
+from app.services.drill_service import DrillService, grade_choice, grade_typing
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+speech_service = SpeechService()
+
+KEY_PREFIX = "drill:session"
+# Kept well past drill_timeout_minutes so an abandoned drill's answers are still saved
+SESSION_TTL = timedelta(days=1)
+
+
+class DrillSessions:
+    """Running drills, one JSON document per student."""
+    
+    def __init__(self, redis: Redis = redis_client):
+        self.redis = redis
+    
+    @staticmethod
+    def _key(telegram_id: int) -> str:
+        return f"{KEY_PREFIX}:{telegram_id}"
+    
+    @staticmethod
+    def _load(data: bytes | None) -> dict | None:
+        if not data:
+            return None
+        session = json.loads(data)
+        # JSON object keys are strings; outcomes are keyed by word id
+        session["outcomes"] = {int(word_id): quality for word_id, quality in session["outcomes"].items()}
+        return session
+    
+    async def get(self, telegram_id: int) -> dict | None:
+        try:
+            return self._load(await self.redis.get(self._key(telegram_id)))
+        except Exception as e:
+            # Every text message checks for a drill; don't lose it to a Redis outage
+            logger.warning(f"Drill session lookup failed for {telegram_id}: {e}")
+            return None
+    
+    async def set(self, telegram_id: int, session: dict):
+        await self.redis.set(self._key(telegram_id), json.dumps(session), ex=SESSION_TTL)
+    
+    async def pop(self, telegram_id: int) -> dict | None:
+        try:
+            return self._load(await self.redis.getdel(self._key(telegram_id)))
+        except Exception as e:
+            logger.warning(f"Drill session removal failed for {telegram_id}: {e}")
+            return None
+
+
+drill_sessions = DrillSessions()
+
+
+def _is_active(session: dict | None) -> bool:
+    """Whether the drill is running, i.e. exists and wasn't abandoned."""
+    return bool(session) and time.time() - session["last_activity"] <= settings.drill_timeout_minutes * 60
+
+
+def _render(session: dict) -> tuple[str, InlineKeyboardMarkup]:
+    index = session["index"]
+    exercise = session["exercises"][index]
+    header = f"🧠 *Práctica {index + 1}/{len(session['exercises'])}*\n\n"
+    
+    if exercise["kind"] == "choice":
+        phonetic = f" {escape_markdown(exercise['phonetic'])}" if exercise["phonetic"] else ""
+        text = header + f"¿Qué significa *{escape_markdown(exercise['word'])}*{phonetic}?"
+        keyboard = [
+            [InlineKeyboardButton(option, callback_data=f"drill:a:{index}:{i}")]
+            for i, option in enumerate(exercise["options"])
+        ]
+        keyboard.append([
+            InlineKeyboardButton("🔊 Escuchar", callback_data=f"drill:p:{index}"),
+            InlineKeyboardButton("⏹ Terminar", callback_data="drill:x")
+        ])
+    else:
+        text = header + f"✍️ Escribe en inglés: *{escape_markdown(exercise['translation'])}*"
+        keyboard = [[InlineKeyboardButton("⏹ Terminar", callback_data="drill:x")]]
+    
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+def _feedback(exercise: dict, quality: int) -> str:
+    if quality >= 3:
+        return "✅ ¡Correcto!"
+    return f"❌ Era: *{escape_markdown(exercise['word'])}* = {escape_markdown(exercise['translation'])}"
+
+
+async def _save(telegram_id: int, session: dict):
+    """Write the drill's outcomes in one batch."""
+    if not session["outcomes"]:
+        return
+    try:
+        async with AsyncSessionLocal() as db:
+            await DrillService(db).save_results(
+                session["student_id"], session["exercises"], session["outcomes"]
+            )
+    except Exception as e:
+        logger.error(f"Error saving drill results for {telegram_id}: {e}")
+
+
+async def _advance(update: Update, context: ContextTypes.DEFAULT_TYPE, session: dict):
+    """Send the next exercise or, after the last one, save and show the summary."""
+    session["index"] += 1
+    session["last_activity"] = time.time()
+    chat = update.effective_chat
+    
+    if session["index"] < len(session["exercises"]):
+        await drill_sessions.set(update.effective_user.id, session)
+        text, keyboard = _render(session)
+        await chat.send_message(text, parse_mode="Markdown", reply_markup=keyboard)
+        return
+    
+    await drill_sessions.pop(update.effective_user.id)
+    await _save(update.effective_user.id, session)
+    total = len(session["outcomes"])
+    await chat.send_message(
+        f"🏁 *¡Práctica terminada!*\n\n"
+        f"Aciertos: {session['correct']}/{total}\n\n"
+        "Usa /drill para otra ronda o escríbeme para seguir la lección.",
+        parse_mode="Markdown"
+    )
+
+
+async def drill_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /drill command."""
+    user = update.effective_user
+    
+    # Keep whatever was answered in a previous, unfinished drill
+    previous = await drill_sessions.pop(user.id)
+    if previous:
+        await _save(user.id, previous)
+    
+    async with AsyncSessionLocal() as db:
+        student, _ = await StudentService(db).get_or_create_student(
+            telegram_id=user.id,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            username=user.username
+        )
+        await db.commit()
+        exercises = await DrillService(db).build_drill(student.id)
+    
+    if not exercises:
+        await update.message.reply_text(
+            "Todavía no hay vocabulario para practicar. ¡Escríbeme para empezar una lección!"
+        )
+        return
+    
+    session = {
+        "student_id": student.id,
+        "exercises": exercises,
+        "index": 0,
+        "outcomes": {},
+        "correct": 0,
+        "last_activity": time.time()
+    }
+    await drill_sessions.set(user.id, session)
+    
+    text, keyboard = _render(session)
+    await update.message.reply_text(text, parse_mode="Markdown", reply_markup=keyboard)
+
+
+async def drill_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle inline button presses of a drill (answer, listen, stop)."""
+    query = update.callback_query
+    parts = query.data.split(":")
+    
+    if parts[1] == "x":
+        await query.answer()
+        session = await drill_sessions.pop(update.effective_user.id)
+        if session:
+            await _save(update.effective_user.id, session)
+        await query.edit_message_reply_markup(reply_markup=None)
+        await query.message.reply_text("Práctica terminada. ¡Buen trabajo! 💪")
+        return
+    
+    index = int(parts[2])
+    session = await drill_sessions.get(update.effective_user.id)
+    if not _is_active(session) or index != session["index"]:
+        await query.answer("Este ejercicio ya no está activo. Usa /drill para empezar otro.")
+        return
+    exercise = session["exercises"][index]
+    
+    if parts[1] == "p":
+        await query.answer()
+        await send_pronunciation(update, context, exercise["word"])
+        return
+    
+    quality = grade_choice(exercise, int(parts[3]))
+    session["outcomes"][exercise["word_id"]] = quality
+    session["correct"] += quality >= 3
+    await query.answer()
+    question, _ = _render(session)
+    await query.edit_message_text(f"{question}\n\n{_feedback(exercise, quality)}", parse_mode="Markdown")
+    await _advance(update, context, session)
+
+
+async def handle_drill_answer(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    """Grade a typed answer if a typing exercise is waiting. Returns True if handled."""
+    session = await drill_sessions.get(update.effective_user.id)
+    if session is None:
+        return False
+    if not _is_active(session):
+        abandoned = await drill_sessions.pop(update.effective_user.id)
+        if abandoned:
+            await _save(update.effective_user.id, abandoned)
+        return False
+    
+    exercise = session["exercises"][session["index"]]
+    if exercise["kind"] != "typing":
+        return False
+    
+    quality = grade_typing(exercise["word"], update.message.text)
+    session["outcomes"][exercise["word_id"]] = quality
+    session["correct"] += quality >= 3
+    await update.message.reply_text(_feedback(exercise, quality), parse_mode="Markdown")
+    await _advance(update, context, session)
+    return True
+
+
+async def send_pronunciation(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
+    """Send a voice clip for the text, synthesizing it only if it was never sent before."""
+    chat = update.effective_chat
+    file_id = await audio_cache.get(text)
+    if file_id:
+        await chat.send_voice(voice=file_id)
+        return
+    
+    try:
+        await chat.send_action("record_voice")
+        audio_bytes = await speech_service.text_to_speech(text)
+        message = await chat.send_voice(voice=io.BytesIO(audio_bytes))
+        await audio_cache.set(text, message.voice.file_id)
+    except Exception as e:
+        logger.error(f"Error generating pronunciation for '{text}': {e}")
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import io
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -6,12 +7,18 @@ from telegram.ext import (
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
+    TypeHandler,
     ContextTypes,
     filters
 )
 from app.database import AsyncSessionLocal
-from app.services import StudentService, LessonService, SpeechService
+from app.services import StudentService, LessonService, SpeechService, VocabularyService, MemoryService
+from app.services.vocabulary_service import format_due_words
 from app.agent import get_tutor_response
+from app.telegram.drill import drill_command, drill_callback, handle_drill_answer
+from app.telegram.turn_queue import TurnQueue, PendingMessage
+from app.telegram.rate_limiter import PRIORITY_BACKGROUND
+from app.telegram.dedupe import drop_duplicate_updates
 from app.config import get_settings
 
 settings = get_settings()
@@ -73,6 +80,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/progress - Ver tu progreso detallado\n"
         "/level - Ver información de tu nivel actual\n"
         "/panel - Obtener enlace a tu panel de progreso\n"
+        "/drill - Práctica rápida de vocabulario\n"
         "/help - Mostrar esta ayuda\n\n"
         "💡 *Consejos:*\n"
         "• Puedes enviarme texto o notas de voz\n"
@@ -168,13 +176,19 @@ async def panel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
-async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle text messages."""
-    user = update.effective_user
-    user_message = update.message.text
-    
-    # Send typing action
-    await update.message.chat.send_action("typing")
+async def _recall_memories(student_id: int, query: str) -> list[str]:
+    """MemoryService.recall on its own session, so it can run alongside the turn's queries."""
+    async with AsyncSessionLocal() as db:
+        return await MemoryService(db).recall(student_id, query)
+
+
+async def process_turn(telegram_id: int, batch: list[PendingMessage]):
+    """Answer a burst of student messages with a single tutor turn."""
+    user = batch[-1].user
+    reply_to = batch[-1].message
+    user_message = "\n".join(item.text for item in batch)
+    audio_file_ids = [item.audio_file_id for item in batch if item.audio_file_id]
+    new_level = None
     
     async with AsyncSessionLocal() as db:
         student_service = StudentService(db)
@@ -187,19 +201,36 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
             last_name=user.last_name,
             username=user.username
         )
-        logger.info(f"Text handler - Student {'created' if is_new else 'found'}: {student.id} (telegram_id: {user.id})")
+        logger.info(f"Turn - Student {'created' if is_new else 'found'}: {student.id} (telegram_id: {user.id}, messages: {len(batch)})")
         
         # Ensure student is committed to database
         await db.commit()
         
-        # Get or create active lesson
-        lesson = await lesson_service.get_or_create_active_lesson(student)
-        
-        # Save user message
-        await lesson_service.add_message(lesson, "user", user_message)
+        # Earlier lessons related to what the student just said; the embedding call
+        # runs while the lesson and due words load
+        recall = asyncio.create_task(_recall_memories(student.id, user_message))
+        try:
+            # Get or create active lesson
+            lesson = await lesson_service.get_or_create_active_lesson(student)
+            
+            # Save every user message as it was sent
+            for item in batch:
+                await lesson_service.add_message(
+                    lesson, "user", item.text, audio_file_id=item.audio_file_id
+                )
+            
+            # Words due for spaced-repetition review this turn
+            vocabulary_service = VocabularyService(db)
+            await vocabulary_service.refresh_matcher()
+            due_words = await vocabulary_service.get_due_words(student.id)
+        except BaseException:
+            # Don't leave the recall (its session and embedding call) running unobserved
+            recall.cancel()
+            raise
+        memories = await recall
         
         # Get AI response
-        response, evaluation = await get_tutor_response(
+        response, evaluation, vocabulary = await get_tutor_response(
             telegram_id=user.id,
             student_id=student.id,
             student_name=student.first_name,
@@ -209,36 +240,86 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
             streak_days=student.streak_days,
             user_input=user_message,
             lesson_id=lesson.id,
-            is_new_student=is_new
+            is_audio=bool(audio_file_ids),
+            audio_file_id=audio_file_ids[-1] if audio_file_ids else None,
+            is_new_student=is_new,
+            words_learned=student.words_learned,
+            due_words=format_due_words(due_words),
+            lesson_evaluation=lesson.ai_evaluation,
+            memories=memories
         )
         
         # Save assistant message
         await lesson_service.add_message(lesson, "assistant", response)
         
+        # Record vocabulary taught/used; due words the student used count as recalled
+        reviewed = {word.word_id: 4 for word in due_words if word.word_id in vocabulary["used"]}
+        await vocabulary_service.record_exposures(
+            student.id,
+            taught=vocabulary["taught"],
+            seen=[w for w in vocabulary["seen"] if w not in reviewed],
+            used=[w for w in vocabulary["used"] if w not in reviewed]
+        )
+        await vocabulary_service.record_reviews(student.id, reviewed)
+        
         # Handle evaluation if present
         if evaluation:
             await lesson_service.update_lesson_evaluation(lesson, evaluation)
             await student_service.update_skill_scores(student, evaluation)
-            
-            # Check for level up
+        
+        # Check for level up (in batch mode skill scores change overnight, between turns)
+        if evaluation or settings.evaluation_mode == "batch":
             new_level = await student_service.check_level_up(student)
-            if new_level:
-                response += f"\n\n🎉 ¡Felicidades! ¡Has subido a *{new_level.name}*!"
     
     # Send text response first
-    await update.message.reply_text(response, parse_mode="Markdown")
+    await reply_to.reply_text(response, parse_mode="Markdown")
     
     # Then generate and send audio response
     try:
-        await update.message.chat.send_action("record_voice")
+        await reply_to.chat.send_action("record_voice")
         audio_bytes = await speech_service.text_to_speech(response)
         
         # Send audio
-        await update.message.reply_voice(voice=io.BytesIO(audio_bytes))
-            
+        await reply_to.reply_voice(voice=io.BytesIO(audio_bytes))
+    
     except Exception as e:
         logger.error(f"Error generating audio: {e}")
         # Text already sent, just log the error
+    
+    # Not part of the answer, so it queues behind other students' replies
+    if new_level:
+        try:
+            await reply_to.chat.send_message(
+                f"🎉 ¡Felicidades! ¡Has subido a *{new_level.name}*!",
+                parse_mode="Markdown",
+                rate_limit_args={"priority": PRIORITY_BACKGROUND}
+            )
+        except Exception as e:
+            logger.error(f"Error sending level up notice to {telegram_id}: {e}")
+
+
+turn_queue = TurnQueue(
+    process_turn,
+    debounce_seconds=settings.turn_debounce_seconds,
+    max_wait_seconds=settings.turn_max_wait_seconds,
+    concurrency=settings.turn_concurrency
+)
+
+
+async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle text messages."""
+    user = update.effective_user
+    user_message = update.message.text
+    
+    # Typed answers to a /drill exercise are graded locally
+    if await handle_drill_answer(update, context):
+        return
+    
+    # Send typing action
+    await update.message.chat.send_action("typing")
+    
+    # Answered once the student pauses, together with any follow-up messages
+    turn_queue.submit(user.id, PendingMessage(update.message, user, user_message))
 
 
 async def handle_voice_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -262,7 +343,7 @@ async def handle_voice_message(update: Update, context: ContextTypes.DEFAULT_TYP
             f"🎤 _Escuché: \"{user_message}\"_",
             parse_mode="Markdown"
         )
-        
+    
     except Exception as e:
         logger.error(f"Error processing voice: {e}")
         await update.message.reply_text(
@@ -270,73 +351,10 @@ async def handle_voice_message(update: Update, context: ContextTypes.DEFAULT_TYP
         )
         return
     
-    async with AsyncSessionLocal() as db:
-        student_service = StudentService(db)
-        lesson_service = LessonService(db)
-        
-        # Get or create student
-        student, is_new = await student_service.get_or_create_student(
-            telegram_id=user.id,
-            first_name=user.first_name,
-            last_name=user.last_name,
-            username=user.username
-        )
-        logger.info(f"Voice handler - Student {'created' if is_new else 'found'}: {student.id} (telegram_id: {user.id})")
-        
-        # Ensure student is committed to database
-        await db.commit()
-        
-        # Get or create active lesson
-        lesson = await lesson_service.get_or_create_active_lesson(student)
-        
-        # Save user message
-        await lesson_service.add_message(
-            lesson, "user", user_message, audio_file_id=voice.file_id
-        )
-        
-        # Get AI response
-        response, evaluation = await get_tutor_response(
-            telegram_id=user.id,
-            student_id=student.id,
-            student_name=student.first_name,
-            current_level=student.current_level.code,
-            current_level_id=student.current_level_id,
-            total_lessons=student.total_lessons,
-            streak_days=student.streak_days,
-            user_input=user_message,
-            lesson_id=lesson.id,
-            is_audio=True,
-            audio_file_id=voice.file_id,
-            is_new_student=is_new
-        )
-        
-        # Save assistant message
-        await lesson_service.add_message(lesson, "assistant", response)
-        
-        # Handle evaluation if present
-        if evaluation:
-            await lesson_service.update_lesson_evaluation(lesson, evaluation)
-            await student_service.update_skill_scores(student, evaluation)
-            
-            # Check for level up
-            new_level = await student_service.check_level_up(student)
-            if new_level:
-                response += f"\n\n🎉 ¡Felicidades! ¡Has subido a *{new_level.name}*!"
-    
-    # Send text response first
-    await update.message.reply_text(response, parse_mode="Markdown")
-    
-    # Then generate and send audio response
-    try:
-        await update.message.chat.send_action("record_voice")
-        audio_bytes = await speech_service.text_to_speech(response)
-        
-        # Send audio
-        await update.message.reply_voice(voice=io.BytesIO(audio_bytes))
-            
-    except Exception as e:
-        logger.error(f"Error generating audio: {e}")
-        # Text already sent, just log the error
+    turn_queue.submit(
+        user.id,
+        PendingMessage(update.message, user, user_message, audio_file_id=voice.file_id)
+    )
 
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -351,12 +369,19 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 def setup_handlers(app: Application):
     """Setup all handlers for the bot."""
+    # Replayed updates are dropped before any handler runs
+    app.add_handler(TypeHandler(Update, drop_duplicate_updates), group=-1)
+    
     # Command handlers
     app.add_handler(CommandHandler("start", start_command))
     app.add_handler(CommandHandler("help", help_command))
     app.add_handler(CommandHandler("progress", progress_command))
     app.add_handler(CommandHandler("level", level_command))
     app.add_handler(CommandHandler("panel", panel_command))
+    app.add_handler(CommandHandler("drill", drill_command))
+    
+    # Inline keyboard handlers
+    app.add_handler(CallbackQueryHandler(drill_callback, pattern=r"^drill:"))
     
     # Message handlers
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text_message))
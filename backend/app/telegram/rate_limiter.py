@@ -0,0 +1,259 @@
+"""Outbound rate limiting for Bot API calls, with interactive traffic first.
+
+Every send goes through a per-chat token bucket (Telegram tolerates about one
+message per second per chat with short bursts) and then through a global bucket
+(about 30 messages per second per bot). The global bucket lives in Redis, so
+every process sending as the bot (the bot workers, the API leader running
+broadcasts) shares one budget. Within a process, requests waiting for a global
+token are granted in priority order; across processes, background requests only
+get a token while `interactive_reserve` more are left, so replies to students
+overtake background traffic such as broadcasts wherever it runs. A RetryAfter
+from Telegram pauses all sending, in every process, for the requested time before
+the request is retried. If Redis is unreachable each process falls back to its
+own bucket.
+
+Background senders pass `rate_limit_args={"priority": PRIORITY_BACKGROUND}`.
+"""
+import asyncio
+import itertools
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Callable, Coroutine
+from telegram.error import RetryAfter
+from redis.asyncio import Redis
+from telegram.ext import BaseRateLimiter
+from app.config import get_settings
+from app.metrics import metrics
+from app.redis_client import redis_client
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+GLOBAL_BUCKET_KEY = "tg:ratelimit:global"
+PAUSE_KEY = "tg:ratelimit:paused"
+
+# Refill the shared bucket and take a token if at least ARGV[3] are available.
+# Returns the seconds to wait before asking again (0 when a token was taken), as
+# a string because Lua numbers come back truncated to integers.
+TAKE_TOKEN = """
+local pause_ms = redis.call('pttl', KEYS[2])
+if pause_ms > 0 then
+    return tostring(pause_ms / 1000)
+end
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local needed = tonumber(ARGV[3])
+local clock = redis.call('time')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('hmget', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= needed then
+    tokens = tokens - 1
+else
+    wait = (needed - tokens) / rate
+end
+redis.call('hset', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('expire', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+# Calls that do not send anything to a chat are not limited
+UNLIMITED_ENDPOINTS = {
+    "getMe", "getUpdates", "getFile", "getWebhookInfo", "setWebhook", "deleteWebhook",
+    "getMyCommands", "setMyCommands", "close", "logOut"
+}
+# Not messages: only count against the global budget
+GLOBAL_ONLY_ENDPOINTS = {"sendChatAction", "answerCallbackQuery"}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def delay(self, needed: float = 1) -> float:
+        """Seconds until `needed` tokens are available (0 if they are now)."""
+        self._refill()
+        return 0.0 if self.tokens >= needed else (needed - self.tokens) / self.rate
+    
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+    
+    @property
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class PriorityRateLimiter(BaseRateLimiter[dict]):
+    def __init__(
+        self,
+        global_rate: float = 30,
+        chat_rate: float = 1,
+        chat_burst: float = 3,
+        max_retries: int = 3,
+        interactive_reserve: float = 5,
+        redis: Redis = redis_client
+    ):
+        self.global_rate = global_rate
+        # Fallback while Redis is unreachable
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.interactive_reserve = interactive_reserve
+        self.redis = redis
+        self._take_token = redis.register_script(TAKE_TOKEN)
+        self._redis_failed = False
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._chat_buckets: dict[int | str, TokenBucket] = {}
+        self._chat_locks: dict[int | str, asyncio.Lock] = {}
+        self._waiting: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._sequence = itertools.count()
+        self._resume_at = 0.0
+        self._dispatcher: asyncio.Task | None = None
+    
+    async def initialize(self):
+        self._dispatcher = asyncio.create_task(self._dispatch(), name="telegram-rate-limiter")
+    
+    async def shutdown(self):
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+    
+    async def _take_global(self, priority: int) -> float:
+        """Take a global token; returns 0, or the seconds to wait before trying again."""
+        pause = self._resume_at - time.monotonic()
+        if pause > 0:
+            return pause
+        # Background sends leave a reserve for replies, including other processes' replies
+        needed = 1 if priority <= PRIORITY_INTERACTIVE else 1 + self.interactive_reserve
+        try:
+            delay = float(await self._take_token(
+                keys=[GLOBAL_BUCKET_KEY, PAUSE_KEY],
+                args=[self.global_rate, self.global_rate, needed]
+            ))
+            if self._redis_failed:
+                self._redis_failed = False
+                logger.info("Shared Telegram rate limit available again")
+            return delay
+        except Exception as e:
+            if not self._redis_failed:
+                self._redis_failed = True
+                logger.warning(f"Shared Telegram rate limit unavailable, limiting this process only: {e}")
+            metrics.increment("telegram.rate_limit_fallbacks")
+        
+        delay = self.global_bucket.delay(needed)
+        if delay <= 0:
+            self.global_bucket.take()
+        return delay
+    
+    async def _dispatch(self):
+        """Hand out global tokens at the shared rate, highest priority first."""
+        while True:
+            request = await self._waiting.get()
+            priority, _, granted = request
+            if granted.done():
+                continue  # The sender gave up (cancelled)
+            delay = await self._take_global(priority)
+            if delay > 0:
+                # Back in the queue, so a higher priority request arriving meanwhile goes first
+                await self._waiting.put(request)
+                if priority > PRIORITY_INTERACTIVE:
+                    # Waiting out the reserve can take a while; check for replies every token
+                    delay = min(delay, 1 / self.global_rate)
+                await asyncio.sleep(delay)
+                continue
+            granted.set_result(None)
+    
+    async def _wait_for_chat(self, chat_id: int | str):
+        lock = self._chat_locks.setdefault(chat_id, asyncio.Lock())
+        async with lock:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+            delay = bucket.delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            bucket.take()
+        self._prune_chats()
+    
+    def _prune_chats(self):
+        """Forget idle chats so the bucket table does not grow without bound."""
+        if len(self._chat_buckets) < 10000:
+            return
+        for chat_id, bucket in list(self._chat_buckets.items()):
+            lock = self._chat_locks.get(chat_id)
+            if bucket.is_full and not (lock and lock.locked()):
+                self._chat_buckets.pop(chat_id, None)
+                self._chat_locks.pop(chat_id, None)
+    
+    async def _wait_for_global(self, priority: int):
+        granted = asyncio.get_running_loop().create_future()
+        await self._waiting.put((priority, next(self._sequence), granted))
+        await granted
+    
+    async def _pause_everywhere(self, seconds: float):
+        """Make the other processes sending as this bot wait too."""
+        try:
+            # Keeps a longer pause that is already set
+            pause_ms = int(seconds * 1000)
+            if await self.redis.pttl(PAUSE_KEY) < pause_ms:
+                await self.redis.set(PAUSE_KEY, 1, px=pause_ms)
+        except Exception as e:
+            logger.warning(f"Could not share the Telegram rate limit pause: {e}")
+    
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, bool | dict | list[dict]]],
+        args: Any,
+        kwargs: dict[str, Any],
+        endpoint: str,
+        data: dict[str, Any],
+        rate_limit_args: dict | None
+    ) -> bool | dict | list[dict]:
+        if endpoint in UNLIMITED_ENDPOINTS:
+            return await callback(*args, **kwargs)
+        
+        priority = (rate_limit_args or {}).get("priority", PRIORITY_INTERACTIVE)
+        label = "interactive" if priority <= PRIORITY_INTERACTIVE else "background"
+        chat_id = data.get("chat_id")
+        
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            if chat_id is not None and endpoint not in GLOBAL_ONLY_ENDPOINTS:
+                await self._wait_for_chat(chat_id)
+            await self._wait_for_global(priority)
+            metrics.observe(f"telegram.send_wait_seconds.{label}", time.monotonic() - started)
+            
+            try:
+                result = await callback(*args, **kwargs)
+                metrics.increment(f"telegram.sent.{label}")
+                return result
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                metrics.increment("telegram.retry_after")
+                if attempt == self.max_retries:
+                    logger.error(f"Telegram rate limit hit on {endpoint} after {self.max_retries} retries")
+                    raise
+                logger.warning(f"Telegram asked to wait {retry_after}s on {endpoint}; pausing sends")
+                # Stop everyone, not just this request: the limit is per bot
+                self._resume_at = max(self._resume_at, time.monotonic() + float(retry_after) + 0.1)
+                await self._pause_everywhere(float(retry_after) + 0.1)
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+from telegram import Message, User
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ERROR_REPLY = "Lo siento, ocurrió un error. Por favor intenta de nuevo."
+
+
+@dataclass
+class PendingMessage:
+    """A student message waiting to be answered."""
+    message: Message
+    user: User
+    text: str
+    audio_file_id: str | None = None
+
+
+TurnProcessor = Callable[[int, list[PendingMessage]], Awaitable[None]]
+
+
+class TurnQueue:
+    """Per-student queue that merges bursts of messages into a single tutor turn.
+    
+    A turn starts once the student has been quiet for `debounce_seconds` (or the
+    first message has waited `max_wait_seconds`). Messages that arrive while a
+    turn is running are answered together in the next one, so a student never has
+    two turns in flight on the same conversation thread. At most `concurrency`
+    turns run at once across all students.
+    """
+    
+    def __init__(
+        self,
+        process: TurnProcessor,
+        debounce_seconds: float,
+        max_wait_seconds: float,
+        concurrency: int = 20
+    ):
+        self._process = process
+        self._slots = asyncio.Semaphore(concurrency)
+        self.debounce_seconds = debounce_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self._pending: dict[int, list[PendingMessage]] = {}
+        self._arrived: dict[int, asyncio.Event] = {}
+        self._workers: dict[int, asyncio.Task] = {}
+    
+    def submit(self, telegram_id: int, item: PendingMessage):
+        """Queue a message; the turn runs in the background."""
+        self._pending.setdefault(telegram_id, []).append(item)
+        self._arrived.setdefault(telegram_id, asyncio.Event()).set()
+        metrics.increment("turns.messages_received")
+        
+        if telegram_id not in self._workers:
+            self._workers[telegram_id] = asyncio.create_task(
+                self._worker(telegram_id), name=f"turn:{telegram_id}"
+            )
+    
+    async def wait_idle(self, telegram_id: int):
+        """Return once the student has no message queued and no turn running."""
+        while (worker := self._workers.get(telegram_id)) is not None:
+            await asyncio.wait([worker])
+    
+    async def _wait_for_quiet(self, telegram_id: int):
+        """Return once no message arrived for the debounce window (or max wait passed)."""
+        arrived = self._arrived[telegram_id]
+        deadline = time.monotonic() + self.max_wait_seconds
+        while True:
+            arrived.clear()
+            timeout = min(self.debounce_seconds, deadline - time.monotonic())
+            if timeout <= 0:
+                return
+            try:
+                await asyncio.wait_for(arrived.wait(), timeout)
+            except asyncio.TimeoutError:
+                return
+    
+    async def _worker(self, telegram_id: int):
+        try:
+            while self._pending.get(telegram_id):
+                await self._wait_for_quiet(telegram_id)
+                batch = self._pending.pop(telegram_id)
+                
+                metrics.increment("turns.processed")
+                metrics.increment("turns.coalesced_messages", len(batch) - 1)
+                metrics.observe("turns.batch_size", len(batch))
+                if len(batch) > 1:
+                    logger.info(f"Coalesced {len(batch)} messages from {telegram_id} into one turn")
+                
+                waiting_since = time.monotonic()
+                try:
+                    async with self._slots:
+                        metrics.observe("turns.slot_wait_seconds", time.monotonic() - waiting_since)
+                        await self._process(telegram_id, batch)
+                except Exception as e:
+                    logger.error(f"Error processing turn for {telegram_id}: {e}", exc_info=True)
+                    metrics.increment("turns.errors")
+                    await self._apologize(telegram_id, batch)
+        finally:
+            self._workers.pop(telegram_id, None)
+            self._arrived.pop(telegram_id, None)
+    
+    async def _apologize(self, telegram_id: int, batch: list[PendingMessage]):
+        """Tell the student their turn failed (the application error handler never sees it)."""
+        try:
+            await batch[-1].message.reply_text(ERROR_REPLY)
+        except Exception as e:
+            logger.warning(f"Could not send the error reply to {telegram_id}: {e}")
+    
+    async def close(self, timeout: float = 30.0):
+        """Let queued turns finish (up to timeout), then cancel the rest."""
+        workers = list(self._workers.values())
+        if not workers:
+            return
+        _, still_running = await asyncio.wait(workers, timeout=timeout)
+        for task in still_running:
+            task.cancel()
+        await asyncio.gather(*still_running, return_exceptions=True)
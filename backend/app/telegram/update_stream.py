@@ -0,0 +1,402 @@
+"""Sharded Redis Stream between update ingestion and bot workers.
+
+Ingestion (the webhook route or a single poller) appends each update to one of
+`update_stream_partitions` streams, chosen by hash(telegram_id), so a student's
+updates stay in order on a single partition. Bot workers register in a heartbeat
+ZSET and split the partitions with bounded-load rendezvous hashing: every worker
+computes the same owner for each partition from the live worker list, so a
+student stays pinned to one worker (and its in-memory conversation state) until
+workers join or leave.
+
+An entry is acknowledged once the turn it fed has finished, not when the handler
+returns (text turns run later, in the turn queue). Each partition also has a
+lease key in Redis. A worker that loses a partition stops reading it, waits for
+the partition's turns to finish, acks their entries and only then drops the
+lease. Entries it had read but not handled yet stay pending. The new owner waits
+for the lease, claims every pending entry with XAUTOCLAIM (min idle 0) and
+handles those before reading new ones. So a student's turns never run on two
+workers at once, and their order holds across the handoff. If a worker dies, its
+lease expires after stream_worker_ttl_seconds and the same takeover applies.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+import zlib
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+from telegram import Bot, Update
+from telegram.ext import Application, Updater
+from app.config import get_settings
+from app.metrics import metrics
+from app.redis_client import redis_client
+from app.telegram.turn_queue import TurnQueue
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "tg:updates"
+WORKERS_KEY = "tg:workers"
+GROUP = "bot-workers"
+LEASE_PREFIX = "tg:partition_lease"
+LEASE_POLL_SECONDS = 0.2
+
+# Only the holder may extend or delete a lease
+RENEW_LEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_LEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def stream_key(partition: int) -> str:
+    return f"{KEY_PREFIX}:{partition}"
+
+
+def update_owner_id(payload: dict) -> int:
+    """The user (or chat) an update belongs to, used as the shard key."""
+    for field in ("message", "edited_message", "callback_query", "inline_query", "my_chat_member"):
+        item = payload.get(field)
+        if item:
+            sender = item.get("from") or item.get("chat") or {}
+            if sender.get("id"):
+                return sender["id"]
+    return 0
+
+
+def lease_key(partition: int) -> str:
+    return f"{LEASE_PREFIX}:{partition}"
+
+
+def partition_for(telegram_id: int) -> int:
+    return zlib.crc32(str(telegram_id).encode()) % settings.update_stream_partitions
+
+
+def _weight(worker: str, partition: int) -> int:
+    return int.from_bytes(hashlib.blake2b(f"{worker}:{partition}".encode(), digest_size=8).digest(), "big")
+
+
+def assign_partitions(workers: list[str], partitions: int) -> dict[int, str]:
+    """Rendezvous hashing with bounded load.
+    
+    Each partition goes to its highest-weight worker that still has room
+    (ceil(partitions / workers)), so load stays even and only a small share of
+    partitions move when a worker joins or leaves. Every worker computes the same
+    result from the same live worker list.
+    """
+    if not workers:
+        return {}
+    capacity = -(-partitions // len(workers))
+    load = dict.fromkeys(workers, 0)
+    owners = {}
+    for partition in range(partitions):
+        for worker in sorted(workers, key=lambda w: _weight(w, partition), reverse=True):
+            if load[worker] < capacity:
+                owners[partition] = worker
+                load[worker] += 1
+                break
+    return owners
+
+
+async def publish_update(payload: dict, redis: Redis = redis_client) -> str:
+    """Append a raw Telegram update (as received) to its student's partition."""
+    partition = partition_for(update_owner_id(payload))
+    entry_id = await redis.xadd(
+        stream_key(partition),
+        {"update": json.dumps(payload)},
+        maxlen=settings.update_stream_maxlen,
+        approximate=True
+    )
+    metrics.increment("stream.published")
+    return entry_id
+
+
+class StreamPoller:
+    """Long-polls Telegram and publishes updates to the stream instead of handling them."""
+    
+    def __init__(self, bot: Bot):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._updater = Updater(bot=bot, update_queue=self._queue)
+        self._task: asyncio.Task | None = None
+    
+    async def _forward(self):
+        while True:
+            update: Update = await self._queue.get()
+            try:
+                await publish_update(update.to_dict())
+            except Exception as e:
+                # Put it back so the update is not lost while Redis is unavailable
+                logger.error(f"Error publishing update {update.update_id}: {e}")
+                await self._queue.put(update)
+                await asyncio.sleep(1)
+    
+    async def start(self):
+        await self._updater.initialize()
+        await self._updater.start_polling(drop_pending_updates=False)
+        self._task = asyncio.create_task(self._forward(), name="stream-poller")
+        logger.info("Stream poller started")
+    
+    async def stop(self):
+        if self._updater.running:
+            await self._updater.stop()
+        await self._updater.shutdown()
+        # Give the forwarder a moment to publish what was already received
+        deadline = time.monotonic() + 5
+        while not self._queue.empty() and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        logger.info("Stream poller stopped")
+
+
+class StreamConsumer:
+    """Consumes the partitions this worker owns and feeds them to the bot application."""
+    
+    def __init__(self, application: Application, turn_queue: TurnQueue, redis: Redis = redis_client):
+        self.application = application
+        self.turn_queue = turn_queue
+        self.redis = redis
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._partitions: dict[int, asyncio.Task] = {}
+        self._draining: dict[int, asyncio.Task] = {}
+        self._released: set[int] = set()
+        self._leases: set[int] = set()
+        # Per partition, handled entries waiting for their turn to finish before the ack
+        self._unacked: dict[int, set[asyncio.Task]] = {}
+        self._renew_lease = redis.register_script(RENEW_LEASE)
+        self._release_lease = redis.register_script(RELEASE_LEASE)
+        self._stopping = False
+        self._heartbeat_task: asyncio.Task | None = None
+    
+    @property
+    def owned_partitions(self) -> list[int]:
+        return sorted(self._partitions)
+    
+    async def _live_workers(self) -> list[str]:
+        now = time.time()
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.zadd(WORKERS_KEY, {self.worker_id: now})
+        pipe.zremrangebyscore(WORKERS_KEY, "-inf", now - settings.stream_worker_ttl_seconds)
+        pipe.zrange(WORKERS_KEY, 0, -1)
+        _, _, workers = await pipe.execute()
+        return sorted(w.decode() for w in workers)
+    
+    async def _ensure_group(self, partition: int):
+        try:
+            await self.redis.xgroup_create(stream_key(partition), GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+    
+    async def _acquire_lease(self, partition: int) -> bool:
+        """Wait until the previous owner has drained the partition (or its lease expired)."""
+        started = time.monotonic()
+        while partition not in self._released:
+            acquired = await self.redis.set(
+                lease_key(partition), self.worker_id,
+                nx=True, px=settings.stream_worker_ttl_seconds * 1000
+            )
+            if acquired:
+                self._leases.add(partition)
+                metrics.observe("stream.handoff_wait_seconds", time.monotonic() - started)
+                return True
+            await asyncio.sleep(LEASE_POLL_SECONDS)
+        return False
+    
+    async def _renew_leases(self):
+        for partition in list(self._leases):
+            renewed = await self._renew_lease(
+                keys=[lease_key(partition)],
+                args=[self.worker_id, settings.stream_worker_ttl_seconds * 1000]
+            )
+            if not renewed and partition in self._leases:
+                # Expired (e.g. Redis was unreachable) and possibly taken over: stop reading
+                logger.error(f"Lost the lease on partition {partition}")
+                self._leases.discard(partition)
+                self._released.add(partition)
+    
+    async def _ack_after_turn(self, partition: int, entry_id: bytes, telegram_id: int):
+        await self.turn_queue.wait_idle(telegram_id)
+        try:
+            await self.redis.xack(stream_key(partition), GROUP, entry_id)
+        except Exception as e:
+            # Left pending: the next owner claims it and the update dedupe drops it
+            logger.warning(f"Could not ack stream entry {entry_id} on partition {partition}: {e}")
+    
+    async def _process_entries(self, partition: int, entries: list):
+        """Handle entries in order; stops early if the partition was released.
+        
+        Each entry is acked once the student's turn queue is idle, i.e. after the
+        turn it went into. Entries left unhandled stay pending for the next owner.
+        """
+        key = stream_key(partition)
+        unacked = self._unacked.setdefault(partition, set())
+        for entry_id, fields in entries:
+            if partition in self._released:
+                return
+            if not fields:
+                # Trimmed from the stream before anyone handled it
+                await self.redis.xack(key, GROUP, entry_id)
+                continue
+            started = time.monotonic()
+            telegram_id = 0
+            try:
+                payload = json.loads(fields[b"update"])
+                telegram_id = update_owner_id(payload)
+                update = Update.de_json(payload, self.application.bot)
+                await self.application.process_update(update)
+            except Exception as e:
+                logger.error(f"Error processing stream entry {entry_id} on partition {partition}: {e}")
+            ack = asyncio.create_task(self._ack_after_turn(partition, entry_id, telegram_id))
+            unacked.add(ack)
+            ack.add_done_callback(unacked.discard)
+            metrics.increment("stream.processed")
+            metrics.observe("stream.process_seconds", time.monotonic() - started)
+    
+    async def _drain(self, partition: int):
+        """Let the partition's turns finish and ack their entries, then give up the lease."""
+        unacked = self._unacked.pop(partition, set())
+        if unacked:
+            started = time.monotonic()
+            _, late = await asyncio.wait(unacked, timeout=settings.stream_drain_timeout_seconds)
+            metrics.observe("stream.drain_seconds", time.monotonic() - started)
+            if late:
+                # Their turns still answer from here; the next owner drops the redelivered updates
+                logger.warning(
+                    f"{len(late)} entries on partition {partition} still waiting for their turn "
+                    f"after {settings.stream_drain_timeout_seconds}s; handing the partition over"
+                )
+                for task in late:
+                    task.cancel()
+        if partition in self._leases:
+            self._leases.discard(partition)
+            try:
+                await self._release_lease(keys=[lease_key(partition)], args=[self.worker_id])
+            except Exception as e:
+                # It expires after stream_worker_ttl_seconds
+                logger.warning(f"Could not release the lease on partition {partition}: {e}")
+    
+    async def _consume(self, partition: int):
+        key = stream_key(partition)
+        try:
+            await self._ensure_group(partition)
+            if not await self._acquire_lease(partition):
+                return
+            
+            # Whatever is still pending was left by an owner that has let go (or died)
+            start = "0-0"
+            while partition not in self._released:
+                start, claimed, *_ = await self.redis.xautoclaim(
+                    key, GROUP, self.worker_id,
+                    min_idle_time=0,
+                    start_id=start,
+                    count=100
+                )
+                if claimed:
+                    metrics.increment("stream.claimed", len(claimed))
+                    await self._process_entries(partition, claimed)
+                if start in (b"0-0", "0-0"):
+                    break
+            
+            while partition not in self._released:
+                try:
+                    response = await self.redis.xreadgroup(
+                        GROUP, self.worker_id, {key: ">"},
+                        count=settings.stream_read_count,
+                        block=1000
+                    )
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Error reading partition {partition}: {e}")
+                    await asyncio.sleep(1)
+                    continue
+                for _, entries in response or []:
+                    await self._process_entries(partition, entries)
+        finally:
+            await self._drain(partition)
+    
+    async def _rebalance(self):
+        workers = await self._live_workers()
+        owners = assign_partitions(workers, settings.update_stream_partitions)
+        wanted = {p for p, owner in owners.items() if owner == self.worker_id}
+        if self._stopping:
+            return workers
+        
+        for partition in set(self._partitions) - wanted:
+            # Stops reading, then drains before the new owner can take the lease
+            self._released.add(partition)
+            self._draining[partition] = self._partitions.pop(partition)
+        self._draining = {p: t for p, t in self._draining.items() if not t.done()}
+        
+        for partition, task in list(self._partitions.items()):
+            if task.done():
+                # Crashed (e.g. Redis went away); restarted below
+                if not task.cancelled() and task.exception():
+                    logger.error(f"Consumer for partition {partition} stopped: {task.exception()}")
+                self._partitions.pop(partition)
+        
+        for partition in wanted - set(self._partitions):
+            if partition in self._draining:
+                continue  # The previous loop is still draining; pick it up next heartbeat
+            self._released.discard(partition)
+            self._partitions[partition] = asyncio.create_task(
+                self._consume(partition), name=f"stream:{partition}"
+            )
+        return workers
+    
+    async def _heartbeat(self):
+        known_workers: list[str] = []
+        while True:
+            try:
+                await self._renew_leases()
+                if not self._stopping:
+                    workers = await self._rebalance()
+                    if workers != known_workers:
+                        logger.info(
+                            f"Worker {self.worker_id}: {len(workers)} live workers, "
+                            f"owning partitions {self.owned_partitions}"
+                        )
+                        known_workers = workers
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Stream heartbeat failed: {e}")
+            await asyncio.sleep(settings.stream_heartbeat_seconds)
+    
+    async def start(self):
+        self._heartbeat_task = asyncio.create_task(self._heartbeat(), name="stream-heartbeat")
+    
+    async def stop(self):
+        """Leave the group, draining our partitions so the remaining workers take them over."""
+        # The heartbeat keeps renewing the leases while the partitions drain
+        self._stopping = True
+        try:
+            await self.redis.zrem(WORKERS_KEY, self.worker_id)
+        except Exception as e:
+            logger.warning(f"Could not deregister worker {self.worker_id}: {e}")
+        self._released.update(self._partitions)
+        tasks = list(self._partitions.values()) + list(self._draining.values())
+        if tasks:
+            # Reads block for at most a second, then the loops see the release and drain
+            await asyncio.wait(tasks, timeout=settings.stream_drain_timeout_seconds + 5)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._partitions = {}
+        self._draining = {}
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
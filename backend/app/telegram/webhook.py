@@ -0,0 +1,51 @@
+"""Webhook endpoint that feeds Telegram updates into the bot's update queue."""
+import hmac
+import logging
+from fastapi import APIRouter, HTTPException, Request, Header
+from telegram import Update
+from app.config import get_settings
+from app.telegram.bot import get_application
+from app.telegram.update_stream import publish_update
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/telegram", tags=["telegram"])
+
+
+def _valid_secret(value: str | None) -> bool:
+    expected = settings.telegram_webhook_secret
+    # Bytes: compare_digest rejects str with non-ASCII characters
+    return bool(expected) and value is not None and hmac.compare_digest(value.encode(), expected.encode())
+
+
+@router.post("/webhook/{secret}")
+async def telegram_webhook(
+    secret: str,
+    request: Request,
+    x_telegram_bot_api_secret_token: str | None = Header(default=None)
+):
+    """Receive an update from Telegram and hand it to the bot for processing."""
+    if not _valid_secret(secret) or not _valid_secret(x_telegram_bot_api_secret_token):
+        raise HTTPException(status_code=403, detail="Invalid webhook secret")
+    
+    if settings.telegram_update_stream:
+        # Bot workers pick it up from the student's stream partition
+        payload = await request.json()
+        if not isinstance(payload, dict) or "update_id" not in payload:
+            raise HTTPException(status_code=400, detail="Invalid update")
+        await publish_update(payload)
+        return {"ok": True}
+    
+    application = get_application()
+    if application is None or not application.running:
+        # Telegram retries non-2xx responses, so nothing is lost while we start up
+        raise HTTPException(status_code=503, detail="Bot not running")
+    
+    try:
+        update = Update.de_json(await request.json(), application.bot)
+    except Exception as e:
+        logger.warning(f"Discarding malformed webhook payload: {e}")
+        raise HTTPException(status_code=400, detail="Invalid update")
+    
+    await application.update_queue.put(update)
+    return {"ok": True}
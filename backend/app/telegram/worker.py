@@ -0,0 +1,85 @@
+"""Standalone Telegram bot worker, independent of the HTTP API.
+
+Run with: python -m app.telegram.worker
+
+Set TELEGRAM_RUN_IN_API=false on the API so only workers run the bot. Pool and
+concurrency settings (DB_POOL_SIZE, DB_MAX_OVERFLOW, TELEGRAM_CONCURRENT_UPDATES,
+TURN_CONCURRENCY) are read from this process's environment, so they can differ
+from the API's.
+
+Without the update stream, workers elect a leader that polls Telegram and the
+others stand by. With TELEGRAM_UPDATE_STREAM=true every worker consumes its share
+of the stream partitions; updates come from the API webhook or, in polling mode,
+from a single poller elected among the workers.
+"""
+import asyncio
+import logging
+import signal
+from app.config import get_settings
+from app.database import engine, init_db
+from app.leader import LeaderElector
+from app.metrics import metrics
+from app.redis_client import close_redis
+from app.telegram.bot import create_bot, create_standalone_bot, start_bot, stop_bot
+from app.telegram.handlers import turn_queue
+from app.telegram.update_stream import StreamConsumer, StreamPoller
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+async def main():
+    if settings.telegram_mode == "webhook" and not settings.telegram_update_stream:
+        raise SystemExit(
+            "Webhook updates reach bot workers through the update stream; set "
+            "TELEGRAM_UPDATE_STREAM=true or run the bot in the API (TELEGRAM_RUN_IN_API=true)"
+        )
+    
+    logger.info("Starting Telegram bot worker...")
+    await init_db()
+    metrics.start_flushing()
+    
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    
+    consumer: StreamConsumer | None = None
+    leader: LeaderElector | None = None
+    
+    if settings.telegram_update_stream:
+        await start_bot(receive_updates=False)
+        application = create_bot()
+        consumer = StreamConsumer(application, turn_queue)
+        await consumer.start()
+        if settings.telegram_mode != "webhook":
+            # Own Bot client: the Updater shuts its bot down when leadership is lost
+            poller = StreamPoller(create_standalone_bot())
+            leader = LeaderElector("english-tutor-poller", poller.start, poller.stop)
+    else:
+        leader = LeaderElector("english-tutor-bot", start_bot, stop_bot)
+    
+    if leader:
+        leader.start()
+    
+    try:
+        await stop_event.wait()
+    finally:
+        logger.info("Shutting down bot worker...")
+        if leader:
+            await leader.stop()
+        if consumer:
+            await consumer.stop()
+        await stop_bot()
+        await metrics.stop_flushing()
+        await close_redis()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,235 @@
+"""Local load test for sharded bot workers against a fake Telegram (and OpenAI) API.
+
+Starts an in-process fake of the Telegram Bot API and of the OpenAI chat
+completions endpoint (with a configurable latency), launches N bot workers with
+`python -m app.telegram.worker` in update-stream mode, publishes one message per
+simulated student into the update stream and measures how long it takes until
+every student got a reply. Repeats for each worker count and prints throughput.
+
+Needs the Postgres and Redis from DATABASE_URL / REDIS_URL; use a scratch
+database, since the simulated students are created there. Workers inherit this
+process's environment, so size DB_POOL_SIZE/DB_MAX_OVERFLOW for the largest
+worker count (their sum times the workers must fit in max_connections); turns
+that fail get the error reply and are reported as failed.
+
+The fake Telegram API is not rate-limited, so the workers' outbound limits are
+raised to --telegram-rate (global and per chat). Otherwise the shared Redis
+limit (TELEGRAM_GLOBAL_RATE, 30/s for all workers together; a turn sends about
+three calls) would cap every round near 10 turns/s and the table would measure
+the limiter rather than worker scaling.
+
+Run from backend/:
+    python scripts/load_test.py --workers 1,2,4 --students 400 --llm-latency 0.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+import uvicorn
+from fastapi import FastAPI, Request
+
+BOT_TOKEN = "123456:load-test"
+BASE_TELEGRAM_ID = 9_000_000_000
+TELEGRAM_RATE = 10000  # Outbound calls/s allowed to the fake API
+
+# Workers and this script must agree on these before app modules are imported
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", BOT_TOKEN)
+os.environ["TELEGRAM_UPDATE_STREAM"] = "true"
+os.environ["TELEGRAM_MODE"] = "webhook"  # Updates come from this script, not a poller
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.redis_client import redis_client  # noqa: E402
+from app.telegram import dedupe  # noqa: E402
+from app.telegram.turn_queue import ERROR_REPLY  # noqa: E402
+from app.telegram.update_stream import publish_update, KEY_PREFIX, LEASE_PREFIX, WORKERS_KEY  # noqa: E402
+
+
+def create_fake_api(llm_latency: float) -> tuple[FastAPI, Counter, Counter]:
+    """Fake Telegram Bot API and OpenAI endpoint; counts replies and failed turns per chat."""
+    api = FastAPI()
+    replies: Counter = Counter()
+    failures: Counter = Counter()
+    message_ids = iter(range(1, 10**9))
+    
+    @api.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await asyncio.sleep(llm_latency)
+        return {
+            "id": "chatcmpl-load-test",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "Great! Let's keep practicing. 😊"},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 500, "completion_tokens": 20, "total_tokens": 520}
+        }
+    
+    @api.post("/bot{token}/{method}")
+    async def bot_method(token: str, method: str, request: Request):
+        params = dict(await request.form())
+        result: object = True
+        
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "LoadTest", "username": "load_test_bot"}
+        elif method in ("sendMessage", "sendVoice"):
+            chat_id = int(params["chat_id"])
+            if params.get("text") == ERROR_REPLY:
+                failures[chat_id] += 1
+            else:
+                replies[chat_id] += 1
+            result = {
+                "message_id": next(message_ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": params.get("text", "")
+            }
+        elif method == "getUpdates":
+            await asyncio.sleep(1)
+            result = []
+        
+        return {"ok": True, "result": result}
+    
+    return api, replies, failures
+
+
+async def reset_streams():
+    keys = [key async for key in redis_client.scan_iter(f"{KEY_PREFIX}:*")]
+    keys += [key async for key in redis_client.scan_iter(f"{LEASE_PREFIX}:*")]
+    # Simulated students reuse chat and message ids from earlier runs
+    keys += [key async for key in redis_client.scan_iter(f"{dedupe.KEY_PREFIX}:*")]
+    if keys:
+        await redis_client.delete(*keys)
+    await redis_client.delete(WORKERS_KEY)
+
+
+def start_workers(count: int, port: int, telegram_rate: float = TELEGRAM_RATE) -> list[subprocess.Popen]:
+    env = {
+        **os.environ,
+        "TELEGRAM_API_URL": f"http://127.0.0.1:{port}",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{port}/v1",
+        "OPENAI_API_KEY": os.environ.get("LOAD_TEST_OPENAI_KEY", "sk-load-test"),
+        "ELEVENLABS_API_KEY": "",  # Skip TTS; the text reply is what we count
+        "TURN_DEBOUNCE_SECONDS": "0.05",
+        "TURN_MAX_WAIT_SECONDS": "0.2",
+        "TELEGRAM_GLOBAL_RATE": str(telegram_rate),
+        "TELEGRAM_CHAT_RATE": str(telegram_rate),
+        "TELEGRAM_CHAT_BURST": str(telegram_rate),
+    }
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return [
+        subprocess.Popen([sys.executable, "-m", "app.telegram.worker"], cwd=backend_dir, env=env)
+        for _ in range(count)
+    ]
+
+
+async def wait_for_workers(count: int, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while await redis_client.zcard(WORKERS_KEY) < count:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Only {await redis_client.zcard(WORKERS_KEY)}/{count} workers registered")
+        await asyncio.sleep(0.5)
+    # Let every worker see the final membership and take its partitions
+    await asyncio.sleep(3)
+
+
+async def run_round(
+    workers: int,
+    students: int,
+    port: int,
+    replies: Counter,
+    failures: Counter,
+    run: int,
+    telegram_rate: float,
+) -> tuple[float, int]:
+    """Seconds until every student got an answer, and how many got the error reply instead."""
+    await reset_streams()
+    processes = start_workers(workers, port, telegram_rate)
+    try:
+        await wait_for_workers(workers)
+        
+        base_id = BASE_TELEGRAM_ID + run * students
+        replies.clear()
+        failures.clear()
+        started = time.monotonic()
+        for i in range(students):
+            telegram_id = base_id + i
+            await publish_update({
+                "update_id": int(time.time() * 1000) * 1000 + i,
+                "message": {
+                    "message_id": run * students + i + 1,
+                    "date": int(time.time()),
+                    "chat": {"id": telegram_id, "type": "private"},
+                    "from": {"id": telegram_id, "is_bot": False, "first_name": f"Load{i}"},
+                    "text": "Hello, I want to practice"
+                }
+            })
+        
+        while sum(1 for i in range(students) if replies[base_id + i] or failures[base_id + i]) < students:
+            if time.monotonic() - started > 600:
+                raise RuntimeError("Timed out waiting for replies")
+            await asyncio.sleep(0.1)
+        return time.monotonic() - started, sum(1 for i in range(students) if failures[base_id + i])
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            # Off the event loop: draining workers still call the fake API served from it
+            await asyncio.to_thread(process.wait, 90)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts")
+    parser.add_argument("--students", type=int, default=400)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Fake LLM latency in seconds")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument(
+        "--telegram-rate", type=float, default=TELEGRAM_RATE,
+        help="Workers' global and per-chat send rate; the fake API has no limits"
+    )
+    args = parser.parse_args()
+    
+    api, replies, failures = create_fake_api(args.llm_latency)
+    server = uvicorn.Server(uvicorn.Config(api, host="127.0.0.1", port=args.port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.1)
+    
+    results = []
+    try:
+        for run, workers in enumerate(int(w) for w in args.workers.split(",")):
+            elapsed, failed = await run_round(
+                workers, args.students, args.port, replies, failures, run, args.telegram_rate
+            )
+            results.append((workers, elapsed, args.students / elapsed, failed))
+            print(
+                f"{workers} worker(s): {args.students} turns in {elapsed:.1f}s "
+                f"({args.students / elapsed:.1f} turns/s, {failed} failed)"
+            )
+    finally:
+        server.should_exit = True
+        await server_task
+        await reset_streams()
+    
+    base_workers, _, base_rate, _ = results[0]
+    print("\nworkers  turns/s  speedup  efficiency  failed")
+    for workers, _, rate, failed in results:
+        speedup = rate / base_rate
+        print(f"{workers:>7}  {rate:>7.1f}  {speedup:>6.2f}x  {speedup / (workers / base_workers):>9.0%}  {failed:>6}")
+    print(json.dumps({"results": [
+        {"workers": w, "seconds": round(e, 2), "turns_per_second": round(r, 2), "failed": f}
+        for w, e, r, f in results
+    ]}))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
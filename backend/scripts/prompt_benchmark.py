@@ -0,0 +1,110 @@
+"""Input tokens per tutor turn for each level, before and after the prompt registry.
+
+"Before" is the single SYSTEM_PROMPT from a git revision of app/agent/prompts.py
+(by default the parent of the commit that added app/agent/prompt_registry.py),
+sent unchanged to every level. "After" is the level's registry prompt plus the
+separate student-context message. Each turn also carries a sample conversation
+history, the same for both.
+
+Token counts use tiktoken for OPENAI_MODEL, or ~4 characters per token when the
+encoding can't be loaded (offline).
+
+Run from backend/:
+    python scripts/prompt_benchmark.py [--baseline-ref REF] [--history-turns 6]
+"""
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.agent.prompt_registry import LEVEL_PROMPTS, build_system_prompt, count_tokens  # noqa: E402
+from app.agent.prompts import STUDENT_CONTEXT_PROMPT  # noqa: E402
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MESSAGE_OVERHEAD = 4  # Role and separators per chat message
+
+STUDENT = {
+    "student_name": "María",
+    "total_lessons": 12,
+    "streak_days": 5,
+    "words_learned": 140,
+    "due_words": "kitchen, yesterday, cheap, wear, busy",
+    "memories": "\n  • 02/10/2026: Practicó la cocina y la comida; confundía cheap y expensive. Temas: food."
+}
+
+SAMPLE_HISTORY = [
+    ("Hola! Quiero practicar", "¡Hola, María! 😊 Hoy vamos a repasar tres palabras: kitchen, cheap y busy. ¿Lista?"),
+    ("Sí, estoy lista", "🆕 **KITCHEN** /kíchen/ = cocina. 💬 My kitchen is small. 🔊 Repite: kitchen"),
+    ("My kitchen is big", "¡Excelente! 🎉 Now: **CHEAP** /chiip/ = barato. 💬 This bread is cheap. ¿Puedes hacer una frase?"),
+    ("The apple is cheap", "¡Perfecto! 👏 Last one: **BUSY** /bísi/ = ocupado. 💬 I am busy today."),
+    ("I am busy in my work", "¡Muy bien! Pequeña corrección: I am busy **at** work. ¿Qué hiciste yesterday?"),
+    ("Yesterday I go to the market", "¡Casi! En pasado: Yesterday I **went** to the market. 😊 What did you buy?"),
+]
+
+
+def git(*args: str) -> str:
+    return subprocess.run(
+        ["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stdout.strip()
+
+
+def default_baseline_ref() -> str:
+    added = git("log", "--diff-filter=A", "--format=%H", "-1", "--", "app/agent/prompt_registry.py")
+    return f"{added}^" if added else "HEAD"
+
+
+def load_baseline_prompt(ref: str) -> str:
+    """The single SYSTEM_PROMPT of an older prompts.py, formatted for the sample student."""
+    source = git("show", f"{ref}:backend/app/agent/prompts.py")
+    namespace: dict = {}
+    exec(compile(source, f"{ref}:prompts.py", "exec"), namespace)
+    if "SYSTEM_PROMPT" not in namespace:
+        raise SystemExit(f"{ref} has no single SYSTEM_PROMPT; pass an older --baseline-ref")
+    values = defaultdict(str, STUDENT, current_level="{level}")
+    prompt = namespace["SYSTEM_PROMPT"].format_map(values)
+    if "STUDENT_CONTEXT_PROMPT" in namespace:
+        # Student context already sent as its own message
+        prompt += "\n\n" + namespace["STUDENT_CONTEXT_PROMPT"].format_map(values)
+    return prompt
+
+
+def history_tokens(turns: int) -> int:
+    return sum(
+        count_tokens(user) + count_tokens(tutor) + 2 * MESSAGE_OVERHEAD
+        for user, tutor in SAMPLE_HISTORY[:turns]
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline-ref", default=None, help="Git revision with the old SYSTEM_PROMPT")
+    parser.add_argument("--history-turns", type=int, default=len(SAMPLE_HISTORY))
+    args = parser.parse_args()
+    
+    ref = args.baseline_ref or default_baseline_ref()
+    baseline = load_baseline_prompt(ref)
+    history = history_tokens(args.history_turns)
+    new_message = count_tokens("I want to learn more words") + MESSAGE_OVERHEAD
+    
+    print(f"Baseline: {ref}; history: {args.history_turns} exchanges ({history} tokens)\n")
+    print("level   budget  prompt before  prompt after  turn before  turn after  saved")
+    for level, level_prompt in LEVEL_PROMPTS.items():
+        before_system = count_tokens(baseline.replace("{level}", level)) + MESSAGE_OVERHEAD
+        after_system = count_tokens(build_system_prompt(level)) + MESSAGE_OVERHEAD
+        context = count_tokens(STUDENT_CONTEXT_PROMPT.format(current_level=level, **STUDENT)) + MESSAGE_OVERHEAD
+        
+        before_turn = before_system + history + new_message
+        after_turn = after_system + context + history + new_message
+        saved = (before_turn - after_turn) / before_turn
+        print(
+            f"{level:<7} {level_prompt.token_budget:>6}  {before_system:>13}  {after_system + context:>12}  "
+            f"{before_turn:>11}  {after_turn:>10}  {saved:>5.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()